@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Sequence, Optional
+from typing import Iterator, Sequence, Optional
 from uuid import UUID
 
 from overrides import override
@@ -227,6 +227,7 @@ class BaseAPI(ABC):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = IncludeMetadataDocuments,
+        cursor: Optional[str] = None,
     ) -> GetResult:
         """[Internal] Returns entries from a collection specified by UUID.
 
@@ -238,6 +239,8 @@ class BaseAPI(ABC):
             where_document: Conditional filtering on documents. Defaults to None.
             include: The fields to include in the response.
                           Defaults to ["metadatas", "documents"].
+            cursor: The next_cursor of a previous result, to return the entries
+                    after it. Defaults to None.
         Returns:
             GetResult: The entries in the collection that match the query.
 
@@ -680,11 +683,70 @@ class ServerAPI(BaseAPI, AdminAPI, Component):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = IncludeMetadataDocuments,
+        cursor: Optional[str] = None,
         tenant: str = DEFAULT_TENANT,
         database: str = DEFAULT_DATABASE,
     ) -> GetResult:
         pass
 
+    def _iter_get(
+        self,
+        collection_id: UUID,
+        ids: Optional[IDs] = None,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        include: Include = IncludeMetadataDocuments,
+        batch_size: int = 1000,
+        tenant: str = DEFAULT_TENANT,
+        database: str = DEFAULT_DATABASE,
+    ) -> Iterator[GetResult]:
+        """[Internal] Yields the entries of a collection that match the filters, in
+        pages of at most batch_size entries. By default pages are read with _get()
+        by offset; implementations that can resume after the last entry of a page
+        override this."""
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive")
+        return self._iter_get_by_offset(
+            collection_id=collection_id,
+            ids=ids,
+            where=where,
+            where_document=where_document,
+            include=include,
+            batch_size=batch_size,
+            tenant=tenant,
+            database=database,
+        )
+
+    def _iter_get_by_offset(
+        self,
+        collection_id: UUID,
+        ids: Optional[IDs],
+        where: Optional[Where],
+        where_document: Optional[WhereDocument],
+        include: Include,
+        batch_size: int,
+        tenant: str,
+        database: str,
+    ) -> Iterator[GetResult]:
+        offset = 0
+        while True:
+            page = self._get(
+                collection_id=collection_id,
+                ids=ids,
+                where=where,
+                limit=batch_size,
+                offset=offset,
+                where_document=where_document,
+                include=include,
+                tenant=tenant,
+                database=database,
+            )
+            if len(page["ids"]) > 0:
+                yield page
+            if len(page["ids"]) < batch_size:
+                return
+            offset += batch_size
+
     @abstractmethod
     @override
     def _add(
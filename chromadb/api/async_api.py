@@ -221,6 +221,7 @@ class AsyncBaseAPI(ABC):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = IncludeMetadataDocuments,
+        cursor: Optional[str] = None,
     ) -> GetResult:
         """[Internal] Returns entries from a collection specified by UUID.
 
@@ -232,6 +233,8 @@ class AsyncBaseAPI(ABC):
             where_document: Conditional filtering on documents. Defaults to None.
             include: The fields to include in the response.
                           Defaults to ["embeddings", "metadatas", "documents"].
+            cursor: The next_cursor of a previous result, to return the entries
+                    after it. Defaults to None.
         Returns:
             GetResult: The entries in the collection that match the query.
 
@@ -673,6 +676,7 @@ class AsyncServerAPI(AsyncBaseAPI, AsyncAdminAPI, Component):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = IncludeMetadataDocuments,
+        cursor: Optional[str] = None,
         tenant: str = DEFAULT_TENANT,
         database: str = DEFAULT_DATABASE,
     ) -> GetResult:
@@ -375,6 +375,7 @@ class AsyncClient(SharedSystemClient, AsyncClientAPI):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = IncludeMetadataDocuments,
+        cursor: Optional[str] = None,
     ) -> GetResult:
         return await self._server._get(
             collection_id=collection_id,
@@ -384,6 +385,7 @@ class AsyncClient(SharedSystemClient, AsyncClientAPI):
             offset=offset,
             where_document=where_document,
             include=include,
+            cursor=cursor,
             tenant=self.tenant,
             database=self.database,
         )
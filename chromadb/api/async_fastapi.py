@@ -30,7 +30,6 @@ from chromadb.types import Database, Tenant, Collection as CollectionModel
 from chromadb.api.types import (
     Documents,
     Embeddings,
-    PyEmbeddings,
     IDs,
     Include,
     Metadatas,
@@ -41,7 +40,6 @@ from chromadb.api.types import (
     QueryResult,
     CollectionMetadata,
     validate_batch,
-    convert_np_embeddings_to_list,
     IncludeMetadataDocuments,
     IncludeMetadataDocumentsDistances,
     IncludeMetadataDocumentsEmbeddings,
@@ -137,17 +135,18 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
         # If the request has json in kwargs, use orjson to serialize it,
         # remove it from kwargs, and add it to the content parameter
         # This is because httpx uses a slower json serializer
-        if "json" in kwargs:
-            data = orjson.dumps(kwargs.pop("json"))
-            kwargs["content"] = data
+        request_kwargs: Dict[str, Any] = dict(kwargs)
+        if "json" in request_kwargs:
+            data = orjson.dumps(request_kwargs.pop("json"))
+            request_kwargs["content"] = data
 
         # Unlike requests, httpx does not automatically escape the path
         escaped_path = urllib.parse.quote(path, safe="/", encoding=None, errors=None)
         url = self._api_url + escaped_path
 
-        response = await self._get_client().request(method, url, **cast(Any, kwargs))
+        response = await self._get_client().request(method, url, **request_kwargs)
         BaseHTTPClient._raise_chroma_error(response)
-        return orjson.loads(response.text)
+        return BaseHTTPClient._decode_response(response)
 
     @trace_method("AsyncFastAPI.heartbeat", OpenTelemetryGranularity.OPERATION)
     @override
@@ -452,6 +451,7 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = IncludeMetadataDocuments,
+        cursor: Optional[str] = None,
         tenant: str = DEFAULT_TENANT,
         database: str = DEFAULT_DATABASE,
     ) -> GetResult:
@@ -468,7 +468,9 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
                 "offset": offset,
                 "where_document": where_document,
                 "include": filtered_include,
+                "cursor": cursor,
             },
+            headers={"Accept": self.BINARY_EMBEDDINGS_ACCEPT},
         )
 
         return GetResult(
@@ -479,6 +481,7 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
             data=None,
             uris=resp_json.get("uris", None),
             included=include,
+            next_cursor=resp_json.get("next_cursor", None),
         )
 
     @trace_method("AsyncFastAPI._delete", OpenTelemetryGranularity.OPERATION)
@@ -504,7 +507,7 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
         self,
         batch: Tuple[
             IDs,
-            Optional[PyEmbeddings],
+            Optional[Embeddings],
             Optional[Metadatas],
             Optional[Documents],
             Optional[URIs],
@@ -517,13 +520,17 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
         return await self._make_request(
             "post",
             url,
-            json={
-                "ids": batch[0],
-                "embeddings": batch[1],
-                "metadatas": batch[2],
-                "documents": batch[3],
-                "uris": batch[4],
-            },
+            **self._embeddings_request(
+                {
+                    "ids": batch[0],
+                    "embeddings": batch[1],
+                    "metadatas": batch[2],
+                    "documents": batch[3],
+                    "uris": batch[4],
+                },
+                "embeddings",
+                await self._binary_embeddings(),
+            ),
         )
 
     @trace_method("AsyncFastAPI._add", OpenTelemetryGranularity.ALL)
@@ -541,7 +548,7 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
     ) -> bool:
         batch = (
             ids,
-            convert_np_embeddings_to_list(embeddings),
+            embeddings,
             metadatas,
             documents,
             uris,
@@ -568,9 +575,7 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
     ) -> bool:
         batch = (
             ids,
-            convert_np_embeddings_to_list(embeddings)
-            if embeddings is not None
-            else None,
+            embeddings,
             metadatas,
             documents,
             uris,
@@ -599,7 +604,7 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
     ) -> bool:
         batch = (
             ids,
-            convert_np_embeddings_to_list(embeddings),
+            embeddings,
             metadatas,
             documents,
             uris,
@@ -631,16 +636,19 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
         resp_json = await self._make_request(
             "post",
             f"/tenants/{tenant}/databases/{database}/collections/{collection_id}/query",
-            json={
-                "ids": ids,
-                "query_embeddings": convert_np_embeddings_to_list(query_embeddings)
-                if query_embeddings is not None
-                else None,
-                "n_results": n_results,
-                "where": where,
-                "where_document": where_document,
-                "include": filtered_include,
-            },
+            **self._embeddings_request(
+                {
+                    "ids": ids,
+                    "query_embeddings": query_embeddings,
+                    "n_results": n_results,
+                    "where": where,
+                    "where_document": where_document,
+                    "include": filtered_include,
+                },
+                "query_embeddings",
+                await self._binary_embeddings(),
+                headers={"Accept": self.BINARY_EMBEDDINGS_ACCEPT},
+            ),
         )
 
         return QueryResult(
@@ -674,6 +682,14 @@ class AsyncFastAPI(BaseHTTPClient, AsyncServerAPI):
     @override
     async def get_max_batch_size(self) -> int:
         if self._max_batch_size == -1:
-            resp_json = await self._make_request("get", "/pre-flight-checks")
-            self._max_batch_size = cast(int, resp_json["max_batch_size"])
+            self._load_pre_flight_checks(
+                await self._make_request("get", "/pre-flight-checks")
+            )
         return self._max_batch_size
+
+    async def _binary_embeddings(self) -> bool:
+        """Whether to send embeddings in binary, which the server advertises in its
+        pre-flight checks"""
+        if self._supports_binary_embeddings is None:
+            await self.get_max_batch_size()
+        return bool(self._supports_binary_embeddings)
@@ -5,7 +5,13 @@ import orjson as json
 import httpx
 
 import chromadb.errors as errors
+from chromadb.api.types import convert_np_embeddings_to_list
 from chromadb.config import Settings
+from chromadb.utils.binary_embeddings import (
+    BINARY_EMBEDDINGS_CONTENT_TYPE,
+    decode_embeddings_body,
+    encode_embeddings_body,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +19,13 @@ logger = logging.getLogger(__name__)
 class BaseHTTPClient:
     _settings: Settings
     _max_batch_size: int = -1
+    # Whether the server accepts embeddings in binary, from its pre-flight checks
+    _supports_binary_embeddings: Optional[bool] = None
+    # Whether the server streams get results, from its pre-flight checks
+    _supports_get_stream: Optional[bool] = None
+
+    # Sent with requests whose responses may carry embeddings
+    BINARY_EMBEDDINGS_ACCEPT = f"{BINARY_EMBEDDINGS_CONTENT_TYPE}, application/json"
 
     @staticmethod
     def _validate_host(host: str) -> None:
@@ -69,6 +82,40 @@ class BaseHTTPClient:
         """Remove None values from provided dict."""
         return {k: v for k, v in params.items() if v is not None}  # type: ignore
 
+    def _load_pre_flight_checks(self, resp_json: Dict[str, Any]) -> None:
+        self._max_batch_size = int(resp_json["max_batch_size"])
+        self._supports_binary_embeddings = bool(
+            resp_json.get("supports_binary_embeddings", False)
+        )
+        self._supports_get_stream = bool(resp_json.get("supports_get_stream", False))
+
+    @staticmethod
+    def _embeddings_request(
+        body: Dict[str, Any],
+        field: str,
+        binary: bool,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """Returns the request arguments for a body with embeddings, which are sent
+        in binary if the server supports it and they are all the same dimension."""
+        headers = dict(headers or {})
+        if binary:
+            content = encode_embeddings_body(body, field)
+            if content is not None:
+                headers["Content-Type"] = BINARY_EMBEDDINGS_CONTENT_TYPE
+                return {"content": content, "headers": headers}
+        if body[field] is not None:
+            body[field] = convert_np_embeddings_to_list(body[field])
+        return {"json": body, "headers": headers}
+
+    @staticmethod
+    def _decode_response(resp: httpx.Response) -> Any:
+        if resp.headers.get("content-type", "").startswith(
+            BINARY_EMBEDDINGS_CONTENT_TYPE
+        ):
+            return decode_embeddings_body(resp.content)
+        return json.loads(resp.text)
+
     @staticmethod
     def _raise_chroma_error(resp: httpx.Response) -> None:
         """Raises an error if the response is not ok, using a ChromaError if possible."""
@@ -346,6 +346,7 @@ class Client(SharedSystemClient, ClientAPI):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = IncludeMetadataDocuments,
+        cursor: Optional[str] = None,
     ) -> GetResult:
         return self._server._get(
             collection_id=collection_id,
@@ -357,6 +358,7 @@ class Client(SharedSystemClient, ClientAPI):
             offset=offset,
             where_document=where_document,
             include=include,
+            cursor=cursor,
         )
 
     def _delete(
@@ -1,6 +1,6 @@
 import orjson
 import logging
-from typing import Any, Dict, Optional, cast, Tuple
+from typing import Any, Dict, Iterator, Optional, cast, Tuple
 from typing import Sequence
 from uuid import UUID
 import httpx
@@ -21,7 +21,6 @@ from chromadb.api import ServerAPI
 from chromadb.api.types import (
     Documents,
     Embeddings,
-    PyEmbeddings,
     IDs,
     Include,
     Metadatas,
@@ -32,7 +31,7 @@ from chromadb.api.types import (
     QueryResult,
     CollectionMetadata,
     validate_batch,
-    convert_np_embeddings_to_list,
+    convert_list_embeddings_to_np,
     IncludeMetadataDocuments,
     IncludeMetadataDocumentsDistances,
     IncludeMetadataDocumentsEmbeddings,
@@ -94,17 +93,38 @@ class FastAPI(BaseHTTPClient, ServerAPI):
         # If the request has json in kwargs, use orjson to serialize it,
         # remove it from kwargs, and add it to the content parameter
         # This is because httpx uses a slower json serializer
-        if "json" in kwargs:
-            data = orjson.dumps(kwargs.pop("json"))
-            kwargs["content"] = data
+        request_kwargs: Dict[str, Any] = dict(kwargs)
+        if "json" in request_kwargs:
+            data = orjson.dumps(request_kwargs.pop("json"))
+            request_kwargs["content"] = data
 
+        response = self._session.request(method, self._url(path), **request_kwargs)
+        BaseHTTPClient._raise_chroma_error(response)
+        return BaseHTTPClient._decode_response(response)
+
+    def _make_stream_request(
+        self, method: str, path: str, **kwargs: Dict[str, Any]
+    ) -> Iterator[Any]:
+        """Like _make_request(), but for a newline delimited JSON response, which is
+        read and parsed a line at a time"""
+        request_kwargs: Dict[str, Any] = dict(kwargs)
+        if "json" in request_kwargs:
+            request_kwargs["content"] = orjson.dumps(request_kwargs.pop("json"))
+
+        with self._session.stream(
+            method, self._url(path), **request_kwargs
+        ) as response:
+            if response.is_error:
+                response.read()
+                BaseHTTPClient._raise_chroma_error(response)
+            for line in response.iter_lines():
+                if line:
+                    yield orjson.loads(line)
+
+    def _url(self, path: str) -> str:
         # Unlike requests, httpx does not automatically escape the path
         escaped_path = urllib.parse.quote(path, safe="/", encoding=None, errors=None)
-        url = self._api_url + escaped_path
-
-        response = self._session.request(method, url, **cast(Any, kwargs))
-        BaseHTTPClient._raise_chroma_error(response)
-        return orjson.loads(response.text)
+        return self._api_url + escaped_path
 
     @trace_method("FastAPI.heartbeat", OpenTelemetryGranularity.OPERATION)
     @override
@@ -408,6 +428,7 @@ class FastAPI(BaseHTTPClient, ServerAPI):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = IncludeMetadataDocuments,
+        cursor: Optional[str] = None,
         tenant: str = DEFAULT_TENANT,
         database: str = DEFAULT_DATABASE,
     ) -> GetResult:
@@ -424,7 +445,9 @@ class FastAPI(BaseHTTPClient, ServerAPI):
                 "offset": offset,
                 "where_document": where_document,
                 "include": filtered_include,
+                "cursor": cursor,
             },
+            headers={"Accept": self.BINARY_EMBEDDINGS_ACCEPT},
         )
 
         return GetResult(
@@ -435,6 +458,66 @@ class FastAPI(BaseHTTPClient, ServerAPI):
             data=None,
             uris=resp_json.get("uris", None),
             included=include,
+            next_cursor=resp_json.get("next_cursor", None),
+        )
+
+    @trace_method("FastAPI._iter_get", OpenTelemetryGranularity.OPERATION)
+    @override
+    def _iter_get(
+        self,
+        collection_id: UUID,
+        ids: Optional[IDs] = None,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        include: Include = IncludeMetadataDocuments,
+        batch_size: int = 1000,
+        tenant: str = DEFAULT_TENANT,
+        database: str = DEFAULT_DATABASE,
+    ) -> Iterator[GetResult]:
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive")
+        if self._supports_get_stream is None:
+            self.get_max_batch_size()
+        if not self._supports_get_stream:
+            return super()._iter_get(
+                collection_id=collection_id,
+                ids=ids,
+                where=where,
+                where_document=where_document,
+                include=include,
+                batch_size=batch_size,
+                tenant=tenant,
+                database=database,
+            )
+
+        # Servers do not support receiving "data", as that is hydrated by the client as a loadable
+        filtered_include = [i for i in include if i != "data"]
+
+        pages = self._make_stream_request(
+            "post",
+            f"/tenants/{tenant}/databases/{database}/collections/{collection_id}/get_stream",
+            json={
+                "ids": ids,
+                "where": where,
+                "where_document": where_document,
+                "include": filtered_include,
+                "batch_size": batch_size,
+            },
+            headers={"Accept": "application/x-ndjson"},
+        )
+        return (
+            GetResult(
+                ids=page["ids"],
+                embeddings=convert_list_embeddings_to_np(page["embeddings"])
+                if page.get("embeddings", None) is not None
+                else None,
+                metadatas=page.get("metadatas", None),
+                documents=page.get("documents", None),
+                data=None,
+                uris=page.get("uris", None),
+                included=include,
+            )
+            for page in pages
         )
 
     @trace_method("FastAPI._delete", OpenTelemetryGranularity.OPERATION)
@@ -465,7 +548,7 @@ class FastAPI(BaseHTTPClient, ServerAPI):
         self,
         batch: Tuple[
             IDs,
-            Optional[PyEmbeddings],
+            Optional[Embeddings],
             Optional[Metadatas],
             Optional[Documents],
             Optional[URIs],
@@ -478,13 +561,17 @@ class FastAPI(BaseHTTPClient, ServerAPI):
         self._make_request(
             "post",
             url,
-            json={
-                "ids": batch[0],
-                "embeddings": batch[1],
-                "metadatas": batch[2],
-                "documents": batch[3],
-                "uris": batch[4],
-            },
+            **self._embeddings_request(
+                {
+                    "ids": batch[0],
+                    "embeddings": batch[1],
+                    "metadatas": batch[2],
+                    "documents": batch[3],
+                    "uris": batch[4],
+                },
+                "embeddings",
+                self._binary_embeddings(),
+            ),
         )
 
     @trace_method("FastAPI._add", OpenTelemetryGranularity.ALL)
@@ -506,7 +593,7 @@ class FastAPI(BaseHTTPClient, ServerAPI):
         """
         batch = (
             ids,
-            convert_np_embeddings_to_list(embeddings),
+            embeddings,
             metadatas,
             documents,
             uris,
@@ -537,9 +624,7 @@ class FastAPI(BaseHTTPClient, ServerAPI):
         """
         batch = (
             ids,
-            convert_np_embeddings_to_list(embeddings)
-            if embeddings is not None
-            else None,
+            embeddings,
             metadatas,
             documents,
             uris,
@@ -570,7 +655,7 @@ class FastAPI(BaseHTTPClient, ServerAPI):
         """
         batch = (
             ids,
-            convert_np_embeddings_to_list(embeddings),
+            embeddings,
             metadatas,
             documents,
             uris,
@@ -603,16 +688,19 @@ class FastAPI(BaseHTTPClient, ServerAPI):
         resp_json = self._make_request(
             "post",
             f"/tenants/{tenant}/databases/{database}/collections/{collection_id}/query",
-            json={
-                "ids": ids,
-                "query_embeddings": convert_np_embeddings_to_list(query_embeddings)
-                if query_embeddings is not None
-                else None,
-                "n_results": n_results,
-                "where": where,
-                "where_document": where_document,
-                "include": filtered_include,
-            },
+            **self._embeddings_request(
+                {
+                    "ids": ids,
+                    "query_embeddings": query_embeddings,
+                    "n_results": n_results,
+                    "where": where,
+                    "where_document": where_document,
+                    "include": filtered_include,
+                },
+                "query_embeddings",
+                self._binary_embeddings(),
+                headers={"Accept": self.BINARY_EMBEDDINGS_ACCEPT},
+            ),
         )
 
         return QueryResult(
@@ -649,6 +737,14 @@ class FastAPI(BaseHTTPClient, ServerAPI):
     @override
     def get_max_batch_size(self) -> int:
         if self._max_batch_size == -1:
-            resp_json = self._make_request("get", "/pre-flight-checks")
-            self._max_batch_size = cast(int, resp_json["max_batch_size"])
+            self._load_pre_flight_checks(
+                self._make_request("get", "/pre-flight-checks")
+            )
         return self._max_batch_size
+
+    def _binary_embeddings(self) -> bool:
+        """Whether to send embeddings in binary, which the server advertises in its
+        pre-flight checks"""
+        if self._supports_binary_embeddings is None:
+            self.get_max_batch_size()
+        return bool(self._supports_binary_embeddings)
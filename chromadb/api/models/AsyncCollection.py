@@ -1,4 +1,8 @@
-from typing import TYPE_CHECKING, Optional, Union
+import asyncio
+from functools import partial
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+
+from tenacity import AsyncRetrying
 
 from chromadb.api.types import (
     URI,
@@ -9,6 +13,7 @@ from chromadb.api.types import (
     Metadata,
     Document,
     Image,
+    InsertRecordSet,
     Where,
     IDs,
     GetResult,
@@ -18,7 +23,10 @@ from chromadb.api.types import (
     WhereDocument,
 )
 
-from chromadb.api.models.CollectionCommon import CollectionCommon
+from chromadb.api.models.CollectionCommon import (
+    BulkProgressCallback,
+    CollectionCommon,
+)
 from chromadb.api.collection_configuration import UpdateCollectionConfiguration
 
 if TYPE_CHECKING:
@@ -101,6 +109,7 @@ class AsyncCollection(CollectionCommon["AsyncServerAPI"]):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = ["metadatas", "documents"],
+        cursor: Optional[str] = None,
     ) -> GetResult:
         """Get embeddings and their associate data from the data store. If no ids or where filter is provided returns
         all embeddings up to limit starting at offset.
@@ -112,9 +121,10 @@ class AsyncCollection(CollectionCommon["AsyncServerAPI"]):
             offset: The offset to start returning results from. Useful for paging results with limit. Optional.
             where_document: A WhereDocument type dict used to filter by the documents. E.g. `{"$contains": "hello"}`. Optional.
             include: A list of what to include in the results. Can contain `"embeddings"`, `"metadatas"`, `"documents"`. Ids are always included. Defaults to `["metadatas", "documents"]`. Optional.
+            cursor: The `next_cursor` of a previous result, to return the results after it. Unlike offset, reading a page this way costs the same however deep into the collection it is. Optional.
 
         Returns:
-            GetResult: A GetResult object containing the results.
+            GetResult: A GetResult object containing the results. When limit is set and the page is full, its `next_cursor` continues after it.
 
         """
         get_request = self._validate_and_prepare_get_request(
@@ -132,6 +142,7 @@ class AsyncCollection(CollectionCommon["AsyncServerAPI"]):
             include=get_request["include"],
             limit=limit,
             offset=offset,
+            cursor=cursor,
             tenant=self.tenant,
             database=self.database,
         )
@@ -376,6 +387,183 @@ class AsyncCollection(CollectionCommon["AsyncServerAPI"]):
             database=self.database,
         )
 
+    async def bulk_add(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[
+            Union[
+                OneOrMany[Embedding],
+                OneOrMany[PyEmbedding],
+            ]
+        ] = None,
+        metadatas: Optional[OneOrMany[Metadata]] = None,
+        documents: Optional[OneOrMany[Document]] = None,
+        images: Optional[OneOrMany[Image]] = None,
+        uris: Optional[OneOrMany[URI]] = None,
+        batch_size: int = 1000,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        on_progress: Optional[BulkProgressCallback] = None,
+    ) -> None:
+        """Add a large number of embeddings to the data store in batches. Batches are
+        embedded in a thread pool and written concurrently, so that computing the
+        embeddings of one batch overlaps with writing another.
+        Args:
+            ids: The ids of the embeddings you wish to add
+            embeddings: The embeddings to add. If None, embeddings will be computed based on the documents or images using the embedding_function set for the Collection. Optional.
+            metadatas: The metadata to associate with the embeddings. When querying, you can filter on this metadata. Optional.
+            documents: The documents to associate with the embeddings. Optional.
+            images: The images to associate with the embeddings. Optional.
+            uris: The uris of the images to associate with the embeddings. Optional.
+            batch_size: The number of records in each batch, at most the max batch size of the client. Defaults to 1000.
+            max_workers: The number of batches embedded and written at once. Defaults to 4.
+            max_retries: How many times to retry writing a batch after a transient error, such as a dropped connection or being rate limited. Defaults to 3.
+            on_progress: Called with the number of records added so far and the total after each batch is written. Optional.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If any of the records are invalid, as for add. No batch is written in that case.
+            Exception: The error of the first batch that fails. Batches that were written before it are not rolled back.
+
+        """
+        await self._bulk_write(
+            "add",
+            dict(
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=documents,
+                images=images,
+                uris=uris,
+            ),
+            batch_size=batch_size,
+            max_workers=max_workers,
+            max_retries=max_retries,
+            on_progress=on_progress,
+        )
+
+    async def bulk_upsert(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[
+            Union[
+                OneOrMany[Embedding],
+                OneOrMany[PyEmbedding],
+            ]
+        ] = None,
+        metadatas: Optional[OneOrMany[Metadata]] = None,
+        documents: Optional[OneOrMany[Document]] = None,
+        images: Optional[OneOrMany[Image]] = None,
+        uris: Optional[OneOrMany[URI]] = None,
+        batch_size: int = 1000,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        on_progress: Optional[BulkProgressCallback] = None,
+    ) -> None:
+        """Update a large number of embeddings, or add them if they don't exist, in
+        batches. Batches are embedded and written concurrently, as in bulk_add.
+        Args:
+            ids: The ids of the embeddings to update
+            embeddings: The embeddings to add. If None, embeddings will be computed based on the documents or images using the embedding_function set for the Collection. Optional.
+            metadatas: The metadata to associate with the embeddings. When querying, you can filter on this metadata. Optional.
+            documents: The documents to associate with the embeddings. Optional.
+            images: The images to associate with the embeddings. Optional.
+            uris: The uris of the images to associate with the embeddings. Optional.
+            batch_size: The number of records in each batch, at most the max batch size of the client. Defaults to 1000.
+            max_workers: The number of batches embedded and written at once. Defaults to 4.
+            max_retries: How many times to retry writing a batch after a transient error. Defaults to 3.
+            on_progress: Called with the number of records upserted so far and the total after each batch is written. Optional.
+
+        Returns:
+            None
+        """
+        await self._bulk_write(
+            "upsert",
+            dict(
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=documents,
+                images=images,
+                uris=uris,
+            ),
+            batch_size=batch_size,
+            max_workers=max_workers,
+            max_retries=max_retries,
+            on_progress=on_progress,
+        )
+
+    async def _bulk_write(
+        self,
+        operation: str,
+        records: Dict[str, Any],
+        batch_size: int,
+        max_workers: int,
+        max_retries: int,
+        on_progress: Optional[BulkProgressCallback],
+    ) -> None:
+        if max_workers <= 0:
+            raise ValueError(f"Expected max_workers to be positive, got {max_workers}")
+        retry_policy = self._bulk_retry_policy(max_retries)
+        batches = self._split_bulk_request(
+            **records,
+            batch_size=min(batch_size, await self._client.get_max_batch_size()),
+        )
+        if operation == "add":
+            prepare = self._validate_and_prepare_add_request
+        else:
+            prepare = self._validate_and_prepare_upsert_request
+
+        total = sum(len(batch["ids"]) for batch in batches)
+        written = 0
+        # Bound the batches in flight, so that only a few are held embedded at once
+        slots = asyncio.Semaphore(max_workers)
+        loop = asyncio.get_running_loop()
+
+        async def write(batch: InsertRecordSet) -> None:
+            nonlocal written
+            async with slots:
+                # Embedding functions are blocking, so run them off the event loop
+                request = await loop.run_in_executor(None, partial(prepare, **batch))
+                async for attempt in AsyncRetrying(**retry_policy):
+                    with attempt:
+                        if operation == "add":
+                            await self._client._add(
+                                collection_id=self.id,
+                                ids=request["ids"],
+                                embeddings=request["embeddings"],
+                                metadatas=request["metadatas"],
+                                documents=request["documents"],
+                                uris=request["uris"],
+                                tenant=self.tenant,
+                                database=self.database,
+                            )
+                        else:
+                            await self._client._upsert(
+                                collection_id=self.id,
+                                ids=request["ids"],
+                                embeddings=request["embeddings"],
+                                metadatas=request["metadatas"],
+                                documents=request["documents"],
+                                uris=request["uris"],
+                                tenant=self.tenant,
+                                database=self.database,
+                            )
+            written += len(request["ids"])
+            if on_progress is not None:
+                on_progress(written, total)
+
+        tasks = [asyncio.create_task(write(batch)) for batch in batches]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
     async def delete(
         self,
         ids: Optional[IDs] = None,
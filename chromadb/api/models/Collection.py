@@ -1,6 +1,12 @@
-from typing import TYPE_CHECKING, Optional, Union
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Set, Union
 
-from chromadb.api.models.CollectionCommon import CollectionCommon
+from tenacity import Retrying
+
+from chromadb.api.models.CollectionCommon import (
+    BulkProgressCallback,
+    CollectionCommon,
+)
 from chromadb.api.types import (
     URI,
     CollectionMetadata,
@@ -10,6 +16,7 @@ from chromadb.api.types import (
     Metadata,
     Document,
     Image,
+    InsertRecordSet,
     Where,
     IDs,
     GetResult,
@@ -105,6 +112,7 @@ class Collection(CollectionCommon["ServerAPI"]):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = ["metadatas", "documents"],
+        cursor: Optional[str] = None,
     ) -> GetResult:
         """Get embeddings and their associate data from the data store. If no ids or where filter is provided returns
         all embeddings up to limit starting at offset.
@@ -116,9 +124,10 @@ class Collection(CollectionCommon["ServerAPI"]):
             offset: The offset to start returning results from. Useful for paging results with limit. Optional.
             where_document: A WhereDocument type dict used to filter by the documents. E.g. `{"$contains": "hello"}`. Optional.
             include: A list of what to include in the results. Can contain `"embeddings"`, `"metadatas"`, `"documents"`. Ids are always included. Defaults to `["metadatas", "documents"]`. Optional.
+            cursor: The `next_cursor` of a previous result, to return the results after it. Unlike offset, reading a page this way costs the same however deep into the collection it is. Optional.
 
         Returns:
-            GetResult: A GetResult object containing the results.
+            GetResult: A GetResult object containing the results. When limit is set and the page is full, its `next_cursor` continues after it.
 
         """
         get_request = self._validate_and_prepare_get_request(
@@ -136,6 +145,7 @@ class Collection(CollectionCommon["ServerAPI"]):
             include=get_request["include"],
             limit=limit,
             offset=offset,
+            cursor=cursor,
             tenant=self.tenant,
             database=self.database,
         )
@@ -143,6 +153,51 @@ class Collection(CollectionCommon["ServerAPI"]):
             response=get_results, include=get_request["include"]
         )
 
+    def iter_get(
+        self,
+        ids: Optional[OneOrMany[ID]] = None,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        include: Include = ["metadatas", "documents"],
+        batch_size: int = 1000,
+    ) -> Iterator[GetResult]:
+        """Iterate over embeddings and their associated data in pages, without holding all of them in memory.
+        Each page resumes after the last entry of the previous one, so reading deep into a large collection
+        is as fast as reading its start.
+
+        Args:
+            ids: The ids of the embeddings to get. Optional.
+            where: A Where type dict used to filter results by. E.g. `{"$and": [{"color" : "red"}, {"price": {"$gte": 4.20}}]}`. Optional.
+            where_document: A WhereDocument type dict used to filter by the documents. E.g. `{"$contains": "hello"}`. Optional.
+            include: A list of what to include in the results. Can contain `"embeddings"`, `"metadatas"`, `"documents"`. Ids are always included. Defaults to `["metadatas", "documents"]`. Optional.
+            batch_size: The maximum number of results in each page. Defaults to 1000.
+
+        Returns:
+            Iterator[GetResult]: An iterator of GetResult objects, one per page.
+
+        """
+        get_request = self._validate_and_prepare_get_request(
+            ids=ids,
+            where=where,
+            where_document=where_document,
+            include=include,
+        )
+
+        pages = self._client._iter_get(
+            collection_id=self.id,
+            ids=get_request["ids"],
+            where=get_request["where"],
+            where_document=get_request["where_document"],
+            include=get_request["include"],
+            batch_size=batch_size,
+            tenant=self.tenant,
+            database=self.database,
+        )
+        return (
+            self._transform_get_response(response=page, include=get_request["include"])
+            for page in pages
+        )
+
     def peek(self, limit: int = 10) -> GetResult:
         """Get the first few results in the database up to limit
 
@@ -382,6 +437,190 @@ class Collection(CollectionCommon["ServerAPI"]):
             database=self.database,
         )
 
+    def bulk_add(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[
+            Union[
+                OneOrMany[Embedding],
+                OneOrMany[PyEmbedding],
+            ]
+        ] = None,
+        metadatas: Optional[OneOrMany[Metadata]] = None,
+        documents: Optional[OneOrMany[Document]] = None,
+        images: Optional[OneOrMany[Image]] = None,
+        uris: Optional[OneOrMany[URI]] = None,
+        batch_size: int = 1000,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        on_progress: Optional[BulkProgressCallback] = None,
+    ) -> None:
+        """Add a large number of embeddings to the data store in batches. Batches are
+        embedded and written concurrently, so that computing the embeddings of one batch
+        overlaps with writing another.
+        Args:
+            ids: The ids of the embeddings you wish to add
+            embeddings: The embeddings to add. If None, embeddings will be computed based on the documents or images using the embedding_function set for the Collection. Optional.
+            metadatas: The metadata to associate with the embeddings. When querying, you can filter on this metadata. Optional.
+            documents: The documents to associate with the embeddings. Optional.
+            images: The images to associate with the embeddings. Optional.
+            uris: The uris of the images to associate with the embeddings. Optional.
+            batch_size: The number of records in each batch, at most the max batch size of the client. Defaults to 1000.
+            max_workers: The number of batches embedded and written at once. Defaults to 4.
+            max_retries: How many times to retry writing a batch after a transient error, such as a dropped connection or being rate limited. Defaults to 3.
+            on_progress: Called with the number of records added so far and the total after each batch is written. Optional.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If any of the records are invalid, as for add. No batch is written in that case.
+            Exception: The error of the first batch that fails. Batches that were written before it are not rolled back.
+
+        """
+        self._bulk_write(
+            "add",
+            dict(
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=documents,
+                images=images,
+                uris=uris,
+            ),
+            batch_size=batch_size,
+            max_workers=max_workers,
+            max_retries=max_retries,
+            on_progress=on_progress,
+        )
+
+    def bulk_upsert(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[
+            Union[
+                OneOrMany[Embedding],
+                OneOrMany[PyEmbedding],
+            ]
+        ] = None,
+        metadatas: Optional[OneOrMany[Metadata]] = None,
+        documents: Optional[OneOrMany[Document]] = None,
+        images: Optional[OneOrMany[Image]] = None,
+        uris: Optional[OneOrMany[URI]] = None,
+        batch_size: int = 1000,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        on_progress: Optional[BulkProgressCallback] = None,
+    ) -> None:
+        """Update a large number of embeddings, or add them if they don't exist, in
+        batches. Batches are embedded and written concurrently, as in bulk_add.
+        Args:
+            ids: The ids of the embeddings to update
+            embeddings: The embeddings to add. If None, embeddings will be computed based on the documents or images using the embedding_function set for the Collection. Optional.
+            metadatas: The metadata to associate with the embeddings. When querying, you can filter on this metadata. Optional.
+            documents: The documents to associate with the embeddings. Optional.
+            images: The images to associate with the embeddings. Optional.
+            uris: The uris of the images to associate with the embeddings. Optional.
+            batch_size: The number of records in each batch, at most the max batch size of the client. Defaults to 1000.
+            max_workers: The number of batches embedded and written at once. Defaults to 4.
+            max_retries: How many times to retry writing a batch after a transient error. Defaults to 3.
+            on_progress: Called with the number of records upserted so far and the total after each batch is written. Optional.
+
+        Returns:
+            None
+        """
+        self._bulk_write(
+            "upsert",
+            dict(
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=documents,
+                images=images,
+                uris=uris,
+            ),
+            batch_size=batch_size,
+            max_workers=max_workers,
+            max_retries=max_retries,
+            on_progress=on_progress,
+        )
+
+    def _bulk_write(
+        self,
+        operation: str,
+        records: Dict[str, Any],
+        batch_size: int,
+        max_workers: int,
+        max_retries: int,
+        on_progress: Optional[BulkProgressCallback],
+    ) -> None:
+        if max_workers <= 0:
+            raise ValueError(f"Expected max_workers to be positive, got {max_workers}")
+        retry_policy = self._bulk_retry_policy(max_retries)
+        batches = self._split_bulk_request(
+            **records,
+            batch_size=min(batch_size, self._client.get_max_batch_size()),
+        )
+
+        def write(batch: InsertRecordSet) -> int:
+            # Embed once, then retry only the write
+            if operation == "add":
+                request = self._validate_and_prepare_add_request(**batch)
+            else:
+                request = self._validate_and_prepare_upsert_request(**batch)
+            for attempt in Retrying(**retry_policy):
+                with attempt:
+                    if operation == "add":
+                        self._client._add(
+                            collection_id=self.id,
+                            ids=request["ids"],
+                            embeddings=request["embeddings"],
+                            metadatas=request["metadatas"],
+                            documents=request["documents"],
+                            uris=request["uris"],
+                            tenant=self.tenant,
+                            database=self.database,
+                        )
+                    else:
+                        self._client._upsert(
+                            collection_id=self.id,
+                            ids=request["ids"],
+                            embeddings=request["embeddings"],
+                            metadatas=request["metadatas"],
+                            documents=request["documents"],
+                            uris=request["uris"],
+                            tenant=self.tenant,
+                            database=self.database,
+                        )
+            return len(request["ids"])
+
+        total = sum(len(batch["ids"]) for batch in batches)
+        written = 0
+        # Bound the batches in flight, so that only a few are held embedded at once
+        max_in_flight = 2 * max_workers
+        in_flight: Set["Future[int]"] = set()
+
+        def collect(return_when: str) -> None:
+            nonlocal written, in_flight
+            done, in_flight = wait(in_flight, return_when=return_when)
+            for future in done:
+                written += future.result()
+                if on_progress is not None:
+                    on_progress(written, total)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for batch in batches:
+                    if len(in_flight) >= max_in_flight:
+                        collect(FIRST_COMPLETED)
+                    in_flight.add(executor.submit(write, batch))
+                while in_flight:
+                    collect(FIRST_COMPLETED)
+            except BaseException:
+                for future in in_flight:
+                    future.cancel()
+                raise
+
     def delete(
         self,
         ids: Optional[IDs] = None,
@@ -4,6 +4,7 @@ from typing import (
     Callable,
     Dict,
     Generic,
+    List,
     Optional,
     Any,
     Set,
@@ -12,7 +13,9 @@ from typing import (
     cast,
 )
 from chromadb.types import Metadata
+import httpx
 import numpy as np
+from tenacity import retry_if_exception, stop_after_attempt, wait_random_exponential
 from uuid import UUID
 
 import chromadb.utils.embedding_functions as ef
@@ -21,6 +24,7 @@ from chromadb.api.types import (
     URIs,
     AddRequest,
     BaseRecordSet,
+    InsertRecordSet,
     CollectionMetadata,
     DataLoader,
     DeleteRequest,
@@ -58,6 +62,7 @@ from chromadb.api.types import (
     validate_record_set_for_embedding,
     validate_filter_set,
 )
+from chromadb.errors import RateLimitError
 from chromadb.api.collection_configuration import (
     UpdateCollectionConfiguration,
     overwrite_collection_configuration,
@@ -81,6 +86,18 @@ ClientT = TypeVar("ClientT", "ServerAPI", "AsyncServerAPI")
 
 T = TypeVar("T")
 
+# Called with the number of records written so far and the total
+BulkProgressCallback = Callable[[int, int], None]
+
+
+def _is_transient_error(e: BaseException) -> bool:
+    """Whether a failed write is worth retrying as is"""
+    return isinstance(e, (httpx.TransportError, RateLimitError))
+
+
+def _slice_field(values: Optional[List[T]], start: int, stop: int) -> Optional[List[T]]:
+    return None if values is None else values[start:stop]
+
 
 def validation_context(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
     """A decorator that wraps a method with a try-except block that catches
@@ -541,6 +558,69 @@ class CollectionCommon(Generic[ClientT]):
                 )
             )
 
+    @validation_context("bulk write")
+    def _split_bulk_request(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[
+            Union[
+                OneOrMany[Embedding],
+                OneOrMany[PyEmbedding],
+            ]
+        ],
+        metadatas: Optional[OneOrMany[Metadata]],
+        documents: Optional[OneOrMany[Document]],
+        images: Optional[OneOrMany[Image]],
+        uris: Optional[OneOrMany[URI]],
+        batch_size: int,
+    ) -> List[InsertRecordSet]:
+        """Split the records of a bulk add or upsert into batches of at most batch_size
+        records, as keyword arguments to _validate_and_prepare_add_request or
+        _validate_and_prepare_upsert_request. The records are validated as a whole
+        first, so that malformed input fails before any batch is written."""
+        if batch_size <= 0:
+            raise ValueError(f"Expected batch_size to be positive, got {batch_size}")
+
+        records = normalize_insert_record_set(
+            ids=ids,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            documents=documents,
+            images=images,
+            uris=uris,
+        )
+        validate_insert_record_set(record_set=records)
+
+        batches: List[InsertRecordSet] = []
+        for start in range(0, len(records["ids"]), batch_size):
+            stop = start + batch_size
+            batches.append(
+                InsertRecordSet(
+                    ids=records["ids"][start:stop],
+                    embeddings=_slice_field(records["embeddings"], start, stop),
+                    metadatas=_slice_field(records["metadatas"], start, stop),
+                    documents=_slice_field(records["documents"], start, stop),
+                    images=_slice_field(records["images"], start, stop),
+                    uris=_slice_field(records["uris"], start, stop),
+                )
+            )
+        return batches
+
+    @staticmethod
+    def _bulk_retry_policy(max_retries: int) -> Dict[str, Any]:
+        """Keyword arguments to tenacity's Retrying and AsyncRetrying to retry the
+        write of a batch on transient errors"""
+        if max_retries < 0:
+            raise ValueError(
+                f"Expected max_retries to be non-negative, got {max_retries}"
+            )
+        return dict(
+            retry=retry_if_exception(_is_transient_error),
+            stop=stop_after_attempt(max_retries + 1),
+            wait=wait_random_exponential(multiplier=0.5, max=10),
+            reraise=True,
+        )
+
     def _embed_record_set(
         self, record_set: BaseRecordSet, embeddable_fields: Optional[Set[str]] = None
     ) -> Embeddings:
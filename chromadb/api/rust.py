@@ -21,6 +21,7 @@ from chromadb.api.collection_configuration import (
 )
 from chromadb.auth import UserIdentity
 from chromadb.config import DEFAULT_DATABASE, DEFAULT_TENANT, Settings, System
+from chromadb.errors import InvalidArgumentError
 from chromadb.telemetry.product import ProductTelemetryClient
 from chromadb.telemetry.product.events import (
     CollectionAddEvent,
@@ -352,9 +353,13 @@ class RustBindingsAPI(ServerAPI):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = IncludeMetadataDocuments,
+        cursor: Optional[str] = None,
         tenant: str = DEFAULT_TENANT,
         database: str = DEFAULT_DATABASE,
     ) -> GetResult:
+        if cursor is not None:
+            raise InvalidArgumentError("Get cursors are not supported by this server")
+
         ids_amount = len(ids) if ids else 0
         self.product_telemetry_client.capture(
             CollectionGetEvent(
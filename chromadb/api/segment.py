@@ -25,6 +25,7 @@ from chromadb.ingest import Producer
 from chromadb.types import Collection as CollectionModel
 from chromadb import __version__
 from chromadb.errors import (
+    InvalidArgumentError,
     InvalidDimensionException,
     NotFoundError,
     VersionMismatchError,
@@ -63,6 +64,7 @@ from typing import (
     Optional,
     Sequence,
     Generator,
+    Iterator,
     List,
     Any,
     Callable,
@@ -413,7 +415,9 @@ class SegmentAPI(ServerAPI):
         tenant: str = DEFAULT_TENANT,
         database: str = DEFAULT_DATABASE,
     ) -> CollectionModel:
-        raise NotImplementedError("Collection forking is not implemented for SegmentAPI")
+        raise NotImplementedError(
+            "Collection forking is not implemented for SegmentAPI"
+        )
 
     @trace_method("SegmentAPI.delete_collection", OpenTelemetryGranularity.OPERATION)
     @override
@@ -614,6 +618,7 @@ class SegmentAPI(ServerAPI):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = IncludeMetadataDocuments,
+        cursor: Optional[str] = None,
         tenant: str = DEFAULT_TENANT,
         database: str = DEFAULT_DATABASE,
     ) -> GetResult:
@@ -633,6 +638,9 @@ class SegmentAPI(ServerAPI):
         if where_document is not None:
             validate_where_document(where_document)
 
+        if cursor is not None and not self._executor.supports_get_cursor:
+            raise InvalidArgumentError("Get cursors are not supported by this server")
+
         self._quota_enforcer.enforce(
             action=Action.GET,
             tenant=tenant,
@@ -658,7 +666,7 @@ class SegmentAPI(ServerAPI):
             GetPlan(
                 scan,
                 Filter(ids, where, where_document),
-                Limit(offset or 0, limit),
+                Limit(offset or 0, limit, cursor),
                 Projection(
                     "documents" in include,
                     "embeddings" in include,
@@ -669,6 +677,64 @@ class SegmentAPI(ServerAPI):
             )
         )
 
+    @trace_method("SegmentAPI._iter_get", OpenTelemetryGranularity.OPERATION)
+    @override
+    @rate_limit
+    def _iter_get(
+        self,
+        collection_id: UUID,
+        ids: Optional[IDs] = None,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        include: Include = IncludeMetadataDocuments,
+        batch_size: int = 1000,
+        tenant: str = DEFAULT_TENANT,
+        database: str = DEFAULT_DATABASE,
+    ) -> Iterator[GetResult]:
+        add_attributes_to_current_span(
+            {
+                "collection_id": str(collection_id),
+                "ids_count": len(ids) if ids else 0,
+            }
+        )
+
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive")
+
+        scan = self._scan(collection_id)
+
+        # TODO: Replace with unified validation
+        if where is not None:
+            validate_where(where)
+
+        if where_document is not None:
+            validate_where_document(where_document)
+
+        self._quota_enforcer.enforce(
+            action=Action.GET,
+            tenant=tenant,
+            ids=ids,
+            where=where,
+            where_document=where_document,
+            limit=batch_size,
+        )
+
+        return self._executor.iter_get(
+            GetPlan(
+                scan,
+                Filter(ids, where, where_document),
+                Limit(),
+                Projection(
+                    "documents" in include,
+                    "embeddings" in include,
+                    "metadatas" in include,
+                    False,
+                    "uris" in include,
+                ),
+            ),
+            batch_size,
+        )
+
     @trace_method("SegmentAPI._delete", OpenTelemetryGranularity.OPERATION)
     @override
     @rate_limit
@@ -13,7 +13,7 @@ from typing import (
 )
 from numpy.typing import NDArray
 import numpy as np
-from typing_extensions import TypedDict, Protocol, runtime_checkable
+from typing_extensions import NotRequired, TypedDict, Protocol, runtime_checkable
 import chromadb.errors as errors
 from chromadb.base_types import (
     Metadata,
@@ -392,6 +392,8 @@ class GetResult(TypedDict):
     data: Optional[Loadable]
     metadatas: Optional[List[Metadata]]
     included: Include
+    # Passed as the cursor of the next get, to return the entries after these
+    next_cursor: NotRequired[Optional[str]]
 
 
 class QueryRequest(TypedDict):
@@ -904,6 +906,13 @@ def validate_embeddings(embeddings: Embeddings) -> Embeddings:
         raise ValueError(
             f"Expected embeddings to be a list with at least one item, got {len(embeddings)} embeddings"
         )
+    if (
+        isinstance(embeddings, np.ndarray)
+        and embeddings.ndim == 2
+        and embeddings.dtype.kind in "iuf"
+    ):
+        _validate_embeddings_matrix(embeddings)
+        return embeddings
     if not all([isinstance(e, np.ndarray) for e in embeddings]):
         raise ValueError(
             "Expected each embedding in the embeddings to be a numpy array, got "
@@ -918,7 +927,9 @@ def validate_embeddings(embeddings: Embeddings) -> Embeddings:
             raise ValueError(
                 f"Expected each embedding in the embeddings to be a 1-dimensional numpy array with at least 1 int/float value. Got a 1-dimensional numpy array with no values at pos {i}"
             )
-        if not all(
+        # The values of a numeric array are all ints or floats, so only arrays of
+        # other dtypes (e.g. object or bool) need to be checked value by value
+        if embedding.dtype.kind not in "iuf" and not all(
             [
                 isinstance(value, (np.integer, float, np.floating))
                 and not isinstance(value, bool)
@@ -929,9 +940,34 @@ def validate_embeddings(embeddings: Embeddings) -> Embeddings:
                 "Expected each value in the embedding to be a int or float, got an embedding with "
                 f"{list(set([type(value).__name__ for value in embedding]))} - {embedding}"
             )
+        if (
+            embedding.dtype.kind not in "iu"
+            and not np.isfinite(
+                embedding.astype(np.float64, copy=False)
+                if embedding.dtype.kind == "O"
+                else embedding
+            ).all()
+        ):
+            raise ValueError(_non_finite_embedding_message(i))
     return embeddings
 
 
+def _validate_embeddings_matrix(embeddings: NDArray[Any]) -> None:
+    """Validates a 2-D numeric array of embeddings with one NumPy call per check"""
+    if embeddings.shape[1] == 0:
+        raise ValueError(
+            "Expected each embedding in the embeddings to be a 1-dimensional numpy array with at least 1 int/float value. Got a 1-dimensional numpy array with no values at pos 0"
+        )
+    if embeddings.dtype.kind == "f":
+        finite = np.isfinite(embeddings).all(axis=1)
+        if not finite.all():
+            raise ValueError(_non_finite_embedding_message(int(np.argmin(finite))))
+
+
+def _non_finite_embedding_message(pos: int) -> str:
+    return f"Expected each value in the embedding to be a finite int or float, got NaN or infinity in the embedding at pos {pos}"
+
+
 def validate_documents(documents: Documents, nullable: bool = False) -> None:
     """Validates documents to ensure it is a list of strings"""
     if not isinstance(documents, list):
@@ -985,4 +1021,13 @@ def convert_np_embeddings_to_list(embeddings: Embeddings) -> PyEmbeddings:
 
 
 def convert_list_embeddings_to_np(embeddings: PyEmbeddings) -> Embeddings:
+    try:
+        matrix = np.array(embeddings)
+    except ValueError:
+        # Embeddings of different dimensions
+        matrix = None
+    if matrix is not None and matrix.ndim == 2 and matrix.dtype.kind in "iuf":
+        # Rows of a single float32 matrix, which is how they are stored
+        return list(matrix.astype(np.float32, copy=False))
+    # Leave anything else as is, to be reported by validate_embeddings
     return [np.array(embedding) for embedding in embeddings]
@@ -1,11 +1,15 @@
+import argparse
+import os
 import re
 import sys
+from typing import Sequence
 
 import chromadb_rust_bindings
 import requests
 from packaging.version import parse
 
 import chromadb
+from chromadb.config import DEFAULT_DATABASE, DEFAULT_TENANT, Settings, System
 
 
 def build_cli_args(**kwargs):
@@ -19,7 +23,7 @@ def build_cli_args(**kwargs):
     return args
 
 
-def update():
+def update() -> None:
     try:
         url = f"https://api.github.com/repos/chroma-core/chroma/releases"
         response = requests.get(url)
@@ -45,11 +49,83 @@ def update():
         print("Couldn't fetch the latest Chroma version")
 
 
-def app():
+def compact(args: Sequence[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="chroma compact",
+        description="Rebuild the vector indexes of a persistent Chroma directory "
+        "without their deleted elements",
+    )
+    parser.add_argument(
+        "--path", default="./chroma", help="The persistent directory of Chroma"
+    )
+    parser.add_argument(
+        "--collection",
+        action="append",
+        help="The name of a collection to compact, which may be repeated. "
+        "Defaults to every collection of the database.",
+    )
+    parser.add_argument("--tenant", default=DEFAULT_TENANT)
+    parser.add_argument("--database", default=DEFAULT_DATABASE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0,
+        help="Only compact indexes with at least this fraction of deleted elements",
+    )
+    parsed = parser.parse_args(args)
+
+    if not os.path.isdir(parsed.path):
+        print(f"{parsed.path} is not a Chroma directory", file=sys.stderr)
+        sys.exit(1)
+
+    from chromadb.db.system import SysDB
+    from chromadb.segment import SegmentManager
+    from chromadb.segment.impl.manager.local import LocalSegmentManager
+
+    system = System(
+        Settings(
+            is_persistent=True,
+            persist_directory=parsed.path,
+            chroma_api_impl="chromadb.api.segment.SegmentAPI",
+        )
+    )
+    system.start()
+    try:
+        sysdb = system.instance(SysDB)
+        manager = system.instance(SegmentManager)
+        assert isinstance(manager, LocalSegmentManager)
+        names = parsed.collection or [None]
+        for name in names:
+            collections = sysdb.get_collections(
+                name=name, tenant=parsed.tenant, database=parsed.database
+            )
+            if name is not None and len(collections) == 0:
+                print(f"Collection {name} does not exist", file=sys.stderr)
+                sys.exit(1)
+            for collection in collections:
+                info = manager.compaction_info(collection.id)
+                if manager.compact_collection(collection.id, parsed.threshold):
+                    print(
+                        f"Compacted {collection.name}: removed {info.tombstones} "
+                        f"of {info.elements} elements"
+                    )
+                else:
+                    print(
+                        f"Skipped {collection.name}: {info.tombstones} of "
+                        f"{info.elements} elements are deleted"
+                    )
+    finally:
+        system.stop()
+
+
+def app() -> None:
     args = sys.argv
     if ["chroma", "update"] in args:
         update()
         return
+    if args[1:2] == ["compact"]:
+        compact(args[2:])
+        return
     try:
         chromadb_rust_bindings.cli(args)
     except KeyboardInterrupt:
@@ -163,6 +163,37 @@ class Settings(BaseSettings):  # type: ignore
 
     chroma_memory_limit_bytes: int = 0
     chroma_segment_cache_policy: Optional[str] = None
+    # Keep writing the legacy index_metadata.pickle of persistent HNSW segments next
+    # to their id map, for readers of the old format such as the Rust local segment,
+    # or to downgrade to a version without the id map. Each persist then rewrites
+    # all of the segment's id mappings, so it is off by default.
+    chroma_hnsw_legacy_metadata: bool = False
+    # Defer loading persistent vector segments until their first query or write.
+    # Counts are served from the segment's id map header until then.
+    chroma_segment_lazy_load: bool = False
+    # With lazy loading, how many of the most recently used vector segments to
+    # load in the background on startup
+    chroma_segment_prefetch_count: int = 16
+    # Rebuild a persistent HNSW index in the background once this fraction of its
+    # elements are deleted. Deleted elements are only marked in the graph, so they
+    # keep costing search time, memory and disk until then. 0, the default,
+    # disables it; indexes can still be compacted explicitly, e.g. with the CLI.
+    chroma_hnsw_compaction_threshold: float = 0
+    # The fewest deleted elements an index must hold to be compacted automatically
+    chroma_hnsw_compaction_min_tombstones: int = 10000
+    # How often to purge records that all segments have persisted from the WAL, when
+    # automatic purging is enabled. 0 purges synchronously on every submit.
+    chroma_wal_purge_interval_ms: int = 0
+    # With a purge interval, purge early once this many bytes were submitted since
+    # the last purge
+    chroma_wal_purge_threshold_bytes: int = 64 * 1024 * 1024
+    # How many query and get results the local executor caches. Results are keyed by
+    # their plan and the max seq ids of the segments they read, so any write to a
+    # collection invalidates its results. 0 disables the cache.
+    chroma_query_cache_size: int = 0
+    # How long a cached query result is served for, in seconds. 0 serves it until it
+    # is invalidated or evicted.
+    chroma_query_cache_ttl_seconds: float = 0
 
     allow_reset: bool = False
 
@@ -1,8 +1,9 @@
-from typing import Any, Optional, Sequence, Tuple, Type
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple, Type
 from types import TracebackType
 from typing_extensions import Protocol, Self, Literal
 from abc import ABC, abstractmethod
-from threading import local
+from threading import Lock, local
 from overrides import override, EnforceOverrides
 import pypika
 import pypika.queries
@@ -14,6 +15,8 @@ from itertools import islice, count
 class Cursor(Protocol):
     """Reifies methods we use from a DBAPI2 Cursor since DBAPI2 is not typed."""
 
+    rowcount: int
+
     def execute(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> Self:
         ...
 
@@ -28,6 +31,9 @@ class Cursor(Protocol):
     def fetchone(self) -> Tuple[Any, ...]:
         ...
 
+    def fetchmany(self, size: int = ...) -> Sequence[Tuple[Any, ...]]:
+        ...
+
     def fetchall(self) -> Sequence[Tuple[Any, ...]]:
         ...
 
@@ -54,10 +60,54 @@ class TxWrapper(ABC, EnforceOverrides):
         pass
 
 
+class StatementCache:
+    """A bounded cache of compiled SQL statements, keyed by query shape.
+
+    A statement is built once, the first time its shape is used, and its SQL is reused
+    for every later execution with freshly bound parameters. Since the SQL is
+    identical, DBAPI drivers that cache prepared statements by SQL text (such as
+    sqlite3) reuse those too.
+
+    The statements must be built with positional placeholders (see SqlDB.param())
+    rather than ParameterValue, so that the SQL does not depend on the values it is
+    executed with. Shapes that depend on the number of values, such as IN lists or
+    multi-row inserts, should include that number in their key.
+    """
+
+    _statements: "OrderedDict[Hashable, str]"
+    _max_size: int
+    _lock: Lock
+
+    def __init__(self, max_size: int = 1024):
+        self._statements = OrderedDict()
+        self._max_size = max_size
+        self._lock = Lock()
+
+    def get(self, key: Hashable, build: Callable[[], str]) -> str:
+        """Return the SQL cached for key, calling build() to compile it on a miss"""
+        with self._lock:
+            sql = self._statements.get(key)
+            if sql is not None:
+                self._statements.move_to_end(key)
+                return sql
+        sql = build()
+        with self._lock:
+            self._statements[key] = sql
+            while len(self._statements) > self._max_size:
+                self._statements.popitem(last=False)
+        return sql
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+
 class SqlDB(Component):
     """DBAPI 2.0 interface wrapper to ensure consistent behavior between implementations"""
 
+    _statement_cache: StatementCache
+
     def __init__(self, system: System):
+        self._statement_cache = StatementCache()
         super().__init__(system)
 
     @abstractmethod
@@ -105,6 +155,15 @@ class SqlDB(Component):
         """Return a PyPika Parameter object for the given index"""
         return pypika.Parameter(self.parameter_format().format(idx))
 
+    def params(self, n: int, start: int = 1) -> List[pypika.Parameter]:
+        """Return PyPika Parameter objects for n consecutive indexes"""
+        return [self.param(i) for i in range(start, start + n)]
+
+    def statement(self, key: Hashable, build: Callable[[], str]) -> str:
+        """Return the compiled SQL for a query shape, building it with build() only
+        the first time key is seen. See StatementCache."""
+        return self._statement_cache.get(key, build)
+
 
 _context = local()
 
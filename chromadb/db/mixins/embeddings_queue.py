@@ -4,13 +4,13 @@ from chromadb.api.configuration import (
     ConfigurationParameter,
     EmbeddingsQueueConfigurationInternal,
 )
-from chromadb.db.base import SqlDB, ParameterValue, get_sql
+from chromadb.db.base import Cursor, SqlDB, ParameterValue, get_sql
 from chromadb.errors import BatchSizeExceededError
 from chromadb.ingest import (
     Producer,
     Consumer,
     ConsumerCallbackFn,
-    decode_vector,
+    decode_vectors,
     encode_vector,
 )
 from chromadb.types import (
@@ -19,18 +19,23 @@ from chromadb.types import (
     ScalarEncoding,
     SeqId,
     Operation,
+    Vector,
 )
 from chromadb.config import System
 from chromadb.telemetry.opentelemetry import (
     OpenTelemetryClient,
     OpenTelemetryGranularity,
+    add_attributes_to_current_span,
     trace_method,
 )
 from overrides import override
 from collections import defaultdict
-from typing import Sequence, Optional, Dict, Set, Tuple, cast
+from typing import Any, List, Sequence, Optional, Dict, Set, Tuple, cast
+from typing_extensions import TypedDict
 from uuid import UUID
 from pypika import Table, functions
+from threading import Event, Lock, Thread
+import time
 import uuid
 import logging
 from chromadb.ingest.impl.utils import create_topic_name
@@ -46,6 +51,19 @@ _operation_codes = {
 }
 _operation_codes_inv = {v: k for k, v in _operation_codes.items()}
 
+
+class WALStats(TypedDict):
+    # Records currently in the log
+    records: int
+    # Records purged from the log since start
+    purged_records: int
+    # Bytes submitted to collections whose logs have not been purged since
+    pending_purge_bytes: int
+    pending_purge_collections: int
+    # How long the oldest submit has waited for a purge
+    purge_lag_seconds: float
+
+
 # Set in conftest.py to rethrow errors in the "async" path during testing
 # https://doc.pytest.org/en/latest/example/simple.html#detect-if-running-from-within-a-pytest-run
 _called_from_test = False
@@ -90,6 +108,23 @@ class SqlEmbeddingsQueue(SqlDB, Producer, Consumer):
     _topic_namespace: str
     # How many variables are in the insert statement for a single record
     VARIABLES_PER_RECORD = 6
+    # How many records to read from the log and deliver to a subscriber at a time when
+    # backfilling it
+    BACKFILL_CHUNK_SIZE = 1000
+
+    # With a purge interval, logs are purged by a background thread. Collections
+    # written to since the last purge are tracked with the number of bytes written.
+    _purge_interval_ms: int
+    _purge_threshold_bytes: int
+    _purge_lock: Lock
+    _pending_purge: Dict[UUID, int]
+    _pending_purge_since: Optional[float]
+    # The seq_id each collection's log was last purged up to
+    _purge_watermarks: Dict[UUID, SeqId]
+    _purged_records: int
+    _purge_thread: Optional[Thread]
+    _purge_wakeup: Event
+    _stop_purge: Event
 
     def __init__(self, system: System):
         self._subscriptions = defaultdict(set)
@@ -97,13 +132,45 @@ class SqlEmbeddingsQueue(SqlDB, Producer, Consumer):
         self._opentelemetry_client = system.require(OpenTelemetryClient)
         self._tenant = system.settings.require("tenant_id")
         self._topic_namespace = system.settings.require("topic_namespace")
+        self._purge_interval_ms = system.settings.chroma_wal_purge_interval_ms
+        self._purge_threshold_bytes = system.settings.chroma_wal_purge_threshold_bytes
+        self._purge_lock = Lock()
+        self._pending_purge = {}
+        self._pending_purge_since = None
+        self._purge_watermarks = {}
+        self._purged_records = 0
+        self._purge_thread = None
+        self._purge_wakeup = Event()
+        self._stop_purge = Event()
         super().__init__(system)
 
+    @override
+    def start(self) -> None:
+        super().start()
+        if self._purge_interval_ms > 0:
+            self._stop_purge.clear()
+            self._purge_thread = Thread(target=self._run_purge_loop, daemon=True)
+            self._purge_thread.start()
+
+    @override
+    def stop(self) -> None:
+        if self._purge_thread is not None:
+            # The purge loop runs a final purge before exiting
+            self._stop_purge.set()
+            self._purge_wakeup.set()
+            self._purge_thread.join()
+            self._purge_thread = None
+        super().stop()
+
     @trace_method("SqlEmbeddingsQueue.reset_state", OpenTelemetryGranularity.ALL)
     @override
     def reset_state(self) -> None:
         super().reset_state()
         self._subscriptions = defaultdict(set)
+        with self._purge_lock:
+            self._pending_purge = {}
+            self._pending_purge_since = None
+            self._purge_watermarks = {}
 
         # Invalidate the cached property
         try:
@@ -132,10 +199,99 @@ class SqlEmbeddingsQueue(SqlDB, Producer, Consumer):
     @trace_method("SqlEmbeddingsQueue.purge_log", OpenTelemetryGranularity.ALL)
     @override
     def purge_log(self, collection_id: UUID) -> None:
+        with self.tx() as cur:
+            purged = self._purge_logs(cur, [collection_id])
+        with self._purge_lock:
+            self._purged_records += purged
+
+    def _purge_logs(self, cur: Cursor, collection_ids: Sequence[UUID]) -> int:
+        """Purge the records that every segment of each collection has persisted, and
+        return how many were deleted. Collections whose watermark did not move since
+        their last purge are skipped."""
         # (We need to purge on a per topic/collection basis, because the maximum sequence ID is tracked on a per topic/collection basis.)
+        min_seq_ids_sql = self.statement(
+            "SqlEmbeddingsQueue.purge_log.min_seq_ids", self._min_seq_ids_sql
+        )
+        deletes: List[Tuple[SeqId, str]] = []
+        watermarks: Dict[UUID, SeqId] = {}
+        for collection_id in collection_ids:
+            cur.execute(min_seq_ids_sql, (self.uuid_to_db(collection_id),))
+            results = cur.fetchall()
+            if not results:
+                continue
+            min_seq_id = min(row[0] for row in results)
+            if self._purge_watermarks.get(collection_id) == min_seq_id:
+                continue
+            topic_name = create_topic_name(
+                self._tenant, self._topic_namespace, collection_id
+            )
+            deletes.append((min_seq_id, topic_name))
+            watermarks[collection_id] = min_seq_id
+
+        if len(deletes) == 0:
+            return 0
+        sql = self.statement("SqlEmbeddingsQueue.purge_log", self._purge_log_sql)
+        cur.executemany(sql, deletes)
+        with self._purge_lock:
+            self._purge_watermarks.update(watermarks)
+        return cur.rowcount
+
+    @trace_method("SqlEmbeddingsQueue.purge_pending_logs", OpenTelemetryGranularity.ALL)
+    def purge_pending_logs(self) -> None:
+        """Purge the logs of all collections written to since the last purge in one
+        transaction"""
+        with self._purge_lock:
+            pending = self._pending_purge
+            self._pending_purge = {}
+            self._pending_purge_since = None
+        if len(pending) == 0:
+            return
+
+        try:
+            with self.tx() as cur:
+                purged = self._purge_logs(cur, list(pending.keys()))
+        except BaseException:
+            # Retry these collections on the next purge
+            with self._purge_lock:
+                for collection_id, num_bytes in pending.items():
+                    self._pending_purge[collection_id] = (
+                        self._pending_purge.get(collection_id, 0) + num_bytes
+                    )
+                self._pending_purge_since = self._pending_purge_since or time.time()
+            raise
+
+        with self._purge_lock:
+            self._purged_records += purged
+
+    def _run_purge_loop(self) -> None:
+        """Purge pending logs every chroma_wal_purge_interval_ms, or earlier once
+        chroma_wal_purge_threshold_bytes were submitted, until stopped"""
+        while not self._stop_purge.is_set():
+            self._purge_wakeup.wait(self._purge_interval_ms / 1000)
+            self._purge_wakeup.clear()
+            try:
+                self.purge_pending_logs()
+            except Exception as e:
+                logger.error(f"Failed to purge the log: {e}")
+
+    def wal_stats(self) -> WALStats:
+        """Return counters for the size of the log and how far purging lags behind"""
+        with self._purge_lock:
+            pending_bytes = sum(self._pending_purge.values())
+            pending_collections = len(self._pending_purge)
+            since = self._pending_purge_since
+            purged_records = self._purged_records
+        return WALStats(
+            records=self._get_wal_size(),
+            purged_records=purged_records,
+            pending_purge_bytes=pending_bytes,
+            pending_purge_collections=pending_collections,
+            purge_lag_seconds=time.time() - since if since is not None else 0.0,
+        )
 
+    def _min_seq_ids_sql(self) -> str:
         segments_t = Table("segments")
-        segment_ids_q = (
+        q = (
             self.querybuilder()
             .from_(segments_t)
             # This coalesce prevents a correctness bug when > 1 segments exist and:
@@ -143,36 +299,47 @@ class SqlEmbeddingsQueue(SqlDB, Producer, Consumer):
             # - > 1 has not never written to the max_seq_id table
             # In that case, we should not delete any WAL entries as we can't be sure that the all segments are caught up.
             .select(functions.Coalesce(Table("max_seq_id").seq_id, -1))
-            .where(
-                segments_t.collection == ParameterValue(self.uuid_to_db(collection_id))
-            )
+            .where(segments_t.collection == self.param(1))
             .left_join(Table("max_seq_id"))
             .on(segments_t.id == Table("max_seq_id").segment_id)
         )
+        return q.get_sql()
 
+    def _purge_log_sql(self) -> str:
+        t = Table("embeddings_queue")
+        q = (
+            self.querybuilder()
+            .from_(t)
+            .where(t.seq_id < self.param(1))
+            .where(t.topic == self.param(2))
+            .delete()
+        )
+        return q.get_sql()
+
+    @trace_method("SqlEmbeddingsQueue.has_records_after", OpenTelemetryGranularity.ALL)
+    def has_records_after(self, collection_id: UUID, seq_id: SeqId) -> bool:
+        """Return whether the collection's log holds any record after seq_id"""
         topic_name = create_topic_name(
             self._tenant, self._topic_namespace, collection_id
         )
+        sql = self.statement(
+            "SqlEmbeddingsQueue.has_records_after", self._has_records_after_sql
+        )
         with self.tx() as cur:
-            sql, params = get_sql(segment_ids_q, self.parameter_format())
-            cur.execute(sql, params)
-            results = cur.fetchall()
-            if results:
-                min_seq_id = min(row[0] for row in results)
-            else:
-                return
-
-            t = Table("embeddings_queue")
-            q = (
-                self.querybuilder()
-                .from_(t)
-                .where(t.seq_id < ParameterValue(min_seq_id))
-                .where(t.topic == ParameterValue(topic_name))
-                .delete()
-            )
+            cur.execute(sql, (topic_name, seq_id))
+            return cur.fetchone() is not None
 
-            sql, params = get_sql(q, self.parameter_format())
-            cur.execute(sql, params)
+    def _has_records_after_sql(self) -> str:
+        t = Table("embeddings_queue")
+        q = (
+            self.querybuilder()
+            .from_(t)
+            .select(t.seq_id)
+            .where(t.topic == self.param(1))
+            .where(t.seq_id > self.param(2))
+            .limit(1)
+        )
+        return q.get_sql()
 
     @trace_method("SqlEmbeddingsQueue.submit_embedding", OpenTelemetryGranularity.ALL)
     @override
@@ -213,12 +380,8 @@ class SqlEmbeddingsQueue(SqlDB, Producer, Consumer):
             self._tenant, self._topic_namespace, collection_id
         )
 
-        t = Table("embeddings_queue")
-        insert = (
-            self.querybuilder()
-            .into(t)
-            .columns(t.operation, t.topic, t.id, t.vector, t.encoding, t.metadata)
-        )
+        params: List[Any] = []
+        num_bytes = 0
         id_to_idx: Dict[str, int] = {}
         for embedding in embeddings:
             (
@@ -226,21 +389,26 @@ class SqlEmbeddingsQueue(SqlDB, Producer, Consumer):
                 encoding,
                 metadata,
             ) = self._prepare_vector_encoding_metadata(embedding)
-            insert = insert.insert(
-                ParameterValue(_operation_codes[embedding["operation"]]),
-                ParameterValue(topic_name),
-                ParameterValue(embedding["id"]),
-                ParameterValue(embedding_bytes),
-                ParameterValue(encoding),
-                ParameterValue(metadata),
+            params.extend(
+                (
+                    _operation_codes[embedding["operation"]],
+                    topic_name,
+                    embedding["id"],
+                    embedding_bytes,
+                    encoding,
+                    metadata,
+                )
             )
+            num_bytes += len(embedding_bytes or b"") + len(metadata or "")
             id_to_idx[embedding["id"]] = len(id_to_idx)
+        sql = self.statement(
+            ("SqlEmbeddingsQueue.submit_embeddings", len(embeddings)),
+            lambda: self._submit_embeddings_sql(len(embeddings)),
+        )
         with self.tx() as cur:
-            sql, params = get_sql(insert, self.parameter_format())
             # The returning clause does not guarantee order, so we need to do reorder
             # the results. https://www.sqlite.org/lang_returning.html
-            sql = f"{sql} RETURNING seq_id, id"  # Pypika doesn't support RETURNING
-            results = cur.execute(sql, params).fetchall()
+            results = cur.execute(sql, tuple(params)).fetchall()
             # Reorder the results
             seq_ids = [cast(SeqId, None)] * len(
                 results
@@ -264,11 +432,51 @@ class SqlEmbeddingsQueue(SqlDB, Producer, Consumer):
                 embedding_records.append(embedding_record)
             self._notify_all(topic_name, embedding_records)
 
-            if self.config.get_parameter("automatically_purge").value:
-                self.purge_log(collection_id)
+            self.request_purge(collection_id, num_bytes)
 
             return seq_ids
 
+    def request_purge(self, collection_id: UUID, num_bytes: int = 0) -> None:
+        """Purge the collection's log now, or schedule it for the next purge if there
+        is a purge interval, when automatic purging is enabled. Also called by
+        segments that persisted in the background, which may make more of the log
+        purgeable."""
+        if self.config.get_parameter("automatically_purge").value:
+            if self._purge_interval_ms > 0:
+                self._add_pending_purge(collection_id, num_bytes)
+            else:
+                self.purge_log(collection_id)
+
+    def _add_pending_purge(self, collection_id: UUID, num_bytes: int) -> None:
+        """Schedule the collection's log for the next purge"""
+        with self._purge_lock:
+            self._pending_purge[collection_id] = (
+                self._pending_purge.get(collection_id, 0) + num_bytes
+            )
+            if self._pending_purge_since is None:
+                self._pending_purge_since = time.time()
+            threshold_reached = (
+                sum(self._pending_purge.values()) >= self._purge_threshold_bytes
+            )
+        if threshold_reached:
+            self._purge_wakeup.set()
+
+    def _submit_embeddings_sql(self, n: int) -> str:
+        t = Table("embeddings_queue")
+        insert = (
+            self.querybuilder()
+            .into(t)
+            .columns(t.operation, t.topic, t.id, t.vector, t.encoding, t.metadata)
+        )
+        for i in range(n):
+            insert = insert.insert(
+                *self.params(
+                    self.VARIABLES_PER_RECORD, start=i * self.VARIABLES_PER_RECORD + 1
+                )
+            )
+        # Pypika doesn't support RETURNING
+        return f"{insert.get_sql()} RETURNING seq_id, id"
+
     @trace_method("SqlEmbeddingsQueue.subscribe", OpenTelemetryGranularity.ALL)
     @override
     def subscribe(
@@ -361,43 +569,91 @@ class SqlEmbeddingsQueue(SqlDB, Producer, Consumer):
     @trace_method("SqlEmbeddingsQueue._backfill", OpenTelemetryGranularity.ALL)
     def _backfill(self, subscription: Subscription) -> None:
         """Backfill the given subscription with any currently matching records in the
-        DB"""
+        DB. Records are streamed to the subscriber in chunks of up to
+        BACKFILL_CHUNK_SIZE, rather than loaded all at once. Each chunk is read in
+        its own transaction, which is closed before the subscriber gets it. The
+        backfill stops at the first chunk the subscriber fails on, so that it never
+        skips records."""
+        sql = self.statement("SqlEmbeddingsQueue._backfill", self._backfill_sql)
+        last_seq_id = subscription.start
+        num_records = 0
+        num_chunks = 0
+        while True:
+            with self.tx() as cur:
+                cur.execute(
+                    sql,
+                    (
+                        subscription.topic_name,
+                        last_seq_id,
+                        subscription.end,
+                        self.BACKFILL_CHUNK_SIZE,
+                    ),
+                )
+                rows = cur.fetchall()
+            if len(rows) == 0:
+                break
+            if not self._notify_one(subscription, self._decode_log_records(rows)):
+                break
+            last_seq_id = rows[-1][0]
+            num_records += len(rows)
+            num_chunks += 1
+            add_attributes_to_current_span(
+                {
+                    "topic": subscription.topic_name,
+                    "backfill_records": num_records,
+                    "backfill_chunks": num_chunks,
+                    "backfill_seq_id": last_seq_id,
+                }
+            )
+            if len(rows) < self.BACKFILL_CHUNK_SIZE:
+                break
+
+    def _decode_log_records(
+        self, rows: Sequence[Tuple[Any, ...]]
+    ) -> Sequence[LogRecord]:
+        """Decode rows of the embeddings_queue table into LogRecords. Vectors with the
+        same encoding and size are decoded together."""
+        vectors: List[Optional[Vector]] = [None] * len(rows)
+        encodings: List[Optional[ScalarEncoding]] = [None] * len(rows)
+        groups: Dict[Tuple[str, int], List[int]] = defaultdict(list)
+        for i, row in enumerate(rows):
+            if row[3]:
+                groups[(row[4], len(row[3]))].append(i)
+        for (encoding_name, _), indexes in groups.items():
+            encoding = ScalarEncoding(encoding_name)
+            decoded = decode_vectors([rows[i][3] for i in indexes], encoding)
+            for i, vector in zip(indexes, decoded):
+                vectors[i] = vector
+                encodings[i] = encoding
+
+        return [
+            LogRecord(
+                log_offset=row[0],
+                record=OperationRecord(
+                    operation=_operation_codes_inv[row[1]],
+                    id=row[2],
+                    embedding=vectors[i],
+                    encoding=encodings[i],
+                    metadata=json.loads(row[5]) if row[5] else None,
+                ),
+            )
+            for i, row in enumerate(rows)
+        ]
+
+    def _backfill_sql(self) -> str:
         t = Table("embeddings_queue")
         q = (
             self.querybuilder()
             .from_(t)
-            .where(t.topic == ParameterValue(subscription.topic_name))
-            .where(t.seq_id > ParameterValue(subscription.start))
-            .where(t.seq_id <= ParameterValue(subscription.end))
+            .where(t.topic == self.param(1))
+            .where(t.seq_id > self.param(2))
+            .where(t.seq_id <= self.param(3))
             .select(t.seq_id, t.operation, t.id, t.vector, t.encoding, t.metadata)
             .orderby(t.seq_id)
+            # pypika annotates limit as int, but renders parameters as-is
+            .limit(self.param(4))  # type: ignore[arg-type]
         )
-        with self.tx() as cur:
-            sql, params = get_sql(q, self.parameter_format())
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-            for row in rows:
-                if row[3]:
-                    encoding = ScalarEncoding(row[4])
-                    vector = decode_vector(row[3], encoding)
-                else:
-                    encoding = None
-                    vector = None
-                self._notify_one(
-                    subscription,
-                    [
-                        LogRecord(
-                            log_offset=row[0],
-                            record=OperationRecord(
-                                operation=_operation_codes_inv[row[1]],
-                                id=row[2],
-                                embedding=vector,
-                                encoding=encoding,
-                                metadata=json.loads(row[5]) if row[5] else None,
-                            ),
-                        )
-                    ],
-                )
+        return q.get_sql()
 
     @trace_method("SqlEmbeddingsQueue._validate_range", OpenTelemetryGranularity.ALL)
     def _validate_range(
@@ -430,8 +686,9 @@ class SqlEmbeddingsQueue(SqlDB, Producer, Consumer):
                 self._notify_one(sub, embeddings)
 
     @trace_method("SqlEmbeddingsQueue._notify_one", OpenTelemetryGranularity.ALL)
-    def _notify_one(self, sub: Subscription, embeddings: Sequence[LogRecord]) -> None:
-        """Send a notification to a single subscriber."""
+    def _notify_one(self, sub: Subscription, embeddings: Sequence[LogRecord]) -> bool:
+        """Send a notification to a single subscriber. Returns whether it was
+        delivered."""
         # Filter out any embeddings that are not in the subscription range
         should_unsubscribe = False
         filtered_embeddings = []
@@ -458,6 +715,8 @@ class SqlEmbeddingsQueue(SqlDB, Producer, Consumer):
             )
             if _called_from_test:
                 raise e
+            return False
+        return True
 
     @cached_property
     def config(self) -> EmbeddingsQueueConfigurationInternal:
@@ -1,11 +1,17 @@
 from abc import abstractmethod
+from dataclasses import replace
+from typing import Iterator
 
 from chromadb.api.types import GetResult, QueryResult
 from chromadb.config import Component
+from chromadb.execution.expression.operator import Limit
 from chromadb.execution.expression.plan import CountPlan, GetPlan, KNNPlan
 
 
 class Executor(Component):
+    # Whether get plans can start after a cursor, see Limit
+    supports_get_cursor: bool = True
+
     @abstractmethod
     def count(self, plan: CountPlan) -> int:
         pass
@@ -14,6 +20,18 @@ class Executor(Component):
     def get(self, plan: GetPlan) -> GetResult:
         pass
 
+    def iter_get(self, plan: GetPlan, batch_size: int) -> Iterator[GetResult]:
+        """Yield the result of a get plan in pages of at most batch_size records. The
+        limit of the plan is ignored. By default pages are read by offset."""
+        skip = 0
+        while True:
+            page = self.get(replace(plan, limit=Limit(skip, batch_size)))
+            if len(page["ids"]) > 0:
+                yield page
+            if len(page["ids"]) < batch_size:
+                return
+            skip += batch_size
+
     @abstractmethod
     def knn(self, plan: KNNPlan) -> QueryResult:
         pass
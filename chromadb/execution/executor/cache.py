@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, NamedTuple, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class QueryCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class QueryResultCache(Generic[T]):
+    """An LRU of query results, bounded in entries and, if ttl_seconds is positive,
+    in age. Keys are opaque digests; callers make a write invalidate its results by
+    keying them on the state of the data they read."""
+
+    def __init__(
+        self,
+        capacity: int,
+        ttl_seconds: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        # Results with the time they were cached, least recently used first
+        self._entries: "OrderedDict[bytes, Tuple[float, T]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[T]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, key: bytes, value: T) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def cache_info(self) -> QueryCacheInfo:
+        with self._lock:
+            return QueryCacheInfo(
+                hits=self._hits, misses=self._misses, entries=len(self._entries)
+            )
+
+    def _expired(self, cached_at: float) -> bool:
+        return self.ttl_seconds > 0 and self._clock() - cached_at > self.ttl_seconds
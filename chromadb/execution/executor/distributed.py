@@ -49,6 +49,9 @@ O = TypeVar("O")  # noqa: E741
 
 
 class DistributedExecutor(Executor):
+    # The query executors page by offset only
+    supports_get_cursor = False
+
     _mtx: threading.Lock
     _grpc_stub_pool: Dict[str, QueryExecutorStub]
     _manager: DistributedSegmentManager
@@ -1,14 +1,27 @@
-from typing import Optional, Sequence
+import base64
+import copy
+import hashlib
+from typing import Callable, Iterator, Optional, Sequence, TypeVar, Union
 
+import numpy as np
+import orjson
 from overrides import overrides
 
 from chromadb.api.types import GetResult, Metadata, QueryResult
 from chromadb.config import System
 from chromadb.execution.executor.abstract import Executor
+from chromadb.execution.executor.cache import QueryCacheInfo, QueryResultCache
 from chromadb.execution.expression.plan import CountPlan, GetPlan, KNNPlan
 from chromadb.segment import MetadataReader, VectorReader
 from chromadb.segment.impl.manager.local import LocalSegmentManager
-from chromadb.types import Collection, VectorQuery, VectorQueryResult
+from chromadb.types import (
+    Collection,
+    MetadataEmbeddingRecord,
+    VectorQuery,
+    VectorQueryResult,
+)
+
+R = TypeVar("R", GetResult, QueryResult)
 
 
 def _clean_metadata(metadata: Optional[Metadata]) -> Optional[Metadata]:
@@ -40,12 +53,44 @@ def _uri(metadata: Optional[Metadata]) -> Optional[str]:
     return None
 
 
+def _encode_cursor(after: int) -> str:
+    """Encode the internal ID of the last record of a page as an opaque cursor"""
+    return base64.urlsafe_b64encode(orjson.dumps({"after": after})).decode()
+
+
+def _decode_cursor(cursor: str) -> int:
+    """Retrieve the internal ID to start after from a cursor"""
+    try:
+        return int(orjson.loads(base64.urlsafe_b64decode(cursor))["after"])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
 class LocalExecutor(Executor):
     _manager: LocalSegmentManager
+    _cache: Optional[QueryResultCache[Union[GetResult, QueryResult]]]
 
     def __init__(self, system: System):
         super().__init__(system)
         self._manager = self.require(LocalSegmentManager)
+        self._cache = None
+        if system.settings.chroma_query_cache_size > 0:
+            self._cache = QueryResultCache(
+                capacity=system.settings.chroma_query_cache_size,
+                ttl_seconds=system.settings.chroma_query_cache_ttl_seconds,
+            )
+
+    @overrides
+    def reset_state(self) -> None:
+        if self._cache is not None:
+            self._cache.reset()
+        super().reset_state()
+
+    def cache_info(self) -> Optional[QueryCacheInfo]:
+        """The hits and misses of the query result cache, if it is enabled"""
+        if self._cache is None:
+            return None
+        return self._cache.cache_info()
 
     @overrides
     def count(self, plan: CountPlan) -> int:
@@ -53,16 +98,47 @@ class LocalExecutor(Executor):
 
     @overrides
     def get(self, plan: GetPlan) -> GetResult:
-        records = self._metadata_segment(plan.scan.collection).get_metadata(
+        return self._cached(plan, self._get, plan.projection.embedding)
+
+    def _get(self, plan: GetPlan) -> GetResult:
+        records, last = self._metadata_segment(plan.scan.collection).get_metadata_page(
             request_version_context=plan.scan.version,
             where=plan.filter.where,
             where_document=plan.filter.where_document,
             ids=plan.filter.user_ids,
             limit=plan.limit.fetch,
             offset=plan.limit.skip,
+            after=None
+            if plan.limit.cursor is None
+            else _decode_cursor(plan.limit.cursor),
             include_metadata=True,
         )
+        result = self._get_result(plan, records)
+        # A full page may be followed by more records, which the next page reads with
+        # a range scan after the last of these rather than with an offset
+        if last is not None and len(records) == plan.limit.fetch:
+            result["next_cursor"] = _encode_cursor(last)
+        else:
+            result["next_cursor"] = None
+        return result
 
+    @overrides
+    def iter_get(self, plan: GetPlan, batch_size: int) -> Iterator[GetResult]:
+        pages = self._metadata_segment(plan.scan.collection).iter_metadata(
+            request_version_context=plan.scan.version,
+            where=plan.filter.where,
+            where_document=plan.filter.where_document,
+            ids=plan.filter.user_ids,
+            batch_size=batch_size,
+            include_metadata=True,
+        )
+        for records in pages:
+            yield self._get_result(plan, records)
+
+    def _get_result(
+        self, plan: GetPlan, records: Sequence[MetadataEmbeddingRecord]
+    ) -> GetResult:
+        """Build the result of a get plan from the metadata records it matched"""
         ids = [r["id"] for r in records]
         embeddings = None
         documents = None
@@ -72,10 +148,10 @@ class LocalExecutor(Executor):
 
         if plan.projection.embedding:
             if len(records) > 0:
-                vectors = self._vector_segment(plan.scan.collection).get_vectors(
-                    ids=ids, request_version_context=plan.scan.version
-                )
-                embeddings = [v["embedding"] for v in vectors]
+                _, vectors = self._vector_segment(
+                    plan.scan.collection
+                ).get_vector_matrix(ids=ids, request_version_context=plan.scan.version)
+                embeddings = list(vectors)
             else:
                 embeddings = list()
             included.append("embeddings")
@@ -105,6 +181,9 @@ class LocalExecutor(Executor):
 
     @overrides
     def knn(self, plan: KNNPlan) -> QueryResult:
+        return self._cached(plan, self._knn, True)
+
+    def _knn(self, plan: KNNPlan) -> QueryResult:
         prefiltered_ids = None
         if plan.filter.user_ids or plan.filter.where or plan.filter.where_document:
             records = self._metadata_segment(plan.scan.collection).get_metadata(
@@ -198,6 +277,52 @@ class LocalExecutor(Executor):
             included=included,
         )
 
+    def _cached(
+        self,
+        plan: Union[GetPlan, KNNPlan],
+        execute: Callable[..., R],
+        reads_vectors: bool,
+    ) -> R:
+        """Execute a plan, or serve its result from the cache if it was executed since
+        the last write to the segments it reads"""
+        if self._cache is None:
+            return execute(plan)
+
+        key = self._cache_key(plan, reads_vectors)
+        cached = self._cache.get(key)
+        if cached is not None:
+            # Callers may modify results, so never hand out the cached ones
+            return copy.deepcopy(cached)  # type: ignore[return-value]
+        result = execute(plan)
+        self._cache.set(key, copy.deepcopy(result))
+        return result
+
+    def _cache_key(self, plan: Union[GetPlan, KNNPlan], reads_vectors: bool) -> bytes:
+        collection = plan.scan.collection
+        seq_ids = [self._metadata_segment(collection).max_seqid()]
+        if reads_vectors:
+            # The segments consume the log independently, so a result read from both
+            # depends on how far each of them has caught up
+            seq_ids.append(self._vector_segment(collection).max_seqid())
+
+        key = {
+            "collection": str(collection.id),
+            "seq_ids": seq_ids,
+            "filter": plan.filter,
+            "projection": plan.projection,
+        }
+        if isinstance(plan, GetPlan):
+            key["limit"] = plan.limit
+        else:
+            key["fetch"] = plan.knn.fetch
+        hasher = hashlib.sha256(
+            orjson.dumps(key, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        )
+        if isinstance(plan, KNNPlan):
+            for embedding in plan.knn.embeddings:
+                hasher.update(np.asarray(embedding, dtype=np.float32).tobytes())
+        return hasher.digest()
+
     def _metadata_segment(self, collection: Collection) -> MetadataReader:
         return self._manager.get_segment(collection.id, MetadataReader)
 
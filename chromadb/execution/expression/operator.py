@@ -43,6 +43,8 @@ class KNN:
 class Limit:
     skip: int = 0
     fetch: Optional[int] = None
+    # An opaque position, from the next_cursor of a previous result, to start after
+    cursor: Optional[str] = None
 
 
 @dataclass
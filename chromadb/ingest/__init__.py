@@ -34,6 +34,17 @@ def decode_vector(vector: bytes, encoding: ScalarEncoding) -> Vector:
         raise ValueError(f"Unsupported encoding: {encoding.value}")
 
 
+def decode_vectors(vectors: Sequence[bytes], encoding: ScalarEncoding) -> np.ndarray:
+    """Decode byte arrays of equal length into the rows of a 2D array"""
+
+    if encoding == ScalarEncoding.FLOAT32 or encoding == ScalarEncoding.INT32:
+        return np.frombuffer(b"".join(vectors), dtype=np.float32).reshape(
+            len(vectors), -1
+        )
+    else:
+        raise ValueError(f"Unsupported encoding: {encoding.value}")
+
+
 class Producer(Component):
     """Interface for writing embeddings to an ingest stream"""
 
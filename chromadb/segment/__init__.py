@@ -1,5 +1,7 @@
-from typing import Optional, Sequence, TypeVar
+from typing import Iterator, List, Optional, Sequence, Tuple, TypeVar
 from abc import abstractmethod
+import numpy as np
+import numpy.typing as npt
 from chromadb.types import (
     Collection,
     MetadataEmbeddingRecord,
@@ -76,6 +78,54 @@ class MetadataReader(SegmentImplementation):
         """Query for embedding metadata."""
         pass
 
+    @abstractmethod
+    def get_metadata_page(
+        self,
+        request_version_context: RequestVersionContext,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        ids: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        after: Optional[int] = None,
+        include_metadata: bool = True,
+    ) -> Tuple[Sequence[MetadataEmbeddingRecord], Optional[int]]:
+        """Query for embedding metadata in the order of an internal ID, starting
+        after the record with internal ID `after` if given. Returns the records and
+        the internal ID of the last of them, from which the next page starts."""
+        pass
+
+    def iter_metadata(
+        self,
+        request_version_context: RequestVersionContext,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        ids: Optional[Sequence[str]] = None,
+        batch_size: int = 1000,
+        include_metadata: bool = True,
+    ) -> Iterator[List[MetadataEmbeddingRecord]]:
+        """Yield pages of at most batch_size embedding metadata records. Each page
+        resumes after the last record of the previous one rather than at an offset,
+        so reading a page costs the same however deep into the segment it is."""
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive")
+
+        after = None
+        while True:
+            page, after = self.get_metadata_page(
+                request_version_context=request_version_context,
+                where=where,
+                where_document=where_document,
+                ids=ids,
+                limit=batch_size,
+                after=after,
+                include_metadata=include_metadata,
+            )
+            if len(page) > 0:
+                yield list(page)
+            if len(page) < batch_size:
+                return
+
 
 class VectorReader(SegmentImplementation):
     """Embedding Vector segment interface"""
@@ -90,6 +140,28 @@ class VectorReader(SegmentImplementation):
         returned."""
         pass
 
+    def get_vector_matrix(
+        self,
+        request_version_context: RequestVersionContext,
+        ids: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[str], npt.NDArray[np.float32]]:
+        """Get embeddings from the segment as the IDs that were found and a 2-D array
+        with the embedding of each in the same row. IDs that aren't in the segment
+        are skipped. If no IDs are provided, all embeddings are returned."""
+        records = self.get_vectors(request_version_context, ids)
+        if not records:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return [record["id"] for record in records], np.array(
+            [record["embedding"] for record in records], dtype=np.float32
+        )
+
+    def has_ids(
+        self, request_version_context: RequestVersionContext, ids: Sequence[str]
+    ) -> List[bool]:
+        """Return whether each of the given IDs is in the segment"""
+        found = set(self.get_vector_matrix(request_version_context, ids)[0])
+        return [id in found for id in ids]
+
     @abstractmethod
     def query_vectors(
         self, query: VectorQuery
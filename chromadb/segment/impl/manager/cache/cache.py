@@ -1,5 +1,6 @@
 import threading
 import uuid
+from collections import OrderedDict
 from typing import Any, Callable
 from chromadb.types import Segment
 from overrides import override
@@ -52,43 +53,37 @@ class BasicCache(SegmentCache):
 
 
 class SegmentLRUCache(BasicCache):
-    """A simple LRU cache implementation that handles objects with dynamic sizes.
-    The size of each object is determined by a user-provided size function."""
+    """An LRU cache of segments bounded by their total size. The size of each segment
+    is determined by a user-provided size function when it is added, and kept until
+    update_size is called for it, so lookups and inserts don't measure the others."""
 
     def __init__(
         self,
         capacity: int,
-        size_func: Callable[[uuid.UUID], int],
+        size_func: Callable[[Segment], int],
         callback: Optional[Callable[[uuid.UUID, Segment], Any]] = None,
     ):
         self.capacity = capacity
         self.size_func = size_func
-        self.cache: Dict[uuid.UUID, Segment] = {}
-        self.history = []
+        # Least recently used first
+        self.cache: "OrderedDict[uuid.UUID, Segment]" = OrderedDict()
+        self.sizes: Dict[uuid.UUID, int] = {}
+        self.total_size = 0
         self.callback = callback
         self.lock = threading.RLock()
 
-    def _upsert_key(self, key: uuid.UUID):
-        if key in self.history:
-            self.history.remove(key)
-            self.history.append(key)
-        else:
-            self.history.append(key)
-
     @override
     def get(self, key: uuid.UUID) -> Optional[Segment]:
         with self.lock:
-            self._upsert_key(key)
-            if key in self.cache:
-                return self.cache[key]
-            else:
-                return None
+            segment = self.cache.get(key)
+            if segment is not None:
+                self.cache.move_to_end(key)
+            return segment
 
     @override
     def pop(self, key: uuid.UUID) -> Optional[Segment]:
         with self.lock:
-            if key in self.history:
-                self.history.remove(key)
+            self.total_size -= self.sizes.pop(key, 0)
             return self.cache.pop(key, None)
 
     @override
@@ -96,24 +91,32 @@ class SegmentLRUCache(BasicCache):
         with self.lock:
             if key in self.cache:
                 return
-            item_size = self.size_func(key)
-            key_sizes = {key: self.size_func(key) for key in self.cache}
-            total_size = sum(key_sizes.values())
-            index = 0
+            item_size = self.size_func(value)
             # Evict items if capacity is exceeded
-            while total_size + item_size > self.capacity and len(self.history) > index:
-                key_delete = self.history[index]
-                if key_delete in self.cache:
-                    self.callback(key_delete, self.cache[key_delete])
-                    del self.cache[key_delete]
-                    total_size -= key_sizes[key_delete]
-                index += 1
+            while self.cache and self.total_size + item_size > self.capacity:
+                key_delete, segment_delete = self.cache.popitem(last=False)
+                self.total_size -= self.sizes.pop(key_delete)
+                if self.callback is not None:
+                    self.callback(key_delete, segment_delete)
 
             self.cache[key] = value
-            self._upsert_key(key)
+            self.sizes[key] = item_size
+            self.total_size += item_size
+
+    def update_size(self, key: uuid.UUID) -> None:
+        """Measure the size of a cached segment again, e.g. after it grew. Items are
+        evicted to make room on the next set."""
+        with self.lock:
+            segment = self.cache.get(key)
+            if segment is None:
+                return
+            item_size = self.size_func(segment)
+            self.total_size += item_size - self.sizes[key]
+            self.sizes[key] = item_size
 
     @override
-    def reset(self):
+    def reset(self) -> None:
         with self.lock:
-            self.cache = {}
-            self.history = []
+            self.cache = OrderedDict()
+            self.sizes = {}
+            self.total_size = 0
@@ -1,4 +1,8 @@
-from threading import Lock
+from collections import OrderedDict
+from concurrent.futures import Future
+import json
+from threading import Event, Lock, Thread
+import time
 from chromadb.segment import (
     SegmentImplementation,
     SegmentManager,
@@ -18,16 +22,19 @@ import os
 from chromadb.config import System, get_class
 from chromadb.db.system import SysDB
 from overrides import override
+from chromadb.segment.impl.vector.local_hnsw import LocalHnswSegment
 from chromadb.segment.impl.vector.local_persistent_hnsw import (
+    HnswCompactionInfo,
     PersistentLocalHnswSegment,
 )
 from chromadb.telemetry.opentelemetry import (
     OpenTelemetryClient,
     OpenTelemetryGranularity,
+    add_attributes_to_current_span,
     trace_method,
 )
 from chromadb.types import Collection, Operation, Segment, SegmentScope, Metadata
-from typing import Dict, Type, Sequence, Optional, cast
+from typing import Dict, NamedTuple, Type, Sequence, Optional, cast
 from uuid import UUID, uuid4
 import platform
 
@@ -40,6 +47,17 @@ if platform.system() != "Windows":
 elif platform.system() == "Windows":
     import ctypes
 
+
+class SegmentLoadInfo(NamedTuple):
+    """How long segments took to load, and how long requests waited for loads
+    started by other requests"""
+
+    loads: int
+    load_seconds: float
+    waits: int
+    wait_seconds: float
+
+
 SEGMENT_TYPE_IMPLS = {
     SegmentType.SQLITE: "chromadb.segment.impl.metadata.sqlite.SqliteMetadataSegment",
     SegmentType.HNSW_LOCAL_MEMORY: "chromadb.segment.impl.vector.local_hnsw.LocalHnswSegment",
@@ -52,12 +70,22 @@ class LocalSegmentManager(SegmentManager):
     _system: System
     _opentelemetry_client: OpenTelemetryClient
     _instances: Dict[UUID, SegmentImplementation]
+    # Segments being loaded, which concurrent requests for them wait on
+    _loading: Dict[UUID, "Future[SegmentImplementation]"]
+    _load_info: SegmentLoadInfo
     _vector_instances_file_handle_cache: LRUCache[
         UUID, PersistentLocalHnswSegment
     ]  # LRU cache to manage file handles across vector segment instances
     _vector_segment_type: SegmentType = SegmentType.HNSW_LOCAL_MEMORY
     _lock: Lock
     _max_file_handles: int
+    # Most recently used vector segment collections, prefetched on startup when
+    # segments are loaded lazily
+    _recent_vector_collections: "OrderedDict[UUID, None]"
+    _prefetch_thread: Optional[Thread]
+    _stop_prefetch: Event
+
+    HOT_COLLECTIONS_FILE: str = "hot_collections.json"
 
     def __init__(self, system: System):
         super().__init__(system)
@@ -66,6 +94,8 @@ class LocalSegmentManager(SegmentManager):
         self._opentelemetry_client = system.require(OpenTelemetryClient)
         self.logger = logging.getLogger(__name__)
         self._instances = {}
+        self._loading = {}
+        self._load_info = SegmentLoadInfo(0, 0.0, 0, 0.0)
         self.segment_cache: Dict[SegmentScope, SegmentCache] = {
             SegmentScope.METADATA: BasicCache()  # type: ignore[no-untyped-call]
         }
@@ -76,12 +106,15 @@ class LocalSegmentManager(SegmentManager):
             self.segment_cache[SegmentScope.VECTOR] = SegmentLRUCache(
                 capacity=system.settings.chroma_memory_limit_bytes,
                 callback=lambda k, v: self.callback_cache_evict(v),
-                size_func=lambda k: self._get_segment_disk_size(k),
+                size_func=lambda segment: self._get_segment_size(segment),
             )
         else:
             self.segment_cache[SegmentScope.VECTOR] = BasicCache()  # type: ignore[no-untyped-call]
 
         self._lock = Lock()
+        self._recent_vector_collections = OrderedDict()
+        self._prefetch_thread = None
+        self._stop_prefetch = Event()
 
         # TODO: prototyping with distributed segment for now, but this should be a configurable option
         # we need to think about how to handle this configuration
@@ -113,19 +146,88 @@ class LocalSegmentManager(SegmentManager):
 
     @override
     def start(self) -> None:
-        for instance in self._instances.values():
+        for instance in list(self._instances.values()):
             instance.start()
         super().start()
+        if self._lazy_load_enabled():
+            self._start_prefetch()
 
     @override
     def stop(self) -> None:
-        for instance in self._instances.values():
+        self._stop_prefetch.set()
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join()
+            self._prefetch_thread = None
+        self._stop_prefetch.clear()
+        if self._lazy_load_enabled():
+            self._save_hot_collections()
+        for instance in list(self._instances.values()):
             instance.stop()
         super().stop()
 
+    def _lazy_load_enabled(self) -> bool:
+        return bool(
+            self._system.settings.is_persistent
+            and self._system.settings.chroma_segment_lazy_load
+        )
+
+    def _hot_collections_file(self) -> str:
+        return os.path.join(
+            self._system.settings.require("persist_directory"),
+            self.HOT_COLLECTIONS_FILE,
+        )
+
+    def _save_hot_collections(self) -> None:
+        """Record the most recently used vector segment collections, most recent
+        first, so they can be prefetched on the next start."""
+        hot = [str(c) for c in reversed(self._recent_vector_collections.keys())]
+        try:
+            with open(self._hot_collections_file(), "w") as f:
+                json.dump(hot, f)
+        except OSError as e:
+            self.logger.warning(f"Failed to save hot collections: {e}")
+
+    def _start_prefetch(self) -> None:
+        """Load the vector segments that were hot before the last stop in a
+        background thread."""
+        path = self._hot_collections_file()
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                hot = [UUID(c) for c in json.load(f)]
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Failed to read hot collections: {e}")
+            return
+        limit = self._system.settings.chroma_segment_prefetch_count
+        hot = hot[:limit]
+        if len(hot) == 0:
+            return
+
+        def run_prefetch() -> None:
+            for collection_id in hot:
+                if self._stop_prefetch.is_set():
+                    return
+                try:
+                    segments = self._sysdb.get_segments(
+                        collection=collection_id, scope=SegmentScope.VECTOR
+                    )
+                    if len(segments) == 0:
+                        continue
+                    instance = self.get_segment(collection_id, VectorReader)
+                    if isinstance(instance, PersistentLocalHnswSegment):
+                        instance.load()
+                except Exception as e:
+                    self.logger.warning(
+                        f"Failed to prefetch collection {collection_id}: {e}"
+                    )
+
+        self._prefetch_thread = Thread(target=run_prefetch, daemon=True)
+        self._prefetch_thread.start()
+
     @override
     def reset_state(self) -> None:
-        for instance in self._instances.values():
+        for instance in list(self._instances.values()):
             instance.stop()
             instance.reset_state()
         self._instances = {}
@@ -170,20 +272,23 @@ class LocalSegmentManager(SegmentManager):
                 self.segment_cache[SegmentScope.METADATA].pop(collection_id)
         return [s["id"] for s in segments]
 
-    def _get_segment_disk_size(self, collection_id: UUID) -> int:
-        segments = self._sysdb.get_segments(
-            collection=collection_id, scope=SegmentScope.VECTOR
-        )
-        if len(segments) == 0:
+    def _get_segment_size(self, segment: Segment) -> int:
+        """The memory a vector segment takes up, measured from its index if it is
+        loaded. Otherwise it is estimated from its files, which the index is loaded
+        from."""
+        instance = self._instances.get(segment["id"])
+        if isinstance(instance, LocalHnswSegment):
+            footprint = instance.memory_footprint()
+            if footprint > 0:
+                return footprint
+        if not self._system.settings.is_persistent:
             return 0
-        # With local segment manager (single server chroma), a collection always have one segment.
-        size = get_directory_size(
+        return get_directory_size(
             os.path.join(
                 self._system.settings.require("persist_directory"),
-                str(segments[0]["id"]),
+                str(segment["id"]),
             )
         )
-        return size
 
     @trace_method(
         "LocalSegmentManager._get_segment_sysdb",
@@ -208,17 +313,70 @@ class LocalSegmentManager(SegmentManager):
         else:
             raise ValueError(f"Invalid segment type: {type}")
 
-        segment = self.segment_cache[scope].get(collection_id)
+        if scope == SegmentScope.VECTOR and self._lazy_load_enabled():
+            with self._lock:
+                self._recent_vector_collections[collection_id] = None
+                self._recent_vector_collections.move_to_end(collection_id)
+                limit = self._system.settings.chroma_segment_prefetch_count
+                while len(self._recent_vector_collections) > limit:
+                    self._recent_vector_collections.popitem(last=False)
+
+        cache = self.segment_cache[scope]
+        segment = cache.get(collection_id)
+        inserted = segment is None
         if segment is None:
             segment = self._get_segment_sysdb(collection_id, scope)
-            self.segment_cache[scope].set(collection_id, segment)
+            cache.set(collection_id, segment)
 
-        # Instances must be atomically created, so we use a lock to ensure that only one thread
-        # creates the instance.
-        with self._lock:
-            instance = self._instance(segment)
+        instance = self._instance(segment)
+        if inserted and isinstance(cache, SegmentLRUCache):
+            # The segment was sized from its files before its index was loaded
+            cache.update_size(collection_id)
         return cast(S, instance)
 
+    def load_info(self) -> SegmentLoadInfo:
+        """Totals of the time spent loading segments and waiting for them to load"""
+        with self._lock:
+            return self._load_info
+
+    def wait_for_persist(self) -> None:
+        """Block until the persists queued so far by the loaded vector segments are
+        written"""
+        for instance in list(self._instances.values()):
+            if isinstance(instance, PersistentLocalHnswSegment):
+                instance.wait_for_persist()
+
+    def compaction_info(self, collection_id: UUID) -> HnswCompactionInfo:
+        """How many elements the vector index of a collection holds, and how many of
+        them are deleted"""
+        return self._persistent_vector_segment(collection_id).compaction_info()
+
+    @trace_method(
+        "LocalSegmentManager.compact_collection",
+        OpenTelemetryGranularity.OPERATION_AND_SEGMENT,
+    )
+    def compact_collection(self, collection_id: UUID, threshold: float = 0) -> bool:
+        """Rebuild the vector index of a collection without its deleted elements, if
+        at least threshold of its elements are deleted, and wait for it. Returns
+        whether the index was compacted."""
+        instance = self._persistent_vector_segment(collection_id)
+        if instance.compaction_info().tombstone_ratio < threshold:
+            return False
+        # Like a write, a compaction needs the file handles of the index
+        instance.open_persistent_index()
+        self._vector_instances_file_handle_cache.set(collection_id, instance)
+        return instance.compact().result()
+
+    def _persistent_vector_segment(
+        self, collection_id: UUID
+    ) -> PersistentLocalHnswSegment:
+        instance = self.get_segment(collection_id, VectorReader)
+        if not isinstance(instance, PersistentLocalHnswSegment):
+            raise ValueError(
+                f"The vector segment of collection {collection_id} is not persistent"
+            )
+        return instance
+
     @trace_method(
         "LocalSegmentManager.hint_use_collection",
         OpenTelemetryGranularity.OPERATION_AND_SEGMENT,
@@ -234,6 +392,8 @@ class LocalSegmentManager(SegmentManager):
             # to avoid hitting the OS file handle limit.
             if type == VectorReader and self._system.settings.require("is_persistent"):
                 instance = cast(PersistentLocalHnswSegment, instance)
+                # Writes are only delivered to loaded segments
+                instance.load()
                 instance.open_persistent_index()
                 self._vector_instances_file_handle_cache.set(collection_id, instance)
 
@@ -243,12 +403,79 @@ class LocalSegmentManager(SegmentManager):
         return cls
 
     def _instance(self, segment: Segment) -> SegmentImplementation:
-        if segment["id"] not in self._instances:
-            cls = self._cls(segment)
-            instance = cls(self._system, segment)
-            instance.start()
+        """Get the instance of a segment, creating and starting it if needed. Instances
+        must be created atomically, so concurrent requests for a segment that is being
+        loaded wait for that load. Other segments are not held up by it."""
+        instance = self._instances.get(segment["id"])
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(segment["id"])
+            if instance is not None:
+                return instance
+            loading = self._loading.get(segment["id"])
+            if loading is None:
+                load: "Future[SegmentImplementation]" = Future()
+                self._loading[segment["id"]] = load
+
+        if loading is not None:
+            return self._wait_for_load(loading)
+
+        start = time.perf_counter()
+        try:
+            instance = self._load_instance(segment)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[segment["id"]]
+            load.set_exception(e)
+            raise
+        with self._lock:
             self._instances[segment["id"]] = instance
-        return self._instances[segment["id"]]
+            del self._loading[segment["id"]]
+            info = self._load_info
+            self._load_info = info._replace(
+                loads=info.loads + 1,
+                load_seconds=info.load_seconds + time.perf_counter() - start,
+            )
+        load.set_result(instance)
+        return instance
+
+    @trace_method(
+        "LocalSegmentManager._load_instance",
+        OpenTelemetryGranularity.OPERATION_AND_SEGMENT,
+    )
+    def _load_instance(self, segment: Segment) -> SegmentImplementation:
+        cls = self._cls(segment)
+        instance = cls(self._system, segment)
+        cache = self.segment_cache[segment["scope"]]
+        if isinstance(instance, PersistentLocalHnswSegment) and isinstance(
+            cache, SegmentLRUCache
+        ):
+            # The index grows as it is written to, which is measured on persist
+            collection_id = segment["collection"]
+            instance.add_persist_listener(lambda: cache.update_size(collection_id))
+        instance.start()
+        return instance
+
+    @trace_method(
+        "LocalSegmentManager._wait_for_load",
+        OpenTelemetryGranularity.OPERATION_AND_SEGMENT,
+    )
+    def _wait_for_load(
+        self, loading: "Future[SegmentImplementation]"
+    ) -> SegmentImplementation:
+        start = time.perf_counter()
+        try:
+            return loading.result()
+        finally:
+            waited = time.perf_counter() - start
+            add_attributes_to_current_span({"wait_seconds": waited})
+            with self._lock:
+                info = self._load_info
+                self._load_info = info._replace(
+                    waits=info.waits + 1, wait_seconds=info.wait_seconds + waited
+                )
 
 
 def _segment(type: SegmentType, scope: SegmentScope, collection: Collection) -> Segment:
@@ -1,4 +1,14 @@
-from typing import Optional, Sequence, Any, Tuple, cast, Generator, Union, Dict, List
+from typing import (
+    Optional,
+    Sequence,
+    Any,
+    Tuple,
+    cast,
+    Generator,
+    Union,
+    Dict,
+    List,
+)
 from chromadb.segment import MetadataReader
 from chromadb.ingest import Consumer
 from chromadb.config import System
@@ -22,7 +32,6 @@ from chromadb.types import (
     LogRecord,
     SeqId,
     Operation,
-    UpdateMetadata,
     LiteralValue,
     WhereOperator,
 )
@@ -33,7 +42,6 @@ import pypika.functions as fn
 from pypika.terms import Criterion
 from itertools import groupby
 from functools import reduce
-import sqlite3
 
 import logging
 
@@ -47,6 +55,13 @@ class SqliteMetadataSegment(MetadataReader):
     _opentelemetry_client: OpenTelemetryClient
     _collection_id: Optional[UUID]
     _subscription: Optional[UUID] = None
+    # SQL for the fixed shape statements, keyed by name. Built once per segment
+    # since they take no inline values.
+    _sql: Dict[str, str]
+
+    # The default limit on the number of variables in a statement for sqlite3
+    # versions < 3.32.0
+    MAX_VARIABLES = 999
 
     def __init__(self, system: System, segment: Segment):
         self._db = system.instance(SqliteDB)
@@ -54,6 +69,7 @@ class SqliteMetadataSegment(MetadataReader):
         self._id = segment["id"]
         self._opentelemetry_client = system.require(OpenTelemetryClient)
         self._collection_id = segment["collection"]
+        self._sql = self._statements()
 
     @trace_method("SqliteMetadataSegment.start", OpenTelemetryGranularity.ALL)
     @override
@@ -75,16 +91,10 @@ class SqliteMetadataSegment(MetadataReader):
     @trace_method("SqliteMetadataSegment.max_seqid", OpenTelemetryGranularity.ALL)
     @override
     def max_seqid(self) -> SeqId:
-        t = Table("max_seq_id")
-        q = (
-            self._db.querybuilder()
-            .from_(t)
-            .select(t.seq_id)
-            .where(t.segment_id == ParameterValue(self._db.uuid_to_db(self._id)))
-        )
-        sql, params = get_sql(q)
         with self._db.tx() as cur:
-            result = cur.execute(sql, params).fetchone()
+            result = cur.execute(
+                self._sql["max_seqid"], (self._db.uuid_to_db(self._id),)
+            ).fetchone()
 
             if result is None:
                 return self._consumer.min_seqid()
@@ -94,18 +104,10 @@ class SqliteMetadataSegment(MetadataReader):
     @trace_method("SqliteMetadataSegment.count", OpenTelemetryGranularity.ALL)
     @override
     def count(self, request_version_context: RequestVersionContext) -> int:
-        embeddings_t = Table("embeddings")
-        q = (
-            self._db.querybuilder()
-            .from_(embeddings_t)
-            .where(
-                embeddings_t.segment_id == ParameterValue(self._db.uuid_to_db(self._id))
-            )
-            .select(fn.Count(embeddings_t.id))
-        )
-        sql, params = get_sql(q)
         with self._db.tx() as cur:
-            result = cur.execute(sql, params).fetchone()[0]
+            result = cur.execute(
+                self._sql["count"], (self._db.uuid_to_db(self._id),)
+            ).fetchone()[0]
             return cast(int, result)
 
     @trace_method("SqliteMetadataSegment.get_metadata", OpenTelemetryGranularity.ALL)
@@ -121,16 +123,119 @@ class SqliteMetadataSegment(MetadataReader):
         include_metadata: bool = True,
     ) -> Sequence[MetadataEmbeddingRecord]:
         """Query for embedding metadata."""
-        embeddings_t, metadata_t, fulltext_t = Tables(
-            "embeddings", "embedding_metadata", "embedding_fulltext_search"
+        records, _ = self.get_metadata_page(
+            request_version_context=request_version_context,
+            where=where,
+            where_document=where_document,
+            ids=ids,
+            limit=limit,
+            offset=offset,
+            include_metadata=include_metadata,
         )
+        return records
+
+    @trace_method(
+        "SqliteMetadataSegment.get_metadata_page", OpenTelemetryGranularity.ALL
+    )
+    @override
+    def get_metadata_page(
+        self,
+        request_version_context: RequestVersionContext,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        ids: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        after: Optional[int] = None,
+        include_metadata: bool = True,
+    ) -> Tuple[Sequence[MetadataEmbeddingRecord], Optional[int]]:
+        embeddings_t = Table("embeddings")
 
         limit = limit or 2**63 - 1
         offset = offset or 0
+        # Pages start after an internal ID with a range scan on the primary key
+        after = after if after is not None else -(2**63)
 
         if limit < 0:
             raise ValueError("Limit cannot be negative")
 
+        # Without where and where_document filters, the query only varies in the
+        # number of ids, so its compiled SQL is cached.
+        if where is None and where_document is None:
+            num_ids = None if ids is None else len(ids)
+            sql = self._db.statement(
+                ("SqliteMetadataSegment.get_metadata", include_metadata, num_ids),
+                lambda: self._get_metadata_sql(include_metadata, num_ids),
+            )
+            params = (
+                self._db.uuid_to_db(self._id),
+                *(ids or ()),
+                after,
+                limit,
+                offset,
+            )
+        else:
+            metadata_q = (
+                self._filtered_ids_query(where, where_document, ids)
+                .where(embeddings_t.id > ParameterValue(after))
+                .limit(limit)
+                .offset(offset)
+            )
+            q = self._select_records(include_metadata).where(
+                embeddings_t.id.isin(metadata_q)
+            )
+            sql, params = get_sql(q)
+
+        with self._db.tx() as cur:
+            # Execute the query with the limit and offset already applied
+            page = list(self._records(cur, sql, params, include_metadata))
+        return [record for _, record in page], page[-1][0] if page else None
+
+    def _filtered_ids_query(
+        self,
+        where: Optional[Where],
+        where_document: Optional[WhereDocument],
+        ids: Optional[Sequence[str]],
+    ) -> QueryBuilder:
+        """Select the IDs of the embeddings that match the filters, in ID order"""
+        embeddings_t, metadata_t, fulltext_t = Tables(
+            "embeddings", "embedding_metadata", "embedding_fulltext_search"
+        )
+
+        # If there is a query that touches the metadata table, it uses
+        # where and where_document filters, which are built per call
+        metadata_q = (
+            self._db.querybuilder()
+            .from_(embeddings_t)
+            .select(embeddings_t.id)
+            .left_join(metadata_t)
+            .on(embeddings_t.id == metadata_t.id)
+            .orderby(embeddings_t.id)
+            .where(
+                embeddings_t.segment_id == ParameterValue(self._db.uuid_to_db(self._id))
+            )
+            .distinct()  # These are embedding ids
+        )
+
+        if where:
+            metadata_q = metadata_q.where(
+                self._where_map_criterion(metadata_q, where, metadata_t, embeddings_t)
+            )
+        if where_document:
+            metadata_q = metadata_q.where(
+                self._where_doc_criterion(
+                    metadata_q, where_document, metadata_t, fulltext_t, embeddings_t
+                )
+            )
+        if ids is not None:
+            metadata_q = metadata_q.where(
+                embeddings_t.embedding_id.isin(ParameterValue(ids))
+            )
+        return metadata_q
+
+    def _select_records(self, include_metadata: bool) -> QueryBuilder:
+        """Select embeddings, joined with their metadata, in ID order"""
+        embeddings_t, metadata_t = Tables("embeddings", "embedding_metadata")
         select_clause = [
             embeddings_t.id,
             embeddings_t.embedding_id,
@@ -147,97 +252,74 @@ class SqliteMetadataSegment(MetadataReader):
                 ]
             )
 
-        q = (
-            (
+            return (
                 self._db.querybuilder()
                 .from_(embeddings_t)
                 .left_join(metadata_t)
                 .on(embeddings_t.id == metadata_t.id)
+                .select(*select_clause)
+                .orderby(embeddings_t.id)
             )
+
+        # Without metadata, e.g. when prefiltering ids for a KNN query, there is
+        # one row per embedding and no need to join
+        return (
+            self._db.querybuilder()
+            .from_(embeddings_t)
             .select(*select_clause)
             .orderby(embeddings_t.id)
         )
 
-        # If there is a query that touches the metadata table, it uses
-        # where and where_document filters, we treat this case seperately
-        if where is not None or where_document is not None:
-            metadata_q = (
-                self._db.querybuilder()
-                .from_(embeddings_t)
-                .select(embeddings_t.id)
-                .left_join(metadata_t)
-                .on(embeddings_t.id == metadata_t.id)
-                .orderby(embeddings_t.id)
-                .where(
-                    embeddings_t.segment_id
-                    == ParameterValue(self._db.uuid_to_db(self._id))
-                )
-                .distinct()  # These are embedding ids
-            )
-
-            if where:
-                metadata_q = metadata_q.where(
-                    self._where_map_criterion(
-                        metadata_q, where, metadata_t, embeddings_t
-                    )
-                )
-            if where_document:
-                metadata_q = metadata_q.where(
-                    self._where_doc_criterion(
-                        metadata_q, where_document, metadata_t, fulltext_t, embeddings_t
-                    )
-                )
-            if ids is not None:
-                metadata_q = metadata_q.where(
-                    embeddings_t.embedding_id.isin(ParameterValue(ids))
-                )
-
-            metadata_q = metadata_q.limit(limit)
-            metadata_q = metadata_q.offset(offset)
-
-            q = q.where(embeddings_t.id.isin(metadata_q))
-        else:
-            # In the case where we don't use the metadata table
-            # We have to apply limit/offset to embeddings and then join
-            # with metadata
-            embeddings_q = (
-                self._db.querybuilder()
-                .from_(embeddings_t)
-                .select(embeddings_t.id)
-                .where(
-                    embeddings_t.segment_id
-                    == ParameterValue(self._db.uuid_to_db(self._id))
-                )
-                .orderby(embeddings_t.id)
-                .limit(limit)
-                .offset(offset)
+    def _get_metadata_sql(self, include_metadata: bool, num_ids: Optional[int]) -> str:
+        """Compile get_metadata() without where and where_document filters. Takes the
+        segment ID, the ids to filter on if any, then the internal ID to start after,
+        the limit and the offset."""
+        embeddings_t = Table("embeddings")
+        # In the case where we don't use the metadata table
+        # We have to apply limit/offset to embeddings and then join
+        # with metadata
+        embeddings_q = (
+            self._db.querybuilder()
+            .from_(embeddings_t)
+            .select(embeddings_t.id)
+            .where(embeddings_t.segment_id == self._db.param(1))
+            .orderby(embeddings_t.id)
+        )
+        n = 1
+        if num_ids is not None:
+            embeddings_q = embeddings_q.where(
+                embeddings_t.embedding_id.isin(self._db.params(num_ids, start=n + 1))
             )
+            n += num_ids
+        # pypika annotates limit/offset as int, but renders parameters as-is,
+        # which keeps the statement text independent of the page bounds
+        embeddings_q = (
+            embeddings_q.where(embeddings_t.id > self._db.param(n + 1))
+            .limit(self._db.param(n + 2))  # type: ignore[arg-type]
+            .offset(self._db.param(n + 3))  # type: ignore[arg-type]
+        )
 
-            if ids is not None:
-                embeddings_q = embeddings_q.where(
-                    embeddings_t.embedding_id.isin(ParameterValue(ids))
-                )
-
-            q = q.where(embeddings_t.id.isin(embeddings_q))
-
-        with self._db.tx() as cur:
-            # Execute the query with the limit and offset already applied
-            return list(self._records(cur, q, include_metadata))
+        q = self._select_records(include_metadata)
+        q = q.where(embeddings_t.id.isin(embeddings_q))
+        return q.get_sql()
 
     def _records(
-        self, cur: Cursor, q: QueryBuilder, include_metadata: bool
-    ) -> Generator[MetadataEmbeddingRecord, None, None]:
-        """Given a cursor and a QueryBuilder, yield a generator of records. Assumes
-        cursor returns rows in ID order."""
+        self,
+        cur: Cursor,
+        sql: str,
+        params: Tuple[Any, ...],
+        include_metadata: bool,
+    ) -> Generator[Tuple[int, MetadataEmbeddingRecord], None, None]:
+        """Given a cursor and a query, yield a generator of records with their
+        internal IDs. Assumes the query returns rows in ID order."""
 
-        sql, params = get_sql(q)
         cur.execute(sql, params)
 
         cur_iterator = iter(cur.fetchone, None)
         group_iterator = groupby(cur_iterator, lambda r: int(r[0]))
 
-        for _, group in group_iterator:
-            yield self._record(list(group), include_metadata)
+        for id, group in group_iterator:
+            yield id, self._record(list(group), include_metadata)
 
     @trace_method("SqliteMetadataSegment._record", OpenTelemetryGranularity.ALL)
     def _record(
@@ -269,254 +351,269 @@ class SqliteMetadataSegment(MetadataReader):
             metadata=metadata or None,
         )
 
-    @trace_method("SqliteMetadataSegment._insert_record", OpenTelemetryGranularity.ALL)
-    def _insert_record(self, cur: Cursor, record: LogRecord, upsert: bool) -> None:
-        """Add or update a single EmbeddingRecord into the DB"""
-
-        t = Table("embeddings")
-        q = (
-            self._db.querybuilder()
-            .into(t)
-            .columns(t.segment_id, t.embedding_id, t.seq_id)
-            .where(t.segment_id == ParameterValue(self._db.uuid_to_db(self._id)))
-            .where(t.embedding_id == ParameterValue(record["record"]["id"]))
-        ).insert(
-            ParameterValue(self._db.uuid_to_db(self._id)),
-            ParameterValue(record["record"]["id"]),
-            ParameterValue(record["log_offset"]),
-        )
-        sql, params = get_sql(q)
-        sql = sql + "RETURNING id"
-        try:
-            id = cur.execute(sql, params).fetchone()[0]
-        except sqlite3.IntegrityError:
-            # Can't use INSERT OR REPLACE here because it changes the primary key.
-            if upsert:
-                return self._update_record(cur, record)
-            else:
-                logger.warning(
-                    f"Insert of existing embedding ID: {record['record']['id']}"
-                )
-                # We are trying to add for a record that already exists. Fail the call.
-                # We don't throw an exception since this is in principal an async path
-                return
-
-        if record["record"]["metadata"]:
-            self._update_metadata(cur, id, record["record"]["metadata"])
-
-    @trace_method(
-        "SqliteMetadataSegment._update_metadata", OpenTelemetryGranularity.ALL
-    )
-    def _update_metadata(self, cur: Cursor, id: int, metadata: UpdateMetadata) -> None:
-        """Update the metadata for a single EmbeddingRecord"""
-        t = Table("embedding_metadata")
-        to_delete = [k for k, v in metadata.items() if v is None]
-        if to_delete:
-            q = (
-                self._db.querybuilder()
-                .from_(t)
-                .where(t.id == ParameterValue(id))
-                .where(t.key.isin(ParameterValue(to_delete)))
-                .delete()
+    def _statements(self) -> Dict[str, str]:
+        """Build the parameterized statements whose shape does not vary per call"""
+        qb = self._db.querybuilder()
+        p = self._db.param
+        embeddings_t = Table("embeddings")
+        metadata_t = Table("embedding_metadata")
+        fulltext_t = Table("embedding_fulltext_search")
+        max_seq_id_t = Table("max_seq_id")
+        return {
+            "max_seqid": qb.from_(max_seq_id_t)
+            .select(max_seq_id_t.seq_id)
+            .where(max_seq_id_t.segment_id == p(1))
+            .get_sql(),
+            "upsert_max_seqid": qb.into(max_seq_id_t)
+            .columns(max_seq_id_t.segment_id, max_seq_id_t.seq_id)
+            .insert(p(1), p(2))
+            .get_sql()
+            .replace("INSERT", "INSERT OR REPLACE"),
+            "count": qb.from_(embeddings_t)
+            .where(embeddings_t.segment_id == p(1))
+            .select(fn.Count(embeddings_t.id))
+            .get_sql(),
+            "insert_embedding": qb.into(embeddings_t)
+            .columns(
+                embeddings_t.segment_id, embeddings_t.embedding_id, embeddings_t.seq_id
             )
-            sql, params = get_sql(q)
-            cur.execute(sql, params)
-
-        self._insert_metadata(cur, id, metadata)
-
-    @trace_method(
-        "SqliteMetadataSegment._insert_metadata", OpenTelemetryGranularity.ALL
-    )
-    def _insert_metadata(self, cur: Cursor, id: int, metadata: UpdateMetadata) -> None:
-        """Insert or update each metadata row for a single embedding record"""
-        t = Table("embedding_metadata")
-        q = (
-            self._db.querybuilder()
-            .into(t)
+            .insert(p(1), p(2), p(3))
+            .get_sql(),
+            "update_seq_id": qb.update(embeddings_t)
+            .set(embeddings_t.seq_id, p(1))
+            .where(embeddings_t.id == p(2))
+            .get_sql(),
+            "delete_embedding": qb.from_(embeddings_t)
+            .where(embeddings_t.id == p(1))
+            .delete()
+            .get_sql(),
+            "upsert_metadata": qb.into(metadata_t)
             .columns(
-                t.id,
-                t.key,
-                t.string_value,
-                t.int_value,
-                t.float_value,
-                t.bool_value,
+                metadata_t.id,
+                metadata_t.key,
+                metadata_t.string_value,
+                metadata_t.int_value,
+                metadata_t.float_value,
+                metadata_t.bool_value,
             )
-        )
-        for key, value in metadata.items():
-            if isinstance(value, str):
-                q = q.insert(
-                    ParameterValue(id),
-                    ParameterValue(key),
-                    ParameterValue(value),
-                    None,
-                    None,
-                    None,
-                )
-            # isinstance(True, int) evaluates to True, so we need to check for bools separately
-            elif isinstance(value, bool):
-                q = q.insert(
-                    ParameterValue(id),
-                    ParameterValue(key),
-                    None,
-                    None,
-                    None,
-                    ParameterValue(value),
-                )
-            elif isinstance(value, int):
-                q = q.insert(
-                    ParameterValue(id),
-                    ParameterValue(key),
-                    None,
-                    ParameterValue(value),
-                    None,
-                    None,
-                )
-            elif isinstance(value, float):
-                q = q.insert(
-                    ParameterValue(id),
-                    ParameterValue(key),
-                    None,
-                    None,
-                    ParameterValue(value),
-                    None,
-                )
-
-        sql, params = get_sql(q)
-        sql = sql.replace("INSERT", "INSERT OR REPLACE")
-        if sql:
-            cur.execute(sql, params)
-
-        if "chroma:document" in metadata:
-            t = Table("embedding_fulltext_search")
-
-            def insert_into_fulltext_search() -> None:
-                q = (
-                    self._db.querybuilder()
-                    .into(t)
-                    .columns(t.rowid, t.string_value)
-                    .insert(
-                        ParameterValue(id),
-                        ParameterValue(metadata["chroma:document"]),
-                    )
-                )
-                sql, params = get_sql(q)
-                cur.execute(sql, params)
-
-            try:
-                insert_into_fulltext_search()
-            except sqlite3.IntegrityError:
-                q = (
-                    self._db.querybuilder()
-                    .from_(t)
-                    .where(t.rowid == ParameterValue(id))
-                    .delete()
-                )
-                sql, params = get_sql(q)
-                cur.execute(sql, params)
-                insert_into_fulltext_search()
+            .insert(p(1), p(2), p(3), p(4), p(5), p(6))
+            .get_sql()
+            .replace("INSERT", "INSERT OR REPLACE"),
+            "delete_metadata_key": qb.from_(metadata_t)
+            .where(metadata_t.id == p(1))
+            .where(metadata_t.key == p(2))
+            .delete()
+            .get_sql(),
+            "delete_embedding_metadata": qb.from_(metadata_t)
+            .where(metadata_t.id == p(1))
+            .delete()
+            .get_sql(),
+            "insert_fulltext_search": qb.into(fulltext_t)
+            .columns(fulltext_t.rowid, fulltext_t.string_value)
+            .insert(p(1), p(2))
+            .get_sql(),
+            "delete_fulltext_search": qb.from_(fulltext_t)
+            .where(fulltext_t.rowid == p(1))
+            .delete()
+            .get_sql(),
+        }
+
+    @trace_method("SqliteMetadataSegment._lookup_ids", OpenTelemetryGranularity.ALL)
+    def _lookup_ids(self, cur: Cursor, embedding_ids: Sequence[str]) -> Dict[str, int]:
+        """Resolve the row ids of the given embedding IDs in this segment. IDs that
+        don't exist are omitted from the result."""
+        ids: Dict[str, int] = {}
+        # One variable is taken by the segment ID
+        chunk_size = self.MAX_VARIABLES - 1
+        for i in range(0, len(embedding_ids), chunk_size):
+            chunk = embedding_ids[i : i + chunk_size]
+            sql = self._db.statement(
+                ("SqliteMetadataSegment._lookup_ids", len(chunk)),
+                lambda: self._lookup_ids_sql(len(chunk)),
+            )
+            params = (self._db.uuid_to_db(self._id), *chunk)
+            for embedding_id, id in cur.execute(sql, params).fetchall():
+                ids[embedding_id] = id
+        return ids
 
-    @trace_method("SqliteMetadataSegment._delete_record", OpenTelemetryGranularity.ALL)
-    def _delete_record(self, cur: Cursor, record: LogRecord) -> None:
-        """Delete a single EmbeddingRecord from the DB"""
+    def _lookup_ids_sql(self, num_ids: int) -> str:
         t = Table("embeddings")
-        fts_t = Table("embedding_fulltext_search")
         q = (
             self._db.querybuilder()
             .from_(t)
-            .where(t.segment_id == ParameterValue(self._db.uuid_to_db(self._id)))
-            .where(t.embedding_id == ParameterValue(record["record"]["id"]))
-            .delete()
+            .select(t.embedding_id, t.id)
+            .where(t.segment_id == self._db.param(1))
+            .where(t.embedding_id.isin(self._db.params(num_ids, start=2)))
         )
-        q_fts = (
-            self._db.querybuilder()
-            .from_(fts_t)
-            .delete()
-            .where(
-                fts_t.rowid.isin(
-                    self._db.querybuilder()
-                    .from_(t)
-                    .select(t.id)
-                    .where(
-                        t.segment_id == ParameterValue(self._db.uuid_to_db(self._id))
-                    )
-                    .where(t.embedding_id == ParameterValue(record["record"]["id"]))
-                )
-            )
+        return q.get_sql()
+
+    @trace_method("SqliteMetadataSegment._insert_records", OpenTelemetryGranularity.ALL)
+    def _insert_records(
+        self, cur: Cursor, records: Sequence[LogRecord], upsert: bool
+    ) -> None:
+        """Add or update a batch of EmbeddingRecords in the DB"""
+        existing = self._lookup_ids(
+            cur, list(dict.fromkeys(r["record"]["id"] for r in records))
         )
-        cur.execute(*get_sql(q_fts))
-        sql, params = get_sql(q)
-        sql = sql + " RETURNING id"
-        result = cur.execute(sql, params).fetchone()
-        if result is None:
-            logger.warning(
-                f"Delete of nonexisting embedding ID: {record['record']['id']}"
-            )
-        else:
-            id = result[0]
 
-            # Manually delete metadata; cannot use cascade because
-            # that triggers on replace
-            metadata_t = Table("embedding_metadata")
+        # The first record for an ID that doesn't exist yet inserts it; any later
+        # record for the same ID behaves as if it ran after that insert.
+        inserts: Dict[str, LogRecord] = {}
+        updates: List[LogRecord] = []
+        for record in records:
+            embedding_id = record["record"]["id"]
+            if embedding_id in existing or embedding_id in inserts:
+                if upsert:
+                    updates.append(record)
+                else:
+                    logger.warning(f"Insert of existing embedding ID: {embedding_id}")
+                    # We are trying to add for a record that already exists. Fail the
+                    # call. We don't throw an exception since this is in principal an
+                    # async path
+            else:
+                inserts[embedding_id] = record
+
+        if len(inserts) == 0 and len(updates) == 0:
+            return
 
-            q = (
-                self._db.querybuilder()
-                .from_(metadata_t)
-                .where(metadata_t.id == ParameterValue(id))
-                .delete()
+        if inserts:
+            segment_id = self._db.uuid_to_db(self._id)
+            cur.executemany(
+                self._sql["insert_embedding"],
+                [
+                    (segment_id, embedding_id, record["log_offset"])
+                    for embedding_id, record in inserts.items()
+                ],
             )
-            sql, params = get_sql(q)
-            cur.execute(sql, params)
+            existing.update(self._lookup_ids(cur, list(inserts.keys())))
+
+        metadata: Dict[int, Dict[str, Any]] = {}
+        for record in inserts.values():
+            _merge_metadata(metadata, existing[record["record"]["id"]], record)
+
+        seq_ids: Dict[int, SeqId] = {}
+        for record in updates:
+            id = existing[record["record"]["id"]]
+            seq_ids[id] = record["log_offset"]
+            _merge_metadata(metadata, id, record)
+
+        self._write_seq_ids(cur, seq_ids)
+        self._write_embedding_metadata(cur, metadata)
+
+    @trace_method("SqliteMetadataSegment._update_records", OpenTelemetryGranularity.ALL)
+    def _update_records(self, cur: Cursor, records: Sequence[LogRecord]) -> None:
+        """Update a batch of EmbeddingRecords in the DB"""
+        existing = self._lookup_ids(
+            cur, list(dict.fromkeys(r["record"]["id"] for r in records))
+        )
 
-    @trace_method("SqliteMetadataSegment._update_record", OpenTelemetryGranularity.ALL)
-    def _update_record(self, cur: Cursor, record: LogRecord) -> None:
-        """Update a single EmbeddingRecord in the DB"""
-        t = Table("embeddings")
-        q = (
-            self._db.querybuilder()
-            .update(t)
-            .set(t.seq_id, ParameterValue(record["log_offset"]))
-            .where(t.segment_id == ParameterValue(self._db.uuid_to_db(self._id)))
-            .where(t.embedding_id == ParameterValue(record["record"]["id"]))
+        metadata: Dict[int, Dict[str, Any]] = {}
+        seq_ids: Dict[int, SeqId] = {}
+        for record in records:
+            embedding_id = record["record"]["id"]
+            if embedding_id not in existing:
+                logger.warning(f"Update of nonexisting embedding ID: {embedding_id}")
+                continue
+            id = existing[embedding_id]
+            seq_ids[id] = record["log_offset"]
+            _merge_metadata(metadata, id, record)
+
+        self._write_seq_ids(cur, seq_ids)
+        self._write_embedding_metadata(cur, metadata)
+
+    @trace_method("SqliteMetadataSegment._delete_records", OpenTelemetryGranularity.ALL)
+    def _delete_records(self, cur: Cursor, records: Sequence[LogRecord]) -> None:
+        """Delete a batch of EmbeddingRecords from the DB"""
+        existing = self._lookup_ids(
+            cur, list(dict.fromkeys(r["record"]["id"] for r in records))
         )
-        sql, params = get_sql(q)
-        sql = sql + " RETURNING id"
-        result = cur.execute(sql, params).fetchone()
-        if result is None:
-            logger.warning(
-                f"Update of nonexisting embedding ID: {record['record']['id']}"
+
+        ids: List[Tuple[int]] = []
+        for record in records:
+            embedding_id = record["record"]["id"]
+            id = existing.pop(embedding_id, None)
+            if id is None:
+                logger.warning(f"Delete of nonexisting embedding ID: {embedding_id}")
+            else:
+                ids.append((id,))
+
+        if len(ids) == 0:
+            return
+
+        # Manually delete metadata; cannot use cascade because that triggers on
+        # replace
+        cur.executemany(self._sql["delete_fulltext_search"], ids)
+        cur.executemany(self._sql["delete_embedding_metadata"], ids)
+        cur.executemany(self._sql["delete_embedding"], ids)
+
+    def _write_seq_ids(self, cur: Cursor, seq_ids: Dict[int, SeqId]) -> None:
+        if seq_ids:
+            cur.executemany(
+                self._sql["update_seq_id"],
+                [(seq_id, id) for id, seq_id in seq_ids.items()],
             )
-        else:
-            id = result[0]
-            if record["record"]["metadata"]:
-                self._update_metadata(cur, id, record["record"]["metadata"])
+
+    @trace_method(
+        "SqliteMetadataSegment._write_embedding_metadata", OpenTelemetryGranularity.ALL
+    )
+    def _write_embedding_metadata(
+        self, cur: Cursor, metadata: Dict[int, Dict[str, Any]]
+    ) -> None:
+        """Apply merged metadata updates, as built by _merge_metadata(). None values
+        delete their key."""
+        to_delete: List[Tuple[int, str]] = []
+        to_insert: List[Tuple[Any, ...]] = []
+        documents: List[Tuple[int, Any]] = []
+        for id, updates in metadata.items():
+            for key, value in updates.items():
+                if value is None:
+                    to_delete.append((id, key))
+                # isinstance(True, int) evaluates to True, so we need to check for
+                # bools separately
+                elif isinstance(value, str):
+                    to_insert.append((id, key, value, None, None, None))
+                elif isinstance(value, bool):
+                    to_insert.append((id, key, None, None, None, value))
+                elif isinstance(value, int):
+                    to_insert.append((id, key, None, value, None, None))
+                elif isinstance(value, float):
+                    to_insert.append((id, key, None, None, value, None))
+            if "chroma:document" in updates:
+                documents.append((id, updates["chroma:document"]))
+
+        if to_delete:
+            cur.executemany(self._sql["delete_metadata_key"], to_delete)
+        if to_insert:
+            cur.executemany(self._sql["upsert_metadata"], to_insert)
+        if documents:
+            cur.executemany(
+                self._sql["delete_fulltext_search"], [(id,) for id, _ in documents]
+            )
+            cur.executemany(self._sql["insert_fulltext_search"], documents)
 
     @trace_method("SqliteMetadataSegment._write_metadata", OpenTelemetryGranularity.ALL)
     def _write_metadata(self, records: Sequence[LogRecord]) -> None:
         """Write embedding metadata to the database. Care should be taken to ensure
         records are append-only (that is, that seq-ids should increase monotonically)"""
         with self._db.tx() as cur:
-            for record in records:
-                if record["record"]["operation"] == Operation.ADD:
-                    self._insert_record(cur, record, False)
-                elif record["record"]["operation"] == Operation.UPSERT:
-                    self._insert_record(cur, record, True)
-                elif record["record"]["operation"] == Operation.DELETE:
-                    self._delete_record(cur, record)
-                elif record["record"]["operation"] == Operation.UPDATE:
-                    self._update_record(cur, record)
-
-            q = (
-                self._db.querybuilder()
-                .into(Table("max_seq_id"))
-                .columns("segment_id", "seq_id")
-                .insert(
-                    ParameterValue(self._db.uuid_to_db(self._id)),
-                    ParameterValue(record["log_offset"]),
-                )
+            # Consecutive records with the same operation are written as one batch
+            for operation, group in groupby(
+                records, key=lambda r: r["record"]["operation"]
+            ):
+                batch = list(group)
+                if operation == Operation.ADD:
+                    self._insert_records(cur, batch, False)
+                elif operation == Operation.UPSERT:
+                    self._insert_records(cur, batch, True)
+                elif operation == Operation.DELETE:
+                    self._delete_records(cur, batch)
+                elif operation == Operation.UPDATE:
+                    self._update_records(cur, batch)
+
+            cur.execute(
+                self._sql["upsert_max_seqid"],
+                (self._db.uuid_to_db(self._id), records[-1]["log_offset"]),
             )
-            sql, params = get_sql(q)
-            sql = sql.replace("INSERT", "INSERT OR REPLACE")
-            cur.execute(sql, params)
 
     @trace_method(
         "SqliteMetadataSegment._where_map_criterion", OpenTelemetryGranularity.ALL
@@ -647,6 +744,17 @@ class SqliteMetadataSegment(MetadataReader):
             cur.execute(*get_sql(q))
 
 
+def _merge_metadata(
+    metadata: Dict[int, Dict[str, Any]], id: int, record: LogRecord
+) -> None:
+    """Fold a record's metadata update into the pending updates for row id. Later
+    values for a key replace earlier ones, which gives the same end state as
+    applying each update in turn."""
+    update = record["record"]["metadata"]
+    if update:
+        metadata.setdefault(id, {}).update(update)
+
+
 def _where_clause(
     key: str,
     expr: Union[
@@ -1,4 +1,4 @@
-from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+from typing import Any, Dict, List, Optional, Sequence, Tuple, cast
 import numpy as np
 import numpy.typing as npt
 from chromadb.types import (
@@ -14,138 +14,219 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def exact_l2_distances(
+    queries: npt.NDArray[np.float32], candidates: npt.NDArray[np.float32]
+) -> npt.NDArray[np.float32]:
+    """Return the (num_queries, k) l2 distances between each query and its
+    (num_queries, k, dim) candidates. The expanded |q|^2 + |x|^2 - 2q.x kernel
+    loses precision to cancellation, so candidates selected with it are
+    recomputed directly, as hnswlib does."""
+    return cast(
+        npt.NDArray[np.float32],
+        np.square(candidates - queries[:, None, :]).sum(axis=2),
+    )
+
+
 class BruteForceIndex:
     """A lightweight, numpy based brute force index that is used for batches that have not been indexed into hnsw yet. It is not
     thread safe and callers should ensure that only one thread is accessing it at a time.
+
+    Vectors are stored in a preallocated float32 matrix with one row per slot. A boolean
+    liveness bitmap marks the occupied slots and a compact object array maps each slot
+    back to its id, so free, deleted and occupied slots never need a Python-level walk.
     """
 
     id_to_index: Dict[str, int]
-    index_to_id: Dict[int, str]
-    id_to_seq_id: Dict[str, int]
-    deleted_ids: Set[str]
-    free_indices: List[int]
+    ids: npt.NDArray[np.object_]
+    seq_ids: npt.NDArray[np.int64]
+    live: npt.NDArray[np.bool_]
     size: int
     dimensionality: int
-    distance_fn: Callable[[npt.NDArray[Any], npt.NDArray[Any]], float]
-    vectors: npt.NDArray[Any]
+    space: str
+    vectors: npt.NDArray[np.float32]
+    # Per-row precomputed norms used by the matrix distance kernels. For l2 this
+    # holds the squared norm, for cosine the norm, and it is unused for ip.
+    norms: npt.NDArray[np.float32]
 
     def __init__(self, size: int, dimensionality: int, space: str = "l2"):
-        if space == "l2":
-            self.distance_fn = distance_functions.l2
-        elif space == "ip":
-            self.distance_fn = distance_functions.ip
-        elif space == "cosine":
-            self.distance_fn = distance_functions.cosine
-        else:
+        if space not in ("l2", "ip", "cosine"):
             raise Exception(f"Unknown distance function: {space}")
+        self.space = space
 
         self.id_to_index = {}
-        self.index_to_id = {}
-        self.id_to_seq_id = {}
-        self.deleted_ids = set()
-        self.free_indices = list(range(size))
         self.size = size
         self.dimensionality = dimensionality
-        self.vectors = np.zeros((size, dimensionality))
+        self.ids = np.full(size, None, dtype=object)
+        self.seq_ids = np.zeros(size, dtype=np.int64)
+        self.live = np.zeros(size, dtype=bool)
+        self.vectors = np.zeros((size, dimensionality), dtype=np.float32)
+        self.norms = np.zeros(size, dtype=np.float32)
 
     def __len__(self) -> int:
         return len(self.id_to_index)
 
     def clear(self) -> None:
         self.id_to_index = {}
-        self.index_to_id = {}
-        self.id_to_seq_id = {}
-        self.deleted_ids.clear()
-        self.free_indices = list(range(self.size))
-        self.vectors.fill(0)
+        self.ids.fill(None)
+        self.live.fill(False)
 
     def upsert(self, records: List[LogRecord]) -> None:
-        if len(records) + len(self) > self.size:
+        if len(records) == 0:
+            return
+
+        # Later records for the same id win, as if they were applied one at a time
+        latest: Dict[str, LogRecord] = {}
+        for record in records:
+            latest[record["record"]["id"]] = record
+        new_ids = [id for id in latest if id not in self.id_to_index]
+
+        if len(new_ids) + len(self) > self.size:
             raise Exception(
                 "Index with capacity {} and {} current entries cannot add {} records".format(
-                    self.size, len(self), len(records)
+                    self.size, len(self), len(new_ids)
                 )
             )
 
-        for i, record in enumerate(records):
-            id = record["record"]["id"]
-            vector = record["record"]["embedding"]
-            self.id_to_seq_id[id] = record["log_offset"]
-            if id in self.deleted_ids:
-                self.deleted_ids.remove(id)
-
-            # TODO: It may be faster to use multi-index selection on the vectors array
-            if id in self.id_to_index:
-                # Update
-                index = self.id_to_index[id]
-                self.vectors[index] = vector
-            else:
-                # Add
-                next_index = self.free_indices.pop()
-                self.id_to_index[id] = next_index
-                self.index_to_id[next_index] = id
-                self.vectors[next_index] = vector
+        free = np.flatnonzero(~self.live)[: len(new_ids)]
+        for id, index in zip(new_ids, free.tolist()):
+            self.id_to_index[id] = index
+
+        slots = np.fromiter(
+            (self.id_to_index[id] for id in latest), dtype=np.int64, count=len(latest)
+        )
+        vectors = np.array(
+            [record["record"]["embedding"] for record in latest.values()],
+            dtype=np.float32,
+        )
+        self.vectors[slots] = vectors
+        self.norms[slots] = self._norms(vectors)
+        self.seq_ids[slots] = [record["log_offset"] for record in latest.values()]
+        self.ids[slots] = list(latest.keys())
+        self.live[slots] = True
 
     def delete(self, records: List[LogRecord]) -> None:
+        slots = []
         for record in records:
             id = record["record"]["id"]
-            if id in self.id_to_index:
-                index = self.id_to_index[id]
-                self.deleted_ids.add(id)
-                del self.id_to_index[id]
-                del self.index_to_id[index]
-                del self.id_to_seq_id[id]
-                self.vectors[index].fill(np.nan)
-                self.free_indices.append(index)
+            index = self.id_to_index.pop(id, None)
+            if index is not None:
+                slots.append(index)
             else:
                 logger.warning(f"Delete of nonexisting embedding ID: {id}")
 
+        if len(slots) > 0:
+            self.live[slots] = False
+            self.ids[slots] = None
+
     def has_id(self, id: str) -> bool:
         """Returns whether the index contains the given ID"""
-        return id in self.id_to_index and id not in self.deleted_ids
+        return id in self.id_to_index
 
     def get_vectors(
         self, ids: Optional[Sequence[str]] = None
     ) -> Sequence[VectorEmbeddingRecord]:
-        target_ids = ids or self.id_to_index.keys()
+        target_ids = ids or list(self.id_to_index.keys())
+        vectors = self.get_vector_matrix(target_ids)
 
         return [
-            VectorEmbeddingRecord(
-                id=id,
-                embedding=self.vectors[self.id_to_index[id]],
-            )
-            for id in target_ids
+            VectorEmbeddingRecord(id=id, embedding=vector)
+            for id, vector in zip(target_ids, vectors)
         ]
 
+    def get_vector_matrix(self, ids: Sequence[str]) -> npt.NDArray[np.float32]:
+        """Return the vectors of the given ids, which must be in the index, as rows
+        of a new matrix gathered in one indexing operation."""
+        return self.vectors[[self.id_to_index[id] for id in ids]]
+
+    def _norms(self, vectors: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        if self.space == "l2":
+            return cast(
+                npt.NDArray[np.float32], np.einsum("ij,ij->i", vectors, vectors)
+            )
+        elif self.space == "cosine":
+            return cast(npt.NDArray[np.float32], np.linalg.norm(vectors, axis=1))
+        return np.zeros(len(vectors), dtype=np.float32)
+
+    def _distances(self, queries: npt.NDArray[np.float32]) -> npt.NDArray[Any]:
+        """Compute the (num_queries, size) distance matrix between the queries and
+        every slot in the index with a single matrix product. The results match
+        the per-pair functions in chromadb.utils.distance_functions."""
+        dots = queries @ self.vectors.T
+        if self.space == "l2":
+            query_norms = np.einsum("ij,ij->i", queries, queries)
+            distances = query_norms[:, None] + self.norms[None, :] - 2 * dots
+            # Rounding can make the expansion slightly negative for identical vectors
+            return cast(npt.NDArray[Any], np.maximum(distances, 0, out=distances))
+        elif self.space == "ip":
+            return 1.0 - dots
+        else:
+            query_norms = np.linalg.norm(queries, axis=1)
+            denominators = (
+                query_norms[:, None] * self.norms[None, :] + distance_functions.NORM_EPS
+            )
+            return cast(npt.NDArray[Any], 1.0 - dots / denominators)
+
+    def _query_mask(self, allowed_ids: Optional[Sequence[str]]) -> npt.NDArray[Any]:
+        """Return a boolean mask over the slots that may be returned by a query:
+        occupied and (if given) in the allowed ids."""
+        if allowed_ids is None:
+            return self.live.copy()
+        mask = np.zeros(self.size, dtype=bool)
+        mask[
+            [self.id_to_index[id] for id in allowed_ids if id in self.id_to_index]
+        ] = True
+        return mask
+
     def query(self, query: VectorQuery) -> Sequence[Sequence[VectorQueryResult]]:
+        top_ids, top_distances, top_vectors = self.query_arrays(query)
+        results: List[List[VectorQueryResult]] = []
+        for i in range(len(top_ids)):
+            results.append(
+                [
+                    VectorQueryResult(id=id, distance=distance, embedding=vector)
+                    for id, distance, vector in zip(
+                        top_ids[i], top_distances[i].tolist(), top_vectors[i]
+                    )
+                ]
+            )
+        return results
+
+    def query_arrays(
+        self, query: VectorQuery
+    ) -> Tuple[
+        npt.NDArray[np.object_], npt.NDArray[np.float32], npt.NDArray[np.float32]
+    ]:
+        """Return the (num_queries, k) ids and distances of the top k of each query,
+        sorted by distance, and their (num_queries, k, dim) vectors. k is capped at
+        the number of allowed vectors in the index."""
         np_query = np.array(query["vectors"], dtype=np.float32)
-        allowed_ids = (
-            None if query["allowed_ids"] is None else set(query["allowed_ids"])
-        )
-        distances = np.apply_along_axis(
-            lambda query: np.apply_along_axis(self.distance_fn, 1, self.vectors, query),
-            1,
-            np_query,
-        )
+        if np_query.ndim == 1:
+            np_query = np_query.reshape(1, -1)
+        num_queries = np_query.shape[0]
+
+        mask = self._query_mask(query["allowed_ids"])
+        k = min(query["k"], int(np.count_nonzero(mask)))
+        if k == 0:
+            return (
+                np.empty((num_queries, 0), dtype=np.object_),
+                np.empty((num_queries, 0), dtype=np.float32),
+                np.empty((num_queries, 0, self.dimensionality), dtype=np.float32),
+            )
 
-        indices = np.argsort(distances)
-        # Filter out deleted labels
-        filtered_results = []
-        for i, index_list in enumerate(indices):
-            curr_results = []
-            for j in index_list:
-                # If the index is in the index_to_id map, then it has been added
-                if j in self.index_to_id:
-                    id = self.index_to_id[j]
-                    if id not in self.deleted_ids and (
-                        allowed_ids is None or id in allowed_ids
-                    ):
-                        curr_results.append(
-                            VectorQueryResult(
-                                id=id,
-                                distance=distances[i][j].item(),
-                                embedding=self.vectors[j],
-                            )
-                        )
-            filtered_results.append(curr_results)
-        return filtered_results
+        distances = self._distances(np_query)
+        distances[:, ~mask] = np.inf
+        # Select the top k slots per query, then sort only those
+        if k < self.size:
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(self.size), (num_queries, self.size))
+        top_vectors = self.vectors[top]
+        if self.space == "l2":
+            top_distances = exact_l2_distances(np_query, top_vectors)
+        else:
+            top_distances = np.take_along_axis(distances, top, axis=1)
+        order = np.argsort(top_distances, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_distances = np.take_along_axis(top_distances, order, axis=1)
+        top_vectors = np.take_along_axis(top_vectors, order[:, :, None], axis=1)
+        return self.ids[top], top_distances, top_vectors
@@ -1,10 +1,12 @@
 from overrides import override
-from typing import Optional, Sequence, Dict, Set, List, cast
+from itertools import repeat
+from typing import Any, Optional, Sequence, Dict, List, Tuple, cast
 from uuid import UUID
 from chromadb.segment import VectorReader
 from chromadb.ingest import Consumer
 from chromadb.config import System, Settings
 from chromadb.segment.impl.vector.batch import Batch
+from chromadb.segment.impl.vector.brute_force_index import exact_l2_distances
 from chromadb.segment.impl.vector.hnsw_params import HnswParams
 from chromadb.telemetry.opentelemetry import (
     OpenTelemetryClient,
@@ -21,19 +23,29 @@ from chromadb.types import (
     Segment,
     Metadata,
     Operation,
-    Vector,
 )
 from chromadb.errors import InvalidDimensionException
 import hnswlib
-from chromadb.utils.read_write_lock import ReadWriteLock, ReadRWLock, WriteRWLock
+from chromadb.utils.read_write_lock import (
+    LockStats,
+    ReadWriteLock,
+    ReadRWLock,
+    WriteRWLock,
+)
 import logging
 import numpy as np
+import numpy.typing as npt
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_CAPACITY = 1000
 
 
+def _normalize(vectors: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return cast(npt.NDArray[np.float32], vectors / np.maximum(norms, 1e-30))
+
+
 class LocalHnswSegment(VectorReader):
     _id: UUID
     _consumer: Consumer
@@ -58,6 +70,10 @@ class LocalHnswSegment(VectorReader):
 
     _opentelemtry_client: OpenTelemetryClient
 
+    # Filtered queries allowing at most this many labels are answered exactly by
+    # brute force over the allowed vectors instead of a filtered graph search
+    FILTERED_BRUTE_FORCE_THRESHOLD = 2048
+
     def __init__(self, system: System, segment: Segment):
         self._consumer = system.instance(Consumer)
         self._id = segment["id"]
@@ -89,6 +105,10 @@ class LocalHnswSegment(VectorReader):
     @override
     def start(self) -> None:
         super().start()
+        self._subscribe()
+
+    def _subscribe(self) -> None:
+        """Subscribe to the collection's log, backfilling records after max_seqid"""
         if self._collection:
             seq_id = self.max_seqid()
             self._subscription = self._consumer.subscribe(
@@ -109,33 +129,67 @@ class LocalHnswSegment(VectorReader):
         request_version_context: RequestVersionContext,
         ids: Optional[Sequence[str]] = None,
     ) -> Sequence[VectorEmbeddingRecord]:
-        if ids is None:
-            labels = list(self._label_to_id.keys())
-        else:
-            labels = []
-            for id in ids:
-                if id in self._id_to_label:
-                    labels.append(self._id_to_label[id])
-
-        results = []
-        if self._index is not None:
-            vectors = cast(
-                Sequence[Vector], np.array(self._index.get_items(labels))
-            )  # version 0.8 of hnswlib allows return_type="numpy"
+        found_ids, vectors = self.get_vector_matrix(request_version_context, ids)
+        return [
+            VectorEmbeddingRecord(id=id, embedding=vector)
+            for id, vector in zip(found_ids, vectors)
+        ]
 
-            for label, vector in zip(labels, vectors):
-                id = self._label_to_id[label]
-                results.append(VectorEmbeddingRecord(id=id, embedding=vector))
+    @override
+    def get_vector_matrix(
+        self,
+        request_version_context: RequestVersionContext,
+        ids: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[str], npt.NDArray[np.float32]]:
+        if self._index is None:
+            return [], np.empty((0, 0), dtype=np.float32)
 
-        return results
+        if ids is None:
+            found_ids = list(self._id_to_label.keys())
+        else:
+            found_ids = [id for id in ids if id in self._id_to_label]
+        labels = [self._id_to_label[id] for id in found_ids]
+        return found_ids, self._get_items(labels)
+
+    def _get_items(self, labels: Sequence[int]) -> npt.NDArray[np.float32]:
+        """Fetch the vectors of the labels from the index with one call, as the rows
+        of a float32 matrix"""
+        assert self._index is not None
+        if not labels:
+            return np.empty((0, self._index.dim), dtype=np.float32)
+        # version 0.8 of hnswlib allows return_type="numpy"
+        return np.asarray(self._index.get_items(labels), dtype=np.float32)
 
     @trace_method("LocalHnswSegment.query_vectors", OpenTelemetryGranularity.ALL)
     @override
     def query_vectors(
         self, query: VectorQuery
     ) -> Sequence[Sequence[VectorQueryResult]]:
+        with ReadRWLock(self._lock):
+            result_labels, distances, vectors = self._query_index(query)
+            return self._query_results(result_labels, distances, vectors)
+
+    def _query_index(
+        self, query: VectorQuery
+    ) -> Tuple[
+        npt.NDArray[Any],
+        npt.NDArray[np.float32],
+        Optional[npt.NDArray[np.float32]],
+    ]:
+        """Query the HNSW index, with k capped at the number of allowed elements.
+        Returns the arrays of _knn_query, which have no columns if nothing can be
+        returned."""
+        num_queries = len(query["vectors"])
+        include_embeddings = query["include_embeddings"]
+        empty = (
+            np.empty((num_queries, 0), dtype=np.uint64),
+            np.empty((num_queries, 0), dtype=np.float32),
+            np.empty((num_queries, 0, self._dimensionality or 0), dtype=np.float32)
+            if include_embeddings
+            else None,
+        )
         if self._index is None:
-            return [[] for _ in range(len(query["vectors"]))]
+            return empty
 
         k = query["k"]
         size = len(self._id_to_label)
@@ -146,57 +200,156 @@ class LocalHnswSegment(VectorReader):
             )
             k = size
 
-        labels: Set[int] = set()
-        ids = query["allowed_ids"]
-        if ids is not None:
-            labels = {self._id_to_label[id] for id in ids if id in self._id_to_label}
-            if len(labels) < k:
-                k = len(labels)
-
-        def filter_function(label: int) -> bool:
-            return label in labels
+        allowed_labels: Optional[npt.NDArray[np.int64]] = None
+        if query["allowed_ids"] is not None:
+            allowed_labels = self._allowed_labels(query["allowed_ids"])
+            if len(allowed_labels) < k:
+                k = len(allowed_labels)
+        if k == 0:
+            return empty
 
-        query_vectors = query["vectors"]
+        query_vectors = np.array(query["vectors"], dtype=np.float32)
+        return self._knn_query(query_vectors, k, allowed_labels, include_embeddings)
 
-        with ReadRWLock(self._lock):
-            result_labels, distances = self._index.knn_query(
-                np.array(query_vectors, dtype=np.float32),
-                k=k,
-                filter=filter_function if ids else None,
+    def _knn_query(
+        self,
+        query_vectors: npt.NDArray[np.float32],
+        k: int,
+        allowed_labels: Optional[npt.NDArray[np.int64]],
+        include_embeddings: bool,
+    ) -> Tuple[
+        npt.NDArray[Any],
+        npt.NDArray[np.float32],
+        Optional[npt.NDArray[np.float32]],
+    ]:
+        """Return the (num_queries, k) labels and distances of the top k of each
+        query and, if include_embeddings, their (num_queries, k, dim) vectors."""
+        index = cast(hnswlib.Index, self._index)
+        if (
+            allowed_labels is not None
+            and len(allowed_labels) <= self.FILTERED_BRUTE_FORCE_THRESHOLD
+        ):
+            result_labels, distances, vectors = self._brute_force_query(
+                query_vectors, allowed_labels, k
             )
+            return result_labels, distances, vectors if include_embeddings else None
+
+        filter_function = None
+        if allowed_labels is not None:
+            # A bitmap over all labels. hnswlib still calls the filter through
+            # pybind for each visited node, but the bound __getitem__ of bytes is
+            # a C method, which is cheaper than a Python function doing a set
+            # lookup.
+            bitmap = np.zeros(self._total_elements_added + 1, dtype=np.uint8)
+            bitmap[allowed_labels] = 1
+            filter_function = bitmap.tobytes().__getitem__
+        result_labels, distances = index.knn_query(
+            query_vectors,
+            k=k,
+            filter=filter_function,
+        )
+        if not include_embeddings:
+            return result_labels, distances, None
+
+        # Fetch the vectors of the results of the whole batch with one call,
+        # once per label even if it is a result of several queries
+        unique_labels, inverse = np.unique(result_labels, return_inverse=True)
+        vectors = self._get_items(unique_labels.tolist())
+        return (
+            result_labels,
+            distances,
+            vectors[inverse.reshape(result_labels.shape)],
+        )
 
-            # TODO: these casts are not correct, hnswlib returns np
-            # distances = cast(List[List[float]], distances)
-            # result_labels = cast(List[List[int]], result_labels)
-
-            all_results: List[List[VectorQueryResult]] = []
-            for result_i in range(len(result_labels)):
-                results: List[VectorQueryResult] = []
-                for label, distance in zip(
-                    result_labels[result_i], distances[result_i]
-                ):
-                    id = self._label_to_id[label]
-                    if query["include_embeddings"]:
-                        embedding = np.array(
-                            self._index.get_items([label])[0]
-                        )  # version 0.8 of hnswlib allows return_type="numpy"
-                    else:
-                        embedding = None
-                    results.append(
-                        VectorQueryResult(
-                            id=id,
-                            distance=distance.item(),
-                            embedding=embedding,
-                        )
+    def _query_results(
+        self,
+        labels: npt.NDArray[Any],
+        distances: npt.NDArray[np.float32],
+        vectors: Optional[npt.NDArray[np.float32]],
+    ) -> List[List[VectorQueryResult]]:
+        """Assemble the results of each query from the arrays of a knn query"""
+        label_to_id = self._label_to_id
+        all_results: List[List[VectorQueryResult]] = []
+        for i, (row_labels, row_distances) in enumerate(
+            zip(labels.tolist(), distances.tolist())
+        ):
+            row_vectors = repeat(None) if vectors is None else vectors[i]
+            all_results.append(
+                [
+                    VectorQueryResult(
+                        id=label_to_id[label], distance=distance, embedding=vector
+                    )
+                    for label, distance, vector in zip(
+                        row_labels, row_distances, row_vectors
                     )
-                all_results.append(results)
+                ]
+            )
+        return all_results
+
+    def _allowed_labels(self, ids: Sequence[str]) -> npt.NDArray[np.int64]:
+        """Map ids to the unique labels of those that are in the index"""
+        labels = np.fromiter(
+            map(self._id_to_label.get, ids, repeat(-1)), dtype=np.int64, count=len(ids)
+        )
+        return np.unique(labels[labels >= 0])
 
-            return all_results
+    def _brute_force_query(
+        self,
+        query_vectors: npt.NDArray[np.float32],
+        labels: npt.NDArray[np.int64],
+        k: int,
+    ) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.float32], npt.NDArray[np.float32]]:
+        """Exact KNN over the given labels, with the same distances as hnswlib.
+        Returns the labels, distances and vectors of the top k per query."""
+        index = cast(hnswlib.Index, self._index)
+        vectors = np.array(index.get_items(labels.tolist()), dtype=np.float32)
+        if query_vectors.ndim == 1:
+            query_vectors = query_vectors.reshape(1, -1)
+        if self._params.space == "l2":
+            distances = (
+                np.einsum("ij,ij->i", vectors, vectors)[None, :]
+                - 2 * query_vectors @ vectors.T
+                + np.einsum("ij,ij->i", query_vectors, query_vectors)[:, None]
+            )
+            np.maximum(distances, 0, out=distances)
+        elif self._params.space == "cosine":
+            # hnswlib compares normalized vectors, but chroma-hnswlib stores the
+            # vectors as added, which is what get_items returns, so they are
+            # normalized here. test_filtered_query_is_exact checks the distances.
+            distances = 1.0 - _normalize(query_vectors) @ _normalize(vectors).T
+        else:
+            distances = 1.0 - query_vectors @ vectors.T
+
+        top = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        top_vectors = vectors[top]
+        if self._params.space != "l2":
+            return labels[top], np.take_along_axis(distances, top, axis=1), top_vectors
+        top_distances = exact_l2_distances(query_vectors, top_vectors)
+        order = np.argsort(top_distances, axis=1, kind="stable")
+        return (
+            labels[np.take_along_axis(top, order, axis=1)],
+            np.take_along_axis(top_distances, order, axis=1),
+            np.take_along_axis(top_vectors, order[:, :, None], axis=1),
+        )
 
     @override
     def max_seqid(self) -> SeqId:
         return self._max_seq_id
 
+    def lock_stats(self) -> LockStats:
+        """How long queries and writes waited for and held the segment's lock"""
+        return self._lock.stats()
+
+    def memory_footprint(self) -> int:
+        """An estimate of the bytes the index takes up in memory, 0 if it has none"""
+        index = self._index
+        if index is None:
+            return 0
+        # hnswlib allocates the base layer for the capacity of the index up front:
+        # each element's vector, its 2 * M links and their count, and its label
+        element_size = index.dim * 4 + (2 * index.M + 1) * 4 + 8
+        return int(index.get_max_elements() * element_size)
+
     @override
     def count(self, request_version_context: RequestVersionContext) -> int:
         return len(self._id_to_label)
@@ -249,7 +402,6 @@ class LocalHnswSegment(VectorReader):
         labels_to_write = [0] * len(vectors_to_write)
 
         if len(deleted_ids) > 0:
-            index = cast(hnswlib.Index, self._index)
             for i in range(len(deleted_ids)):
                 id = deleted_ids[i]
                 # Never added this id to hnsw, so we can safely ignore it for deletions
@@ -257,7 +409,7 @@ class LocalHnswSegment(VectorReader):
                     continue
                 label = self._id_to_label[id]
 
-                index.mark_deleted(label)
+                self._mark_deleted(label)
                 del self._id_to_label[id]
                 del self._label_to_id[label]
                 del self._id_to_seq_id[id]
@@ -287,6 +439,9 @@ class LocalHnswSegment(VectorReader):
             # If that succeeds, update the total count
             self._total_elements_added += batch.add_count
 
+    def _mark_deleted(self, label: int) -> None:
+        cast(hnswlib.Index, self._index).mark_deleted(label)
+
     @trace_method("LocalHnswSegment._write_records", OpenTelemetryGranularity.ALL)
     def _write_records(self, records: Sequence[LogRecord]) -> None:
         """Add a batch of embeddings to the index"""
@@ -1,8 +1,21 @@
 import os
 import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from overrides import override
 import pickle
-from typing import Dict, List, Optional, Sequence, Set, cast
+from itertools import repeat
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
 from chromadb.config import System
 from chromadb.db.base import ParameterValue, get_sql
 from chromadb.db.impl.sqlite import SqliteDB
@@ -13,6 +26,10 @@ from chromadb.segment.impl.vector.local_hnsw import (
     LocalHnswSegment,
 )
 from chromadb.segment.impl.vector.brute_force_index import BruteForceIndex
+from chromadb.segment.impl.vector.persistent_id_map import (
+    IdMapWrite,
+    PersistentIdMap,
+)
 from chromadb.telemetry.opentelemetry import (
     OpenTelemetryClient,
     OpenTelemetryGranularity,
@@ -25,7 +42,6 @@ from chromadb.types import (
     RequestVersionContext,
     Segment,
     SeqId,
-    Vector,
     VectorEmbeddingRecord,
     VectorQuery,
     VectorQueryResult,
@@ -34,6 +50,7 @@ import hnswlib
 import logging
 from pypika import Table
 import numpy as np
+import numpy.typing as npt
 
 from chromadb.utils.read_write_lock import ReadRWLock, WriteRWLock
 
@@ -42,7 +59,9 @@ logger = logging.getLogger(__name__)
 
 
 class PersistentData:
-    """Stores the data and metadata needed for a PersistentLocalHnswSegment"""
+    """The legacy pickled data and metadata of a PersistentLocalHnswSegment. It is
+    migrated to the PersistentIdMap format, and still written alongside it if
+    chroma_hnsw_legacy_metadata is on."""
 
     dimensionality: Optional[int]
     total_elements_added: int
@@ -75,9 +94,35 @@ class PersistentData:
             ret = cast(PersistentData, pickle.load(f))
             return ret
 
+    def store_to_file(self, filename: str) -> None:
+        """Store persistent data to a file, replacing it atomically"""
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "wb") as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+
+
+class HnswCompactionInfo(NamedTuple):
+    """The elements of a persistent HNSW index. Deleted elements are tombstones:
+    they are only marked as deleted, and stay in the graph until it is compacted."""
+
+    elements: int
+    tombstones: int
+
+    @property
+    def tombstone_ratio(self) -> float:
+        return self.tombstones / self.elements if self.elements else 0.0
+
 
 class PersistentLocalHnswSegment(LocalHnswSegment):
-    METADATA_FILE: str = "index_metadata.pickle"
+    LEGACY_METADATA_FILE: str = "index_metadata.pickle"
+    # Compactions build the new index next to the segment directory, and move the
+    # old one aside while swapping them
+    COMPACT_FOLDER_SUFFIX: str = ".compact"
+    OLD_FOLDER_SUFFIX: str = ".old"
+    # Compactions add the live elements to the new index this many at a time, and
+    # check in between whether they were cancelled
+    COMPACTION_CHUNK_SIZE: int = 10000
     # How many records to add to index at once, we do this because crossing the python/c++ boundary is expensive (for add())
     # When records are not added to the c++ index, they are buffered in memory and served
     # via brute force search.
@@ -87,15 +132,36 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
     _curr_batch: Batch
     # How many records to add to index before syncing to disk
     _sync_threshold: int
-    _persist_data: PersistentData
+    _id_map: PersistentIdMap
+    # Lazily opened segments only read the id map header until their first query
+    # or write, see _ensure_loaded()
+    _lazy_load: bool
+    _loaded: bool
+    _loading: bool
+    _load_lock: threading.RLock
     _persist_directory: str
     _allow_reset: bool
+    # Whether to write the legacy pickle on every persist, see PersistentData
+    _write_legacy_metadata: bool
 
     _db: SqliteDB
     _opentelemtry_client: OpenTelemetryClient
 
     _num_log_records_since_last_batch: int = 0
     _num_log_records_since_last_persist: int = 0
+    # Called after every persist
+    _persist_listeners: List[Callable[[], None]]
+    # Persists are written in the background, one at a time and in order
+    _persist_executor: Optional[ThreadPoolExecutor]
+    _last_persist: Optional["Future[bool]"]
+    # Compact the index once this fraction of its elements, and at least the
+    # minimum number, are deleted. A threshold of 0 disables it.
+    _compaction_threshold: float
+    _compaction_min_tombstones: int
+    # Compactions run on the persist worker, but are cancelled rather than waited
+    # for when the index is closed
+    _compaction: Optional["Future[bool]"]
+    _compaction_cancelled: threading.Event
 
     def __init__(self, system: System, segment: Segment):
         super().__init__(system, segment)
@@ -108,34 +174,33 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
         self._sync_threshold = self._params.sync_threshold
         self._allow_reset = system.settings.allow_reset
         self._persist_directory = system.settings.require("persist_directory")
+        self._write_legacy_metadata = system.settings.chroma_hnsw_legacy_metadata
         self._curr_batch = Batch()
         self._brute_force_index = None
+        self._persist_listeners = []
+        self._persist_executor = None
+        self._last_persist = None
+        self._compaction_threshold = system.settings.chroma_hnsw_compaction_threshold
+        self._compaction_min_tombstones = (
+            system.settings.chroma_hnsw_compaction_min_tombstones
+        )
+        self._compaction = None
+        self._compaction_cancelled = threading.Event()
+        self._recover_compaction()
         if not os.path.exists(self._get_storage_folder()):
             os.makedirs(self._get_storage_folder(), exist_ok=True)
-        # Load persist data if it exists already, otherwise create it
-        if self._index_exists():
-            self._persist_data = PersistentData.load_from_file(
-                self._get_metadata_file()
-            )
-            self._dimensionality = self._persist_data.dimensionality
-            self._total_elements_added = self._persist_data.total_elements_added
-            self._id_to_label = self._persist_data.id_to_label
-            self._label_to_id = self._persist_data.label_to_id
-            self._id_to_seq_id = self._persist_data.id_to_seq_id
-            # If the index was written to, we need to re-initialize it
-            if len(self._id_to_label) > 0:
-                self._dimensionality = cast(int, self._dimensionality)
-                self._init_index(self._dimensionality)
-        else:
-            self._persist_data = PersistentData(
-                self._dimensionality,
-                self._total_elements_added,
-                self._id_to_label,
-                self._label_to_id,
-                self._id_to_seq_id,
-            )
-
-        # Hydrate the max_seq_id
+        self._id_map = PersistentIdMap(self._get_storage_folder())
+        self._lazy_load = system.settings.chroma_segment_lazy_load
+        # Not started yet, so an eager load below does not subscribe to the log
+        self._running = False
+        self._loaded = False
+        self._loading = False
+        self._load_lock = threading.RLock()
+
+        # Hydrate the max_seq_id, and migrate the legacy pickle to the id map if
+        # needed. The migration is done eagerly, since it also carries the legacy
+        # max_seq_id.
+        legacy_data: Optional[PersistentData] = None
         with self._db.tx() as cur:
             t = Table("max_seq_id")
             q = (
@@ -149,9 +214,14 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
             cur.execute(sql, params)
             result = cur.fetchone()
 
+            if self._legacy_metadata_needs_migration(result[0] if result else None):
+                legacy_data = PersistentData.load_from_file(
+                    self._get_legacy_metadata_file()
+                )
+
             if result:
                 self._max_seq_id = result[0]
-            elif self._index_exists():
+            elif legacy_data is not None and hasattr(legacy_data, "max_seq_id"):
                 # Migrate the max_seq_id from the legacy field in the pickled file to the SQLite database
                 q = (
                     self._db.querybuilder()
@@ -159,16 +229,27 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
                     .columns("segment_id", "seq_id")
                     .insert(
                         ParameterValue(self._db.uuid_to_db(self._id)),
-                        ParameterValue(self._persist_data.max_seq_id),
+                        ParameterValue(legacy_data.max_seq_id),
                     )
                 )
                 sql, params = get_sql(q)
                 cur.execute(sql, params)
 
-                self._max_seq_id = self._persist_data.max_seq_id
+                self._max_seq_id = legacy_data.max_seq_id
             else:
                 self._max_seq_id = self._consumer.min_seqid()
 
+        if legacy_data is not None:
+            self._id_map.write_snapshot(
+                legacy_data.dimensionality,
+                legacy_data.total_elements_added,
+                legacy_data.id_to_label,
+                legacy_data.id_to_seq_id,
+                self._max_seq_id,
+            )
+        if not self._lazy_load or legacy_data is not None:
+            self._ensure_loaded()
+
     @staticmethod
     @override
     def propagate_collection_metadata(metadata: Metadata) -> Optional[Metadata]:
@@ -176,13 +257,105 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
         segment_metadata = PersistentHnswParams.extract(metadata)
         return segment_metadata
 
+    def _load(self) -> None:
+        """Load the id map, if it exists already, and the index it refers to"""
+        if not self._id_map.exists():
+            return
+        self._load_id_map()
+        # If the index was written to, we need to re-initialize it
+        if len(self._id_to_label) > 0:
+            self._dimensionality = cast(int, self._dimensionality)
+            self._init_index(self._dimensionality)
+
+    def _load_id_map(self) -> None:
+        state = self._id_map.load()
+        self._dimensionality = state.dimensionality
+        self._total_elements_added = state.total_elements_added
+        self._id_to_label = state.id_to_label
+        self._label_to_id = state.label_to_id
+        self._id_to_seq_id = state.id_to_seq_id
+
+    @trace_method(
+        "PersistentLocalHnswSegment._ensure_loaded", OpenTelemetryGranularity.ALL
+    )
+    def _ensure_loaded(self) -> None:
+        """Load the segment if it is not loaded yet. When the segment is running this
+        also subscribes it to the log, which backfills any records written since the
+        last persist. Concurrent callers wait for a single load."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            # The backfill re-enters through _write_records on the loading thread
+            if self._loaded or self._loading:
+                return
+            self._loading = True
+            try:
+                self._load()
+                if self._running:
+                    super()._subscribe()
+                self._loaded = True
+            finally:
+                self._loading = False
+
+    def load(self) -> None:
+        """Load the segment now, if it was opened lazily"""
+        self._ensure_loaded()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    @override
+    def _subscribe(self) -> None:
+        # A lazily opened segment subscribes once it is loaded
+        if self._loaded:
+            super()._subscribe()
+
     def _index_exists(self) -> bool:
-        """Check if the index exists via the metadata file"""
-        return os.path.exists(self._get_metadata_file())
+        """Check if the index exists via the id map or legacy metadata file"""
+        return os.path.exists(self._get_metadata_file()) or os.path.exists(
+            self._get_legacy_metadata_file()
+        )
 
     def _get_metadata_file(self) -> str:
-        """Get the metadata file path"""
-        return os.path.join(self._get_storage_folder(), self.METADATA_FILE)
+        """Get the metadata file path. This is the id map header, which is rewritten
+        on every persist."""
+        return self._id_map.header_path
+
+    def _get_legacy_metadata_file(self) -> str:
+        """Get the legacy pickled metadata file path"""
+        return os.path.join(self._get_storage_folder(), self.LEGACY_METADATA_FILE)
+
+    def _legacy_metadata_needs_migration(
+        self, committed_max_seq_id: Optional[SeqId]
+    ) -> bool:
+        """The legacy pickle is migrated on first open. It is left in place, and
+        migrated again if an older version, which only writes the pickle, persisted
+        the segment since: the id map is committed before the max_seq_id it records,
+        so only such a version commits a max_seq_id past it."""
+        if not os.path.exists(self._get_legacy_metadata_file()):
+            return False
+        if not self._id_map.exists():
+            return True
+        written_max_seq_id = self._id_map.read_header().get("max_seq_id")
+        return (
+            committed_max_seq_id is not None
+            and written_max_seq_id is not None
+            and committed_max_seq_id > written_max_seq_id
+        )
+
+    def _legacy_metadata(self) -> Optional[PersistentData]:
+        """Copy the id mappings to write to the legacy pickle, if it is written.
+        Called with the write lock held."""
+        if not self._write_legacy_metadata:
+            return None
+        return PersistentData(
+            dimensionality=self._dimensionality,
+            total_elements_added=self._total_elements_added,
+            id_to_label=dict(self._id_to_label),
+            label_to_id=dict(self._label_to_id),
+            id_to_seq_id=dict(self._id_to_seq_id),
+        )
 
     def _get_storage_folder(self) -> str:
         """Get the storage folder path"""
@@ -194,12 +367,18 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
     )
     @override
     def _init_index(self, dimensionality: int) -> None:
-        index = hnswlib.Index(space=self._params.space, dim=dimensionality)
         self._brute_force_index = BruteForceIndex(
             size=self._batch_size,
             dimensionality=dimensionality,
             space=self._params.space,
         )
+        self._index = self._open_index(dimensionality)
+        self._dimensionality = dimensionality
+        self._index_initialized = True
+
+    def _open_index(self, dimensionality: int) -> hnswlib.Index:
+        """Load the index from the storage folder, or create it there"""
+        index = hnswlib.Index(space=self._params.space, dim=dimensionality)
 
         # Check if index exists and load it if it does
         if self._index_exists():
@@ -229,59 +408,366 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
 
         index.set_ef(self._params.search_ef)
         index.set_num_threads(self._params.num_threads)
-
-        self._index = index
-        self._dimensionality = dimensionality
-        self._index_initialized = True
+        return index
+
+    def _schedule_persist(self) -> None:
+        """Snapshot the id mappings changed since the last sync and queue a persist
+        of them. Called with the write lock held."""
+        id_map_write = self._id_map.prepare_flush(
+            self._dimensionality,
+            self._total_elements_added,
+            self._id_to_label,
+            self._id_to_seq_id,
+            self._max_seq_id,
+        )
+        self._num_log_records_since_last_persist = 0
+        persist = self._executor().submit(
+            self._persist,
+            self._id_map,
+            id_map_write,
+            self._legacy_metadata(),
+            self._max_seq_id,
+        )
+        # Listeners run once the persist is done, so that waiting for it never
+        # waits on them
+        persist.add_done_callback(self._on_persisted)
+        self._last_persist = persist
+
+    def _executor(self) -> ThreadPoolExecutor:
+        """The worker that persists and compacts the segment"""
+        if self._persist_executor is None:
+            self._persist_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"hnsw-persist-{self._id}"
+            )
+        return self._persist_executor
 
     @trace_method("PersistentLocalHnswSegment._persist", OpenTelemetryGranularity.ALL)
-    def _persist(self) -> None:
-        """Persist the index and data to disk"""
-        index = cast(hnswlib.Index, self._index)
-
-        # Persist the index
-        index.persist_dirty()
-
-        # Persist the metadata
-        self._persist_data.dimensionality = self._dimensionality
-        self._persist_data.total_elements_added = self._total_elements_added
-
-        # TODO: This should really be stored in sqlite, the index itself, or a better
-        # storage format
-        self._persist_data.id_to_label = self._id_to_label
-        self._persist_data.label_to_id = self._label_to_id
-        self._persist_data.id_to_seq_id = self._id_to_seq_id
-
-        with open(self._get_metadata_file(), "wb") as metadata_file:
-            pickle.dump(self._persist_data, metadata_file, pickle.HIGHEST_PROTOCOL)
+    def _persist(
+        self,
+        id_map: PersistentIdMap,
+        id_map_write: IdMapWrite,
+        legacy_data: Optional[PersistentData],
+        max_seq_id: SeqId,
+    ) -> bool:
+        """Persist the index and data to disk, and commit max_seq_id once both are
+        durable. If a persist fails, max_seq_id stays at the last one that
+        succeeded, so the records since are replayed from the log on the next load.
+        Returns whether the persist succeeded."""
+        try:
+            # hnswlib can't snapshot its dirty elements, so they are written under
+            # the read lock, which holds off writers but not queries. They include
+            # the writes since the snapshot, which replay tolerates, see
+            # _mark_deleted().
+            with ReadRWLock(self._lock):
+                cast(hnswlib.Index, self._index).persist_dirty()
+
+            # Persist the id mappings changed since the last sync, unless a
+            # compaction has since replaced the id map with one that holds them
+            if id_map is self._id_map:
+                if legacy_data is not None:
+                    legacy_data.store_to_file(self._get_legacy_metadata_file())
+                id_map.write(id_map_write)
+
+            sql = self._db.statement(
+                "PersistentLocalHnswSegment._persist.max_seq_id", self._max_seq_id_sql
+            )
+            with self._db.tx() as cur:
+                cur.execute(sql, (self._db.uuid_to_db(self._id), max_seq_id))
+        except Exception:
+            logger.exception(f"Failed to persist HNSW segment {self._id}")
+            return False
+
+        # The log up to max_seq_id may be purgeable now. The purge fails if a write
+        # holds the database, in which case that write's purge catches up.
+        if self._collection is not None:
+            try:
+                self._db.request_purge(self._collection)
+            except Exception as e:
+                logger.warning(f"Failed to purge the log of {self._collection}: {e}")
+        return True
+
+    def _on_persisted(self, persist: "Future[bool]") -> None:
+        if not persist.cancelled() and persist.result():
+            for listener in self._persist_listeners:
+                listener()
+
+    def wait_for_persist(self) -> None:
+        """Block until the persists queued so far are written and their listeners
+        were called"""
+        executor = self._persist_executor
+        if executor is not None:
+            # The worker calls a persist's listeners before it runs the next task
+            executor.submit(lambda: None).result()
+
+    def add_persist_listener(self, listener: Callable[[], None]) -> None:
+        """Call listener after each persist or compaction of the segment"""
+        self._persist_listeners.append(listener)
+
+    @property
+    def num_tombstones(self) -> int:
+        """How many elements of the index are deleted. Labels are never reused, so
+        every label handed out that no longer maps to an id is a tombstone."""
+        return self._total_elements_added - len(self._id_to_label)
+
+    def compaction_info(self) -> HnswCompactionInfo:
+        """How many elements the index holds, and how many of them are deleted"""
+        self._ensure_loaded()
+        with ReadRWLock(self._lock):
+            return HnswCompactionInfo(
+                elements=self._total_elements_added, tombstones=self.num_tombstones
+            )
 
-        with self._db.tx() as cur:
-            q = (
-                self._db.querybuilder()
-                .into(Table("max_seq_id"))
-                .columns("segment_id", "seq_id")
-                .insert(
-                    ParameterValue(self._db.uuid_to_db(self._id)),
-                    ParameterValue(self._max_seq_id),
+    def compact(self) -> "Future[bool]":
+        """Rebuild the index in the background from its live elements, dropping
+        the deleted ones. Returns a future of whether the index was compacted, which
+        it is not if nothing is deleted. Queries and writes carry on meanwhile."""
+        self._ensure_loaded()
+        with WriteRWLock(self._lock):
+            return self._schedule_compaction()
+
+    def _should_compact(self) -> bool:
+        if self._compaction_threshold <= 0:
+            return False
+        if self.num_tombstones < max(self._compaction_min_tombstones, 1):
+            return False
+        if (
+            self.num_tombstones
+            < self._compaction_threshold * self._total_elements_added
+        ):
+            return False
+        # Don't retry automatically after a failure, which was logged
+        compaction = self._compaction
+        return compaction is None or not compaction.done() or compaction.result()
+
+    def _schedule_compaction(self) -> "Future[bool]":
+        """Queue a compaction behind the queued persists, unless one is queued
+        already. Called with the write lock held."""
+        if self._compaction is not None and not self._compaction.done():
+            return self._compaction
+        self._compaction_cancelled.clear()
+        compaction = self._executor().submit(self._compact)
+        # The index sizes changed, as for a persist
+        compaction.add_done_callback(self._on_persisted)
+        self._compaction = compaction
+        return compaction
+
+    def _cancel_compaction(self) -> None:
+        """Cancel the queued or running compaction, if any, and wait for it to stop.
+        The next compaction may be scheduled again afterwards."""
+        compaction = self._compaction
+        if compaction is None or compaction.done():
+            return
+        self._compaction_cancelled.set()
+        if not compaction.cancel():
+            wait([compaction])
+        self._compaction = None
+
+    @trace_method("PersistentLocalHnswSegment._compact", OpenTelemetryGranularity.ALL)
+    def _compact(self) -> bool:
+        """Build a fresh index of the live elements, with dense labels, in a
+        directory next to the segment's, and swap it in. The graph is built without
+        holding the lock. Only the writes applied meanwhile are caught up on, and
+        the directories swapped, under the write lock. Returns whether the index was
+        compacted."""
+        compact_folder = self._get_storage_folder() + self.COMPACT_FOLDER_SUFFIX
+        try:
+            with ReadRWLock(self._lock):
+                if self._index is None or self.num_tombstones == 0:
+                    return False
+                dimensionality = cast(int, self._dimensionality)
+                ids = list(self._id_to_label)
+                seq_ids = [self._id_to_seq_id[id] for id in ids]
+                vectors = self._get_items([self._id_to_label[id] for id in ids])
+
+            shutil.rmtree(compact_folder, ignore_errors=True)
+            os.makedirs(compact_folder)
+            index = hnswlib.Index(space=self._params.space, dim=dimensionality)
+            index.init_index(
+                max_elements=max(
+                    int(len(ids) * self._params.resize_factor), DEFAULT_CAPACITY
+                ),
+                ef_construction=self._params.construction_ef,
+                M=self._params.M,
+                is_persistent_index=True,
+                persistence_location=compact_folder,
+            )
+            index.set_num_threads(self._params.num_threads)
+            for start in range(0, len(ids), self.COMPACTION_CHUNK_SIZE):
+                if self._compaction_cancelled.is_set():
+                    break
+                stop = min(start + self.COMPACTION_CHUNK_SIZE, len(ids))
+                index.add_items(vectors[start:stop], np.arange(start + 1, stop + 1))
+            del vectors
+            if not self._compaction_cancelled.is_set():
+                index.persist_dirty()
+
+            with WriteRWLock(self._lock):
+                # A cancelled compaction is dropped before it changes the segment
+                cancelled = self._compaction_cancelled.is_set()
+                if not cancelled:
+                    self._swap_compacted_index(index, ids, dict(zip(ids, seq_ids)))
+            if cancelled:
+                index.close_file_handles()
+                shutil.rmtree(compact_folder, ignore_errors=True)
+                return False
+        except Exception:
+            logger.exception(f"Failed to compact HNSW segment {self._id}")
+            shutil.rmtree(compact_folder, ignore_errors=True)
+            return False
+        return True
+
+    def _swap_compacted_index(
+        self, index: hnswlib.Index, ids: List[str], seq_ids: Dict[str, SeqId]
+    ) -> None:
+        """Apply the writes made since the compacted index was built from ids, at
+        seq_ids, to it, then swap it in for the current index. Called with the write
+        lock held."""
+        folder = self._get_storage_folder()
+        compact_folder = folder + self.COMPACT_FOLDER_SUFFIX
+        old_folder = folder + self.OLD_FOLDER_SUFFIX
+        old_index = cast(hnswlib.Index, self._index)
+
+        # The compacted index labels ids densely, in the order they were read
+        id_to_label: Dict[str, int] = {}
+        deleted_labels: List[int] = []
+        for label, id in enumerate(ids, 1):
+            if id in self._id_to_label:
+                id_to_label[id] = label
+            else:
+                deleted_labels.append(label)
+        written_ids = [
+            id for id, seq_id in self._id_to_seq_id.items() if seq_ids.get(id) != seq_id
+        ]
+        next_label = len(ids) + 1
+        for id in written_ids:
+            if id not in id_to_label:
+                id_to_label[id] = next_label
+                next_label += 1
+        total_elements_added = next_label - 1
+
+        if len(written_ids) > 0:
+            if total_elements_added > index.get_max_elements():
+                index.resize_index(
+                    int(total_elements_added * self._params.resize_factor)
                 )
+            index.add_items(
+                self._get_items([self._id_to_label[id] for id in written_ids]),
+                [id_to_label[id] for id in written_ids],
             )
-            sql, params = get_sql(q)
-            sql = sql.replace("INSERT", "INSERT OR REPLACE")
-            cur.execute(sql, params)
+        for label in deleted_labels:
+            index.mark_deleted(label)
+        index.persist_dirty()
+        index.close_file_handles()
+        if self._write_legacy_metadata:
+            PersistentData(
+                dimensionality=self._dimensionality,
+                total_elements_added=total_elements_added,
+                id_to_label=id_to_label,
+                label_to_id={label: id for id, label in id_to_label.items()},
+                id_to_seq_id=self._id_to_seq_id,
+            ).store_to_file(os.path.join(compact_folder, self.LEGACY_METADATA_FILE))
+        PersistentIdMap(compact_folder).write_snapshot(
+            self._dimensionality,
+            total_elements_added,
+            id_to_label,
+            self._id_to_seq_id,
+            self._max_seq_id,
+        )
 
-        self._num_log_records_since_last_persist = 0
+        # A crash from here on is recovered from by _recover_compaction()
+        old_index.close_file_handles()
+        try:
+            os.rename(folder, old_folder)
+            try:
+                os.rename(compact_folder, folder)
+            except BaseException:
+                os.rename(old_folder, folder)
+                raise
+        except BaseException:
+            old_index.open_file_handles()
+            raise
+
+        # The id map must be reloaded to append to its new generation, and the
+        # index to write to its new directory. The brute force index is kept.
+        self._id_map = PersistentIdMap(folder)
+        self._load_id_map()
+        self._index = self._open_index(cast(int, self._dimensionality))
+        shutil.rmtree(old_folder, ignore_errors=True)
+
+    def _recover_compaction(self) -> None:
+        """Finish, or roll back, a compaction that was interrupted while swapping
+        directories, and remove the leftovers of one that was interrupted before"""
+        folder = self._get_storage_folder()
+        old_folder = folder + self.OLD_FOLDER_SUFFIX
+        if os.path.exists(old_folder):
+            if os.path.exists(folder):
+                shutil.rmtree(old_folder)
+            else:
+                os.rename(old_folder, folder)
+        shutil.rmtree(folder + self.COMPACT_FOLDER_SUFFIX, ignore_errors=True)
+
+    @override
+    def memory_footprint(self) -> int:
+        footprint = super().memory_footprint()
+        if self._brute_force_index is not None and self._dimensionality is not None:
+            # The brute force buffer of writes not yet applied to the index
+            footprint += self._batch_size * self._dimensionality * 4
+        return footprint
+
+    def _max_seq_id_sql(self) -> str:
+        t = Table("max_seq_id")
+        q = (
+            self._db.querybuilder()
+            .into(t)
+            .columns(t.segment_id, t.seq_id)
+            .insert(self._db.param(1), self._db.param(2))
+        )
+        return q.get_sql().replace("INSERT", "INSERT OR REPLACE")
 
     @trace_method(
         "PersistentLocalHnswSegment._apply_batch", OpenTelemetryGranularity.ALL
     )
     @override
     def _apply_batch(self, batch: Batch) -> None:
+        deleted_labels = [
+            self._id_to_label[id]
+            for id in batch.get_deleted_ids()
+            if id in self._id_to_label
+        ]
         super()._apply_batch(batch)
+
+        # Record the mapping changes so the next persist only appends those
+        for label in deleted_labels:
+            self._id_map.record_delete(label)
+        for id in batch.get_written_ids():
+            self._id_map.record_set(self._id_to_label[id], id, self._id_to_seq_id[id])
+
         if self._num_log_records_since_last_persist >= self._sync_threshold:
-            self._persist()
+            self._schedule_persist()
+        if self._should_compact():
+            self._schedule_compaction()
 
         self._num_log_records_since_last_batch = 0
 
+    @override
+    def _mark_deleted(self, label: int) -> None:
+        # A persist flushes the index as it is when the persist runs, which may be
+        # past the id map and max_seq_id it commits. The deletes since are replayed
+        # from the log on the next load, against labels the index already deleted.
+        try:
+            super()._mark_deleted(label)
+        except RuntimeError:
+            if self._is_live(label):
+                raise
+
+    def _is_live(self, label: int) -> bool:
+        """Whether the label is in the index and not deleted"""
+        try:
+            cast(hnswlib.Index, self._index).get_items([label])
+        except RuntimeError:
+            return False
+        return True
+
     @trace_method(
         "PersistentLocalHnswSegment._write_records", OpenTelemetryGranularity.ALL
     )
@@ -290,7 +776,33 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
         """Add a batch of embeddings to the index"""
         if not self._running:
             raise RuntimeError("Cannot add embeddings to stopped component")
+        self._ensure_loaded()
         with WriteRWLock(self._lock):
+            # Brute force index writes are buffered into runs of the same kind and
+            # applied as one batch. bf_exists tracks the effect of buffered writes on
+            # id membership so that existence checks stay correct before a flush.
+            bf_pending: List[LogRecord] = []
+            bf_pending_is_delete = False
+            bf_exists: Dict[str, bool] = {}
+
+            def flush_bf_pending() -> None:
+                if len(bf_pending) == 0:
+                    return
+                bf_index = cast(BruteForceIndex, self._brute_force_index)
+                if bf_pending_is_delete:
+                    bf_index.delete(bf_pending)
+                else:
+                    bf_index.upsert(bf_pending)
+                bf_pending.clear()
+
+            def buffer_bf_write(record: LogRecord, is_delete: bool) -> None:
+                nonlocal bf_pending_is_delete
+                if is_delete != bf_pending_is_delete:
+                    flush_bf_pending()
+                    bf_pending_is_delete = is_delete
+                bf_pending.append(record)
+                bf_exists[record["record"]["id"]] = not is_delete
+
             for record in records:
                 self._num_log_records_since_last_batch += 1
                 self._num_log_records_since_last_persist += 1
@@ -308,7 +820,11 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
                 id = record["record"]["id"]
                 op = record["record"]["operation"]
 
-                exists_in_bf_index = self._brute_force_index.has_id(id)
+                exists_in_bf_index = (
+                    bf_exists[id]
+                    if id in bf_exists
+                    else self._brute_force_index.has_id(id)
+                )
                 exists_in_persisted_index = self._id_to_label.get(id, None) is not None
                 exists_in_index = exists_in_bf_index or exists_in_persisted_index
 
@@ -318,7 +834,7 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
                     if exists_in_index:
                         self._curr_batch.apply(record)
                         if exists_in_bf_index:
-                            self._brute_force_index.delete([record])
+                            buffer_bf_write(record, is_delete=True)
                     else:
                         logger.warning(f"Delete of nonexisting embedding ID: {id}")
 
@@ -326,7 +842,7 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
                     if record["record"]["embedding"] is not None:
                         if exists_in_index:
                             self._curr_batch.apply(record)
-                            self._brute_force_index.upsert([record])
+                            buffer_bf_write(record, is_delete=False)
                         else:
                             logger.warning(
                                 f"Update of nonexisting embedding ID: {record['record']['id']}"
@@ -337,25 +853,64 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
                             logger.warning(f"Add of existing embedding ID: {id}")
                         else:
                             self._curr_batch.apply(record, not exists_in_index)
-                            self._brute_force_index.upsert([record])
+                            buffer_bf_write(record, is_delete=False)
                 elif op == Operation.UPSERT:
                     if record["record"]["embedding"] is not None:
                         self._curr_batch.apply(record, exists_in_index)
-                        self._brute_force_index.upsert([record])
+                        buffer_bf_write(record, is_delete=False)
 
                 if self._num_log_records_since_last_batch >= self._batch_size:
+                    flush_bf_pending()
                     self._apply_batch(self._curr_batch)
                     self._curr_batch = Batch()
                     self._brute_force_index.clear()
+                    bf_exists.clear()
+
+            flush_bf_pending()
 
     @override
     def count(self, request_version_context: RequestVersionContext) -> int:
+        if not self._loaded and not self._loading:
+            # Answer from the id map header while the log holds nothing newer
+            if not self._id_map.exists():
+                if not self._has_unapplied_records():
+                    return 0
+            else:
+                num_live = self._id_map.read_header().get("num_live")
+                if num_live is not None and not self._has_unapplied_records():
+                    return cast(int, num_live)
+            self._ensure_loaded()
         return (
             len(self._id_to_label)
             + self._curr_batch.add_count
             - self._curr_batch.delete_count
         )
 
+    @trace_method("PersistentLocalHnswSegment.has_ids", OpenTelemetryGranularity.ALL)
+    @override
+    def has_ids(
+        self, request_version_context: RequestVersionContext, ids: Sequence[str]
+    ) -> List[bool]:
+        if not self._loaded and not self._loading:
+            # Answer from the id map while the log holds nothing newer. Unloaded
+            # segments take no writes, so it can't change under the load lock.
+            with self._load_lock:
+                if not self._loaded and not self._has_unapplied_records():
+                    live = self._id_map.read_ids() if self._id_map.exists() else set()
+                    return [id in live for id in ids]
+            self._ensure_loaded()
+        batch = self._curr_batch
+        return [
+            batch.is_written(id)
+            or (id in self._id_to_label and not batch.is_deleted(id))
+            for id in ids
+        ]
+
+    def _has_unapplied_records(self) -> bool:
+        if self._collection is None:
+            return False
+        return self._db.has_records_after(self._collection, self._max_seq_id)
+
     @trace_method(
         "PersistentLocalHnswSegment.get_vectors", OpenTelemetryGranularity.ALL
     )
@@ -367,43 +922,57 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
     ) -> Sequence[VectorEmbeddingRecord]:
         """Get the embeddings from the HNSW index and layered brute force
         batch index."""
+        found_ids, vectors = self.get_vector_matrix(request_version_context, ids)
+        return [
+            VectorEmbeddingRecord(id=id, embedding=vector)
+            for id, vector in zip(found_ids, vectors)
+        ]
 
-        ids_hnsw: Set[str] = set()
-        ids_bf: Set[str] = set()
-
-        if self._index is not None:
-            ids_hnsw = set(self._id_to_label.keys())
-        if self._brute_force_index is not None:
-            ids_bf = set(self._curr_batch.get_written_ids())
-
-        target_ids = ids or list(ids_hnsw.union(ids_bf))
-        self._brute_force_index = cast(BruteForceIndex, self._brute_force_index)
-        hnsw_labels = []
-
-        results: List[Optional[VectorEmbeddingRecord]] = []
-        id_to_index: Dict[str, int] = {}
-        for i, id in enumerate(target_ids):
-            if id in ids_bf:
-                results.append(self._brute_force_index.get_vectors([id])[0])
-            elif id in ids_hnsw and id not in self._curr_batch._deleted_ids:
+    @trace_method(
+        "PersistentLocalHnswSegment.get_vector_matrix", OpenTelemetryGranularity.ALL
+    )
+    @override
+    def get_vector_matrix(
+        self,
+        request_version_context: RequestVersionContext,
+        ids: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[str], npt.NDArray[np.float32]]:
+        """Get the embeddings from the HNSW index and layered brute force batch
+        index, with one fetch from each. Only a full scan walks every id; otherwise
+        the cost is in the number of requested ids."""
+        self._ensure_loaded()
+
+        batch = self._curr_batch
+        if ids is None:
+            ids = [
+                id for id in self._id_to_label if not batch.is_written(id)
+            ] + batch.get_written_ids()
+
+        # The ids found and, for each index, the rows they fill in the result
+        found_ids: List[str] = []
+        bf_ids: List[str] = []
+        bf_rows: List[int] = []
+        hnsw_labels: List[int] = []
+        hnsw_rows: List[int] = []
+        for id in ids:
+            if batch.is_written(id):
+                bf_ids.append(id)
+                bf_rows.append(len(found_ids))
+            elif id in self._id_to_label and not batch.is_deleted(id):
                 hnsw_labels.append(self._id_to_label[id])
-                # Placeholder for hnsw results to be filled in down below so we
-                # can batch the hnsw get() call
-                results.append(None)
-            id_to_index[id] = i
-
-        if len(hnsw_labels) > 0 and self._index is not None:
-            vectors = cast(
-                Sequence[Vector], np.array(self._index.get_items(hnsw_labels))
-            )  # version 0.8 of hnswlib allows return_type="numpy"
-
-            for label, vector in zip(hnsw_labels, vectors):
-                id = self._label_to_id[label]
-                results[id_to_index[id]] = VectorEmbeddingRecord(
-                    id=id, embedding=vector
-                )
-
-        return results  # type: ignore ## Python can't cast List with Optional to List with VectorEmbeddingRecord
+                hnsw_rows.append(len(found_ids))
+            else:
+                continue
+            found_ids.append(id)
+
+        shape: Tuple[int, int] = (len(found_ids), self._dimensionality or 0)
+        vectors = np.empty(shape, dtype=np.float32)
+        if bf_ids:
+            bf_index = cast(BruteForceIndex, self._brute_force_index)
+            vectors[bf_rows] = bf_index.get_vector_matrix(bf_ids)
+        if hnsw_labels:
+            vectors[hnsw_rows] = self._get_items(hnsw_labels)
+        return found_ids, vectors
 
     @trace_method(
         "PersistentLocalHnswSegment.query_vectors", OpenTelemetryGranularity.ALL
@@ -412,6 +981,7 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
     def query_vectors(
         self, query: VectorQuery
     ) -> Sequence[Sequence[VectorQueryResult]]:
+        self._ensure_loaded()
         if self._index is None and self._brute_force_index is None:
             return [[] for _ in range(len(query["vectors"]))]
 
@@ -441,64 +1011,94 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
 
         # For each query vector, we want to take the top k results from the
         # combined results of the brute force and hnsw index
-        results: List[List[VectorQueryResult]] = []
-        self._brute_force_index = cast(BruteForceIndex, self._brute_force_index)
+        bf_index = cast(BruteForceIndex, self._brute_force_index)
         with ReadRWLock(self._lock):
-            bf_results = self._brute_force_index.query(query)
-            hnsw_results = super().query_vectors(hnsw_query)
-            for i in range(len(query["vectors"])):
-                # Merge results into a single list of size k
-                bf_pointer: int = 0
-                hnsw_pointer: int = 0
-                curr_bf_result: Sequence[VectorQueryResult] = bf_results[i]
-                curr_hnsw_result: Sequence[VectorQueryResult] = hnsw_results[i]
-
-                # Filter deleted results that haven't yet been removed from the persisted index
-                curr_hnsw_result = [
-                    x
-                    for x in curr_hnsw_result
-                    if not self._curr_batch.is_deleted(x["id"])
-                ]
+            return self._merge_results(
+                k,
+                bf_index.query_arrays(query),
+                self._query_index(hnsw_query),
+                query["include_embeddings"],
+            )
 
-                curr_results: List[VectorQueryResult] = []
-                # In the case where filters cause the number of results to be less than k,
-                # we set k to be the number of results
-                total_results = len(curr_bf_result) + len(curr_hnsw_result)
-                if total_results == 0:
-                    results.append([])
-                else:
-                    while len(curr_results) < min(k, total_results):
-                        if bf_pointer < len(curr_bf_result) and hnsw_pointer < len(
-                            curr_hnsw_result
-                        ):
-                            bf_dist = curr_bf_result[bf_pointer]["distance"]
-                            hnsw_dist = curr_hnsw_result[hnsw_pointer]["distance"]
-                            if bf_dist <= hnsw_dist:
-                                curr_results.append(curr_bf_result[bf_pointer])
-                                bf_pointer += 1
-                            else:
-                                id = curr_hnsw_result[hnsw_pointer]["id"]
-                                # Only add the hnsw result if it is not in the brute force index
-                                if not self._brute_force_index.has_id(id):
-                                    curr_results.append(curr_hnsw_result[hnsw_pointer])
-                                hnsw_pointer += 1
-                        else:
-                            break
-                    remaining = min(k, total_results) - len(curr_results)
-                    if remaining > 0 and hnsw_pointer < len(curr_hnsw_result):
-                        for i in range(
-                            hnsw_pointer,
-                            min(len(curr_hnsw_result), hnsw_pointer + remaining),
-                        ):
-                            id = curr_hnsw_result[i]["id"]
-                            if not self._brute_force_index.has_id(id):
-                                curr_results.append(curr_hnsw_result[i])
-                    elif remaining > 0 and bf_pointer < len(curr_bf_result):
-                        curr_results.extend(
-                            curr_bf_result[bf_pointer : bf_pointer + remaining]
-                        )
-                    results.append(curr_results)
-            return results
+    def _merge_results(
+        self,
+        k: int,
+        bf_results: Tuple[
+            npt.NDArray[np.object_], npt.NDArray[np.float32], npt.NDArray[np.float32]
+        ],
+        hnsw_results: Tuple[
+            npt.NDArray[Any],
+            npt.NDArray[np.float32],
+            Optional[npt.NDArray[np.float32]],
+        ],
+        include_embeddings: bool,
+    ) -> List[List[VectorQueryResult]]:
+        """Merge the top k of the brute force and HNSW results of every query at
+        once. HNSW results that were deleted or updated since the index was last
+        written are dropped: they are either gone or in the brute force index."""
+        bf_ids, bf_distances, bf_vectors = bf_results
+        hnsw_labels, hnsw_distances, hnsw_vectors = hnsw_results
+        num_queries, num_bf = bf_distances.shape
+
+        # The labels of deleted ids and of ids shadowed by the brute force index,
+        # of which there are at most a batch
+        bf_index = cast(BruteForceIndex, self._brute_force_index)
+        hidden_labels = np.fromiter(
+            (
+                self._id_to_label[id]
+                for ids in (self._curr_batch.get_deleted_ids(), bf_index.id_to_index)
+                for id in ids
+                if id in self._id_to_label
+            ),
+            dtype=np.int64,
+        )
+        distances = np.concatenate([bf_distances, hnsw_distances], axis=1)
+        distances[:, num_bf:][np.isin(hnsw_labels, hidden_labels)] = np.inf
+
+        num_candidates = distances.shape[1]
+        k = min(k, num_candidates)
+        if k == 0:
+            return [[] for _ in range(num_queries)]
+        if k < num_candidates:
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(num_candidates), (num_queries, k))
+        top_distances = np.take_along_axis(distances, top, axis=1)
+        # Sort by distance, and by column to prefer brute force results on ties
+        order = np.lexsort((top, top_distances), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_distances = np.take_along_axis(top_distances, order, axis=1)
+        # Hidden results sort last, and only show up if there are fewer than k others
+        num_found = np.isfinite(top_distances).sum(axis=1).tolist()
+
+        top_vectors = None
+        if include_embeddings:
+            vectors = np.concatenate(
+                [bf_vectors, cast(npt.NDArray[np.float32], hnsw_vectors)], axis=1
+            )
+            top_vectors = np.take_along_axis(vectors, top[:, :, None], axis=1)
+
+        label_to_id = self._label_to_id
+        bf_id_rows = bf_ids.tolist()
+        label_rows = hnsw_labels.tolist()
+        results: List[List[VectorQueryResult]] = []
+        for i, n in enumerate(num_found):
+            ids = [
+                bf_id_rows[i][column]
+                if column < num_bf
+                else label_to_id[label_rows[i][column - num_bf]]
+                for column in top[i, :n].tolist()
+            ]
+            vectors_i = repeat(None) if top_vectors is None else top_vectors[i]
+            results.append(
+                [
+                    VectorQueryResult(id=id, distance=distance, embedding=vector)
+                    for id, distance, vector in zip(
+                        ids, top_distances[i, :n].tolist(), vectors_i
+                    )
+                ]
+            )
+        return results
 
     @trace_method(
         "PersistentLocalHnswSegment.reset_state", OpenTelemetryGranularity.ALL
@@ -536,8 +1136,17 @@ class PersistentLocalHnswSegment(LocalHnswSegment):
     def stop(self) -> None:
         super().stop()
         self.close_persistent_index()
+        if self._persist_executor is not None:
+            self._persist_executor.shutdown(wait=False)
+            self._persist_executor = None
 
     def close_persistent_index(self) -> None:
-        """Close the persistent index"""
+        """Close the persistent index, once the queued persists are written. A
+        compaction in progress is cancelled."""
+        self._cancel_compaction()
+        # Only the write is waited for, not its listeners: the segment manager
+        # closes segments it evicts while holding the lock its listener takes
+        if self._last_persist is not None:
+            self._last_persist.result()
         if self._index is not None:
             self._index.close_file_handles()
@@ -0,0 +1,463 @@
+import json
+import mmap
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple, cast
+
+import numpy as np
+import numpy.typing as npt
+
+from chromadb.types import SeqId
+
+# Record operations
+OP_DELETE = 0
+OP_SET = 1
+
+# One fixed-size record per mutation. Ids are not stored inline, records point into
+# the string table instead so that the record file can be read with np.frombuffer.
+RECORD_DTYPE = np.dtype(
+    [
+        ("label", "<i8"),
+        ("seq_id", "<i8"),
+        ("offset", "<u8"),
+        ("length", "<u4"),
+        ("op", "u1"),
+    ]
+)
+
+FORMAT_VERSION = 1
+
+# Compact the log once it holds this many more records than there are live labels
+COMPACTION_MIN_RECORDS = 10000
+
+
+class IdMapState:
+    """The id/label mappings and counters of a persistent HNSW segment"""
+
+    dimensionality: Optional[int]
+    total_elements_added: int
+    id_to_label: Dict[str, int]
+    label_to_id: Dict[int, str]
+    id_to_seq_id: Dict[str, SeqId]
+
+    def __init__(
+        self,
+        dimensionality: Optional[int],
+        total_elements_added: int,
+        id_to_label: Dict[str, int],
+        label_to_id: Dict[int, str],
+        id_to_seq_id: Dict[str, SeqId],
+    ):
+        self.dimensionality = dimensionality
+        self.total_elements_added = total_elements_added
+        self.id_to_label = id_to_label
+        self.label_to_id = label_to_id
+        self.id_to_seq_id = id_to_seq_id
+
+
+class PersistentIdMap:
+    """An append-only on-disk store for the id/label mappings of a persistent HNSW
+    segment.
+
+    The store is made of three files in the segment directory:
+    - a JSON header, which is the commit point. It holds the counters of the segment
+      and how many records and string table bytes are durable.
+    - a record log of fixed-size (label, seq_id, offset, length, op) entries, one
+      per mutation, read back via mmap.
+    - a string table holding each id once, keyed by label through the records.
+
+    Mutations are buffered in memory and appended on flush(), so each sync only
+    writes what changed since the previous one. A flush can also be split into
+    prepare_flush(), under the segment lock, and write(), without it. Once the log
+    grows well past the number of live labels it is rewritten as a snapshot under a
+    new generation.
+    Not thread safe, callers should hold the segment write lock for everything but
+    write(), which only one thread may call at a time.
+    """
+
+    HEADER_FILE: str = "id_map.json"
+
+    _directory: str
+    _generation: int
+    _num_records: int
+    _strings_length: int
+    _num_live: int
+    # Location of each live label's id in the string table, so that updates to an
+    # existing label don't append the id again
+    _string_refs: Dict[int, Tuple[int, int]]
+    _pending_records: List[Tuple[int, int, int, int, int]]
+    _pending_strings: List[bytes]
+    _pending_strings_length: int
+    # Whether a write was prepared, so the next snapshot starts a new generation
+    _prepared: bool
+    # Whether a write failed, leaving the files behind the in-memory state
+    _write_failed: bool
+    # The committed live ids, as last read by read_ids() and until the next write
+    _committed_ids: Optional[Set[str]]
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        self._generation = 0
+        self._num_records = 0
+        self._strings_length = 0
+        self._num_live = 0
+        self._string_refs = {}
+        self._pending_records = []
+        self._pending_strings = []
+        self._pending_strings_length = 0
+        self._prepared = False
+        self._write_failed = False
+        self._committed_ids = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.header_path)
+
+    @property
+    def header_path(self) -> str:
+        return os.path.join(self._directory, self.HEADER_FILE)
+
+    def _records_path(self, generation: int) -> str:
+        return os.path.join(self._directory, f"id_map.{generation}.records")
+
+    def _strings_path(self, generation: int) -> str:
+        return os.path.join(self._directory, f"id_map.{generation}.strings")
+
+    def read_header(self) -> Dict[str, Any]:
+        """Read the committed header without touching the record log. Besides the
+        counters, it holds "num_live", the number of live labels, and "max_seq_id",
+        the log position of the mappings if the writer gave one."""
+        with open(self.header_path, "r") as f:
+            header = cast(Dict[str, Any], json.load(f))
+        return header
+
+    def load(self) -> IdMapState:
+        """Load the committed state from disk, discarding any uncommitted tail left
+        by an interrupted flush."""
+        header = self.read_header()
+        self._committed_ids = None
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported id map format version {header['version']} in {self._directory}"
+            )
+        self._generation = header["generation"]
+        self._num_records = header["num_records"]
+        self._strings_length = header["strings_length"]
+
+        records_path = self._records_path(self._generation)
+        strings_path = self._strings_path(self._generation)
+        _truncate(records_path, self._num_records * RECORD_DTYPE.itemsize)
+        _truncate(strings_path, self._strings_length)
+
+        live, ids = self._read_live(header)
+        labels: List[int] = live["label"].tolist()
+        seq_ids: List[int] = live["seq_id"].tolist()
+        self._string_refs = {
+            label: (o, n)
+            for label, o, n in zip(
+                labels, live["offset"].tolist(), live["length"].tolist()
+            )
+        }
+
+        self._num_live = len(labels)
+        return IdMapState(
+            dimensionality=header["dimensionality"],
+            total_elements_added=header["total_elements_added"],
+            id_to_label=dict(zip(ids, labels)),
+            label_to_id=dict(zip(labels, ids)),
+            id_to_seq_id=dict(zip(ids, seq_ids)),
+        )
+
+    def read_ids(self) -> Set[str]:
+        """Read the committed live ids without touching the files or the in-memory
+        state, which only load() sets up. They are read once, and again after the
+        next write."""
+        if self._committed_ids is None:
+            _, ids = self._read_live(self.read_header())
+            self._committed_ids = set(ids)
+        return self._committed_ids
+
+    def _read_live(self, header: Dict[str, Any]) -> Tuple[npt.NDArray[Any], List[str]]:
+        """Read the last SET record of every live label committed by header, and
+        the id of each"""
+        num_records = header["num_records"]
+        strings_length = header["strings_length"]
+        if num_records == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE), []
+        with open(self._records_path(header["generation"]), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as records_mm:
+                live = _live_records(records_mm, num_records)
+        if strings_length == 0:
+            return live, [""] * len(live)
+        with open(self._strings_path(header["generation"]), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as strings_mm:
+                ids = [
+                    strings_mm[o : o + n].decode("utf-8")
+                    for o, n in zip(live["offset"].tolist(), live["length"].tolist())
+                ]
+        return live, ids
+
+    def record_set(self, label: int, id: str, seq_id: SeqId) -> None:
+        """Record that label now maps to id, as of seq_id"""
+        ref = self._string_refs.get(label)
+        if ref is None:
+            encoded = id.encode("utf-8")
+            ref = (self._strings_length + self._pending_strings_length, len(encoded))
+            self._pending_strings.append(encoded)
+            self._pending_strings_length += len(encoded)
+            self._string_refs[label] = ref
+            self._num_live += 1
+        self._pending_records.append((label, seq_id, ref[0], ref[1], OP_SET))
+
+    def record_delete(self, label: int) -> None:
+        """Record that label no longer maps to an id"""
+        if self._string_refs.pop(label, None) is not None:
+            self._num_live -= 1
+        self._pending_records.append((label, 0, 0, 0, OP_DELETE))
+
+    def flush(
+        self,
+        dimensionality: Optional[int],
+        total_elements_added: int,
+        id_to_label: Dict[str, int],
+        id_to_seq_id: Dict[str, SeqId],
+        max_seq_id: Optional[SeqId] = None,
+    ) -> None:
+        """Durably append the buffered mutations and commit them by rewriting the
+        header. The current mappings are only read if the log needs compaction."""
+        self.write(
+            self.prepare_flush(
+                dimensionality,
+                total_elements_added,
+                id_to_label,
+                id_to_seq_id,
+                max_seq_id,
+            )
+        )
+
+    def write_snapshot(
+        self,
+        dimensionality: Optional[int],
+        total_elements_added: int,
+        id_to_label: Dict[str, int],
+        id_to_seq_id: Dict[str, SeqId],
+        max_seq_id: Optional[SeqId] = None,
+    ) -> None:
+        """Write the given mappings as a fresh generation holding one record per live
+        label, then switch the header over to it and remove the old generation."""
+        self.write(
+            self.prepare_snapshot(
+                dimensionality,
+                total_elements_added,
+                id_to_label,
+                id_to_seq_id,
+                max_seq_id,
+            )
+        )
+
+    def prepare_flush(
+        self,
+        dimensionality: Optional[int],
+        total_elements_added: int,
+        id_to_label: Dict[str, int],
+        id_to_seq_id: Dict[str, SeqId],
+        max_seq_id: Optional[SeqId] = None,
+    ) -> "IdMapWrite":
+        """Take the buffered mutations as a write that commits them, which write()
+        can do later without the segment lock. The in-memory state moves on as if
+        it was written, so writes must be written in the order they were prepared.
+        The header records max_seq_id, the log position the mappings are as of.
+        """
+        num_records = self._num_records + len(self._pending_records)
+        if self._write_failed or num_records - self._num_live > max(
+            self._num_live, COMPACTION_MIN_RECORDS
+        ):
+            return self.prepare_snapshot(
+                dimensionality,
+                total_elements_added,
+                id_to_label,
+                id_to_seq_id,
+                max_seq_id,
+            )
+
+        strings = b"".join(self._pending_strings)
+        records = np.array(self._pending_records, dtype=RECORD_DTYPE)
+        self._num_records = num_records
+        self._strings_length += len(strings)
+        self._clear_pending()
+        return IdMapWrite(
+            generation=self._generation,
+            is_snapshot=False,
+            records=records.tobytes(),
+            strings=strings,
+            header=self._header(dimensionality, total_elements_added, max_seq_id),
+        )
+
+    def prepare_snapshot(
+        self,
+        dimensionality: Optional[int],
+        total_elements_added: int,
+        id_to_label: Dict[str, int],
+        id_to_seq_id: Dict[str, SeqId],
+        max_seq_id: Optional[SeqId] = None,
+    ) -> "IdMapWrite":
+        """Take the given mappings as a write of a fresh generation, see
+        prepare_flush()"""
+        has_generation = self._prepared or self.exists()
+        generation = self._generation + 1 if has_generation else 0
+
+        encoded = [id.encode("utf-8") for id in id_to_label]
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.uint32)
+        offsets = np.zeros(len(encoded), dtype=np.uint64)
+        if len(encoded) > 0:
+            offsets[1:] = np.cumsum(lengths[:-1], dtype=np.uint64)
+        records = np.zeros(len(encoded), dtype=RECORD_DTYPE)
+        records["label"] = list(id_to_label.values())
+        records["seq_id"] = [id_to_seq_id.get(id, 0) for id in id_to_label]
+        records["offset"] = offsets
+        records["length"] = lengths
+        records["op"] = OP_SET
+        strings = b"".join(encoded)
+
+        self._generation = generation
+        self._num_records = len(records)
+        self._strings_length = len(strings)
+        self._num_live = len(records)
+        self._string_refs = {
+            label: (o, n)
+            for label, o, n in zip(
+                records["label"].tolist(), offsets.tolist(), lengths.tolist()
+            )
+        }
+        self._clear_pending()
+        # Appends prepared from here on build on this snapshot
+        self._write_failed = False
+        return IdMapWrite(
+            generation=generation,
+            is_snapshot=True,
+            records=records.tobytes(),
+            strings=strings,
+            header=self._header(dimensionality, total_elements_added, max_seq_id),
+            previous_generation=generation - 1 if has_generation else None,
+        )
+
+    def write(self, write: "IdMapWrite") -> None:
+        """Durably write a prepared write and commit it by rewriting the header.
+        Once a write fails, appends are refused until a snapshot was written, and
+        the next prepare_flush() prepares one."""
+        if self._write_failed and not write.is_snapshot:
+            raise RuntimeError(
+                f"An earlier write of the id map in {self._directory} failed"
+            )
+        try:
+            records_path = self._records_path(write.generation)
+            strings_path = self._strings_path(write.generation)
+            if write.is_snapshot:
+                _write_durably(strings_path, write.strings)
+                _write_durably(records_path, write.records)
+            else:
+                _append(strings_path, write.strings)
+                _append(records_path, write.records)
+            self._write_header(write.header)
+            self._committed_ids = None
+        except BaseException:
+            self._write_failed = True
+            raise
+
+        if write.previous_generation is not None:
+            for path in (
+                self._records_path(write.previous_generation),
+                self._strings_path(write.previous_generation),
+            ):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _clear_pending(self) -> None:
+        self._prepared = True
+        self._pending_records = []
+        self._pending_strings = []
+        self._pending_strings_length = 0
+
+    def _header(
+        self,
+        dimensionality: Optional[int],
+        total_elements_added: int,
+        max_seq_id: Optional[SeqId],
+    ) -> Dict[str, Any]:
+        return {
+            "version": FORMAT_VERSION,
+            "generation": self._generation,
+            "dimensionality": dimensionality,
+            "total_elements_added": total_elements_added,
+            "num_records": self._num_records,
+            "strings_length": self._strings_length,
+            "num_live": self._num_live,
+            "max_seq_id": max_seq_id,
+        }
+
+    def _write_header(self, header: Dict[str, Any]) -> None:
+        tmp_path = self.header_path + ".tmp"
+        _write_durably(tmp_path, json.dumps(header).encode("utf-8"))
+        os.replace(tmp_path, self.header_path)
+
+
+class IdMapWrite:
+    """The files and header of one commit of a PersistentIdMap, as prepared by
+    prepare_flush() or prepare_snapshot()"""
+
+    generation: int
+    # Whether this writes a fresh generation, rather than appending to it
+    is_snapshot: bool
+    records: bytes
+    strings: bytes
+    header: Dict[str, Any]
+    # The generation a snapshot replaces, removed once it is written
+    previous_generation: Optional[int]
+
+    def __init__(
+        self,
+        generation: int,
+        is_snapshot: bool,
+        records: bytes,
+        strings: bytes,
+        header: Dict[str, Any],
+        previous_generation: Optional[int] = None,
+    ):
+        self.generation = generation
+        self.is_snapshot = is_snapshot
+        self.records = records
+        self.strings = strings
+        self.header = header
+        self.previous_generation = previous_generation
+
+
+def _live_records(buffer: Any, num_records: int) -> npt.NDArray[Any]:
+    """Replay the record log and return the last SET record of every live label.
+    The returned array is a copy, so the buffer can be released afterwards."""
+    records = np.frombuffer(buffer, dtype=RECORD_DTYPE, count=num_records)
+    # np.unique returns the first occurrence, so search the reversed log to find
+    # the most recent record for each label
+    _, reversed_index = np.unique(records["label"][::-1], return_index=True)
+    latest = records[num_records - 1 - reversed_index]
+    del records
+    return cast(npt.NDArray[Any], latest[latest["op"] == OP_SET])
+
+
+def _truncate(path: str, length: int) -> None:
+    if not os.path.exists(path):
+        open(path, "wb").close()
+    elif os.path.getsize(path) > length:
+        with open(path, "r+b") as f:
+            f.truncate(length)
+
+
+def _append(path: str, data: bytes) -> None:
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_durably(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
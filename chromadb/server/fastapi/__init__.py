@@ -1,16 +1,21 @@
 from typing import (
     Any,
+    AsyncIterator,
     Callable,
     cast,
     Dict,
+    Iterator,
     Sequence,
     Optional,
     Type,
     TypeVar,
     Tuple,
+    Union,
 )
 import fastapi
 import orjson
+import zlib
+from itertools import chain
 from anyio import (
     to_thread,
     CapacityLimiter,
@@ -18,7 +23,7 @@ from anyio import (
 from fastapi import FastAPI as _FastAPI, Response, Request
 from fastapi.openapi.utils import get_openapi
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import ORJSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.routing import APIRoute
 from fastapi import HTTPException, status
 from functools import wraps
@@ -63,6 +68,7 @@ from chromadb.server.fastapi.types import (
     CreateTenant,
     DeleteEmbedding,
     GetEmbedding,
+    GetStreamEmbedding,
     QueryEmbedding,
     CreateCollection,
     UpdateCollection,
@@ -72,6 +78,11 @@ from starlette.datastructures import Headers
 import logging
 
 from chromadb.telemetry.product.events import ServerStartEvent
+from chromadb.utils.binary_embeddings import (
+    BINARY_EMBEDDINGS_CONTENT_TYPE,
+    decode_embeddings_body,
+    encode_embeddings_body,
+)
 from chromadb.utils.fastapi import fastapi_json_response, string_to_uuid as _uuid
 from opentelemetry import trace
 
@@ -86,8 +97,15 @@ from chromadb.telemetry.opentelemetry import (
 )
 from chromadb.types import Collection as CollectionModel
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 logger = logging.getLogger(__name__)
 
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
 
 def rate_limit(func):
     @wraps(func)
@@ -152,6 +170,66 @@ async def check_http_version_middleware(
 D = TypeVar("D", bound=BaseModel, contravariant=True)
 
 
+def load_body(request: Request, raw_body: bytes) -> Any:
+    """Parses a request body, which carries embeddings in binary if the client
+    negotiated it with the pre-flight checks"""
+    if request.headers.get("content-type", "").startswith(
+        BINARY_EMBEDDINGS_CONTENT_TYPE
+    ):
+        return decode_embeddings_body(raw_body)
+    return orjson.loads(raw_body)
+
+
+def embeddings_response(
+    request: Request, result: Any, grouped: bool = False
+) -> Optional[Response]:
+    """Returns a binary response for a result with embeddings, if the client accepts
+    one. Otherwise the result is sent as JSON."""
+    if result["embeddings"] is None or BINARY_EMBEDDINGS_CONTENT_TYPE not in (
+        request.headers.get("accept", "")
+    ):
+        return None
+    content = encode_embeddings_body(dict(result), "embeddings", grouped=grouped)
+    if content is None:
+        return None
+    return Response(content=content, media_type=BINARY_EMBEDDINGS_CONTENT_TYPE)
+
+
+def stream_encoding(request: Request) -> Optional[str]:
+    """Picks the compression of a streamed response from the encodings the client
+    accepts, preferring zstd when it is installed"""
+    accepted = {
+        encoding.split(";")[0].strip().lower()
+        for encoding in request.headers.get("accept-encoding", "").split(",")
+    }
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+async def compress_stream(
+    chunks: AsyncIterator[bytes], encoding: Optional[str]
+) -> AsyncIterator[bytes]:
+    """Compresses a stream, flushing after each chunk so that the client can decode
+    every chunk as soon as it arrives"""
+    if encoding is None:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor().compressobj()
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+    else:
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+        flush_mode = zlib.Z_SYNC_FLUSH
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(flush_mode)
+    yield compressor.flush()
+
+
 def validate_model(model: Type[D], data: Any) -> D:  # type: ignore
     """Used for backward compatibility with Pydantic 1.x"""
     try:
@@ -383,6 +461,13 @@ class FastAPI(Server):
             response_model=None,
             openapi_extra=self.get_openapi_extras_for_body_model(GetEmbedding),
         )
+        self.router.add_api_route(
+            "/api/v2/tenants/{tenant}/databases/{database_name}/collections/{collection_id}/get_stream",
+            self.get_stream,
+            methods=["POST"],
+            response_model=None,
+            openapi_extra=self.get_openapi_extras_for_body_model(GetStreamEmbedding),
+        )
         self.router.add_api_route(
             "/api/v2/tenants/{tenant}/databases/{database_name}/collections/{collection_id}/delete",
             self.delete,
@@ -950,7 +1035,7 @@ class FastAPI(Server):
         try:
 
             def process_add(request: Request, raw_body: bytes) -> bool:
-                add = validate_model(AddEmbedding, orjson.loads(raw_body))
+                add = validate_model(AddEmbedding, load_body(request, raw_body))
                 # NOTE(rescrv, iron will auth):  Implemented.
                 self.sync_auth_request(
                     request.headers,
@@ -999,7 +1084,7 @@ class FastAPI(Server):
         collection_id: str,
     ) -> None:
         def process_update(request: Request, raw_body: bytes) -> bool:
-            update = validate_model(UpdateEmbedding, orjson.loads(raw_body))
+            update = validate_model(UpdateEmbedding, load_body(request, raw_body))
 
             # NOTE(rescrv, iron will auth):  Implemented.
             self.sync_auth_request(
@@ -1042,7 +1127,7 @@ class FastAPI(Server):
         collection_id: str,
     ) -> None:
         def process_upsert(request: Request, raw_body: bytes) -> bool:
-            upsert = validate_model(AddEmbedding, orjson.loads(raw_body))
+            upsert = validate_model(AddEmbedding, load_body(request, raw_body))
 
             # NOTE(rescrv, iron will auth):  Implemented.
             self.sync_auth_request(
@@ -1086,7 +1171,7 @@ class FastAPI(Server):
         tenant: str,
         database_name: str,
         request: Request,
-    ) -> GetResult:
+    ) -> Union[GetResult, Response]:
         def process_get(request: Request, raw_body: bytes) -> GetResult:
             get = validate_model(GetEmbedding, orjson.loads(raw_body))
             # NOTE(rescrv, iron will auth):  Implemented.
@@ -1107,6 +1192,7 @@ class FastAPI(Server):
                 offset=get.offset,
                 where_document=get.where_document,
                 include=get.include,
+                cursor=get.cursor,
                 tenant=tenant,
                 database=database_name,
             )
@@ -1121,6 +1207,10 @@ class FastAPI(Server):
             ),
         )
 
+        binary_response = embeddings_response(request, get_result)
+        if binary_response is not None:
+            return binary_response
+
         if get_result["embeddings"] is not None:
             get_result["embeddings"] = [
                 cast(Embedding, embedding).tolist()
@@ -1129,6 +1219,73 @@ class FastAPI(Server):
 
         return get_result
 
+    @trace_method("FastAPI.get_stream", OpenTelemetryGranularity.OPERATION)
+    @rate_limit
+    async def get_stream(
+        self,
+        collection_id: str,
+        tenant: str,
+        database_name: str,
+        request: Request,
+    ) -> Response:
+        def process_get_stream(
+            request: Request, raw_body: bytes
+        ) -> Iterator[GetResult]:
+            get = validate_model(GetStreamEmbedding, orjson.loads(raw_body))
+            # NOTE(rescrv, iron will auth):  Implemented.
+            self.sync_auth_request(
+                request.headers,
+                AuthzAction.GET,
+                tenant,
+                database_name,
+                collection_id,
+            )
+            self._set_request_context(request=request)
+            add_attributes_to_current_span({"tenant": tenant})
+            pages = self._api._iter_get(
+                collection_id=_uuid(collection_id),
+                ids=get.ids,
+                where=get.where,
+                where_document=get.where_document,
+                include=get.include,
+                batch_size=get.batch_size,
+                tenant=tenant,
+                database=database_name,
+            )
+            # Read the first page before the response starts, so that errors are
+            # returned with their status rather than cutting the stream short
+            first = next(pages, None)
+            return chain([] if first is None else [first], pages)
+
+        pages = cast(
+            Iterator[GetResult],
+            await to_thread.run_sync(
+                process_get_stream,
+                request,
+                await request.body(),
+                limiter=self._capacity_limiter,
+            ),
+        )
+
+        async def lines() -> AsyncIterator[bytes]:
+            while True:
+                page = await to_thread.run_sync(
+                    next, pages, None, limiter=self._capacity_limiter
+                )
+                if page is None:
+                    return
+                yield orjson.dumps(
+                    page,
+                    option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE,
+                )
+
+        encoding = stream_encoding(request)
+        return StreamingResponse(
+            compress_stream(lines(), encoding),
+            media_type=NDJSON_CONTENT_TYPE,
+            headers={"Content-Encoding": encoding} if encoding else None,
+        )
+
     @trace_method("FastAPI.delete", OpenTelemetryGranularity.OPERATION)
     @rate_limit
     async def delete(
@@ -1227,12 +1384,12 @@ class FastAPI(Server):
         database_name: str,
         collection_id: str,
         request: Request,
-    ) -> QueryResult:
+    ) -> Union[QueryResult, Response]:
         @trace_method(
             "internal.get_nearest_neighbors", OpenTelemetryGranularity.OPERATION
         )
         def process_query(request: Request, raw_body: bytes) -> QueryResult:
-            query = validate_model(QueryEmbedding, orjson.loads(raw_body))
+            query = validate_model(QueryEmbedding, load_body(request, raw_body))
 
             # NOTE(rescrv, iron will auth):  Implemented.
             self.sync_auth_request(
@@ -1271,6 +1428,10 @@ class FastAPI(Server):
             ),
         )
 
+        binary_response = embeddings_response(request, nnresult, grouped=True)
+        if binary_response is not None:
+            return binary_response
+
         if nnresult["embeddings"] is not None:
             nnresult["embeddings"] = [
                 [cast(Embedding, embedding).tolist() for embedding in result]
@@ -1283,6 +1444,8 @@ class FastAPI(Server):
         def process_pre_flight_checks() -> Dict[str, Any]:
             return {
                 "max_batch_size": self._api.get_max_batch_size(),
+                "supports_binary_embeddings": True,
+                "supports_get_stream": True,
             }
 
         return cast(
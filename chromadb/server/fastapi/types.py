@@ -45,6 +45,15 @@ class GetEmbedding(BaseModel):
     limit: Optional[int] = None
     offset: Optional[int] = None
     include: Include = IncludeMetadataDocuments
+    cursor: Optional[str] = None
+
+
+class GetStreamEmbedding(BaseModel):
+    ids: Optional[List[str]] = None
+    where: Optional[Dict[Any, Any]] = None
+    where_document: Optional[Dict[Any, Any]] = None
+    include: Include = IncludeMetadataDocuments
+    batch_size: int = 1000
 
 
 class DeleteEmbedding(BaseModel):
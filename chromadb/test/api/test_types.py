@@ -1,6 +1,13 @@
 import pytest
 from typing import List, cast, Dict, Any
-from chromadb.api.types import Documents, Image, Document, Embeddings
+from chromadb.api.types import (
+    Documents,
+    Image,
+    Document,
+    Embeddings,
+    convert_list_embeddings_to_np,
+    validate_embeddings,
+)
 from chromadb.utils.embedding_functions import (
     EmbeddingFunction,
     register_embedding_function,
@@ -103,3 +110,59 @@ def test_embedding_function_results_format_when_response_is_invalid() -> None:
         from chromadb.api.types import normalize_embeddings
 
         normalize_embeddings(result)
+
+
+@pytest.mark.parametrize(
+    "embeddings",
+    [
+        np.random.random(size=(10, 10)).astype(np.float32),
+        list(np.random.random(size=(10, 10))),
+        np.random.randint(0, 10, size=(10, 10), dtype=np.int32),
+    ],
+)
+def test_validate_embeddings_accepts_numeric_arrays(embeddings: Any) -> None:
+    assert validate_embeddings(embeddings) is embeddings
+
+
+@pytest.mark.parametrize(
+    "embeddings, message",
+    [
+        (
+            [np.array([1.0, 2.0]), np.array(["a", "b"])],
+            "Expected each value in the embedding to be a int or float",
+        ),
+        (
+            np.array([[True, False]]),
+            "Expected each value in the embedding to be a int or float",
+        ),
+        (
+            np.zeros((2, 0), dtype=np.float32),
+            "Got a 1-dimensional numpy array with no values at pos 0",
+        ),
+        (
+            np.array([[1.0, 2.0], [np.nan, 1.0]], dtype=np.float32),
+            "got NaN or infinity in the embedding at pos 1",
+        ),
+        (
+            [np.array([1.0, 2.0]), np.array([1.0, np.inf])],
+            "got NaN or infinity in the embedding at pos 1",
+        ),
+    ],
+)
+def test_validate_embeddings_rejects_invalid_values(
+    embeddings: Any, message: str
+) -> None:
+    with pytest.raises(ValueError, match=message):
+        validate_embeddings(embeddings)
+
+
+def test_convert_list_embeddings_to_np() -> None:
+    embeddings = convert_list_embeddings_to_np([[1, 2.5], [3, 4]])
+    assert [e.dtype for e in embeddings] == [np.float32, np.float32]
+    assert [e.tolist() for e in embeddings] == [[1.0, 2.5], [3.0, 4.0]]
+
+    # Ragged and non-numeric embeddings are left for validation to report
+    ragged = convert_list_embeddings_to_np([[1.0], [1.0, 2.0]])
+    assert [len(e) for e in ragged] == [1, 2]
+    with pytest.raises(ValueError, match="to be a int or float"):
+        validate_embeddings(convert_list_embeddings_to_np([[True, False]]))
@@ -0,0 +1,121 @@
+import uuid
+from typing import Generator, List, Sequence
+
+import numpy as np
+import pytest
+
+from chromadb.config import System
+from chromadb.db.impl.sqlite import SqliteDB
+from chromadb.db.mixins import embeddings_queue
+from chromadb.test.conftest import sqlite_fixture
+from chromadb.types import (
+    LogRecord,
+    Operation,
+    OperationRecord,
+    ScalarEncoding,
+    SeqId,
+)
+
+
+@pytest.fixture
+def system() -> Generator[System, None, None]:
+    yield from sqlite_fixture()
+
+
+def test_backfill_streams_chunks(
+    system: System, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    db = system.instance(SqliteDB)
+    monkeypatch.setattr(SqliteDB, "BACKFILL_CHUNK_SIZE", 4)
+    collection_id = uuid.uuid4()
+
+    records = [
+        OperationRecord(
+            id=str(i),
+            # Vectors of different sizes are decoded separately
+            embedding=np.array([i, i + 1] if i < 5 else [i], dtype=np.float32),
+            encoding=ScalarEncoding.FLOAT32,
+            metadata={"i": i},
+            operation=Operation.ADD,
+        )
+        for i in range(10)
+    ]
+    seq_ids = list(db.submit_embeddings(collection_id, records))
+    delete = OperationRecord(
+        id="0", embedding=None, encoding=None, metadata=None, operation=Operation.DELETE
+    )
+    seq_ids.extend(db.submit_embeddings(collection_id, [delete]))
+    records.append(delete)
+
+    chunks: List[Sequence[LogRecord]] = []
+    db.subscribe(collection_id, chunks.append, start=seq_ids[0])
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    received = [record for chunk in chunks for record in chunk]
+    assert [r["log_offset"] for r in received] == list(seq_ids[1:])
+    for r, expected in zip(received, records[1:]):
+        assert r["record"]["id"] == expected["id"]
+        assert r["record"]["operation"] == expected["operation"]
+        assert r["record"]["metadata"] == expected["metadata"]
+        assert r["record"]["encoding"] == expected["encoding"]
+        if expected["embedding"] is None:
+            assert r["record"]["embedding"] is None
+        else:
+            assert r["record"]["embedding"] is not None
+            assert np.array_equal(r["record"]["embedding"], expected["embedding"])
+
+
+def _submit(db: SqliteDB, collection_id: uuid.UUID, n: int) -> List[SeqId]:
+    records = [
+        OperationRecord(
+            id=str(i),
+            embedding=np.array([i], dtype=np.float32),
+            encoding=ScalarEncoding.FLOAT32,
+            metadata=None,
+            operation=Operation.ADD,
+        )
+        for i in range(n)
+    ]
+    return list(db.submit_embeddings(collection_id, records))
+
+
+def test_backfill_stops_when_the_subscriber_fails(
+    system: System, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    db = system.instance(SqliteDB)
+    monkeypatch.setattr(SqliteDB, "BACKFILL_CHUNK_SIZE", 4)
+    monkeypatch.setattr(embeddings_queue, "_called_from_test", False)
+    collection_id = uuid.uuid4()
+    seq_ids = _submit(db, collection_id, 11)
+
+    chunks: List[Sequence[LogRecord]] = []
+
+    def consume(chunk: Sequence[LogRecord]) -> None:
+        if len(chunks) == 1:
+            raise RuntimeError("failed")
+        chunks.append(chunk)
+
+    db.subscribe(collection_id, consume, start=seq_ids[0])
+
+    # The records after the failed chunk are not delivered either
+    assert [r["log_offset"] for chunk in chunks for r in chunk] == seq_ids[1:5]
+
+
+def test_backfill_reads_each_chunk_in_its_own_transaction(
+    system: System, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    db = system.instance(SqliteDB)
+    monkeypatch.setattr(SqliteDB, "BACKFILL_CHUNK_SIZE", 4)
+    collection_id = uuid.uuid4()
+    seq_ids = _submit(db, collection_id, 11)
+
+    # The subscriber gets each chunk once its transaction is closed, so that a
+    # slow subscriber doesn't hold the database
+    chunks: List[Sequence[LogRecord]] = []
+
+    def consume(chunk: Sequence[LogRecord]) -> None:
+        assert len(db._tx_stack.stack) == 0
+        chunks.append(chunk)
+
+    db.subscribe(collection_id, consume, start=seq_ids[0])
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
@@ -1,5 +1,13 @@
+import os
+import tempfile
+
+import pytest
+
 from chromadb.api.client import Client
-from chromadb.config import System
+from chromadb.config import Settings, System
+from chromadb.db.impl.sqlite import SqliteDB
+from chromadb.segment import SegmentManager
+from chromadb.segment.impl.manager.local import LocalSegmentManager
 from chromadb.test.property import invariants
 
 
@@ -48,3 +56,59 @@ def test_log_purge_with_multiple_collections(sqlite_persistent: System) -> None:
     invariants.log_size_for_collections_match_expected(
         client._system, collections, True
     )
+
+
+@pytest.mark.skipif(
+    "CHROMA_RUST_BINDINGS_TEST_ONLY" in os.environ,
+    reason="The Rust bindings purge their own log",
+)
+def test_background_log_purge() -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        system = System(
+            Settings(
+                chroma_api_impl="chromadb.api.segment.SegmentAPI",
+                chroma_sysdb_impl="chromadb.db.impl.sqlite.SqliteDB",
+                chroma_producer_impl="chromadb.db.impl.sqlite.SqliteDB",
+                chroma_consumer_impl="chromadb.db.impl.sqlite.SqliteDB",
+                chroma_segment_manager_impl="chromadb.segment.impl.manager.local.LocalSegmentManager",
+                allow_reset=True,
+                is_persistent=True,
+                persist_directory=persist_directory,
+                # Long enough that only explicit purges run during the test
+                chroma_wal_purge_interval_ms=60 * 60 * 1000,
+            )
+        )
+        system.start()
+        client = Client.from_system(system)
+        sqlite = system.instance(SqliteDB)
+
+        collections = [
+            client.create_collection(
+                name,
+                metadata={"hnsw:sync_threshold": 10, "hnsw:batch_size": 10},
+            )
+            for name in ["first_collection", "second_collection"]
+        ]
+        for collection in collections:
+            for i in range(25):
+                collection.add(ids=str(i), embeddings=[i, i])
+
+        # Submits only schedule a purge
+        stats = sqlite.wal_stats()
+        assert stats["records"] == 50
+        assert stats["pending_purge_collections"] == 2
+        assert stats["pending_purge_bytes"] > 0
+
+        # The log is purgeable once the segments persisted in the background
+        manager = system.instance(SegmentManager)
+        assert isinstance(manager, LocalSegmentManager)
+        manager.wait_for_persist()
+        sqlite.purge_pending_logs()
+        invariants.log_size_for_collections_match_expected(system, collections, True)
+        stats = sqlite.wal_stats()
+        assert stats["records"] == 12
+        assert stats["purged_records"] == 38
+        assert stats["pending_purge_collections"] == 0
+        assert stats["purge_lag_seconds"] == 0.0
+
+        system.stop()
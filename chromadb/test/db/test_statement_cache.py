@@ -0,0 +1,24 @@
+from typing import List
+
+from chromadb.db.base import StatementCache
+
+
+def test_statement_cache_builds_each_shape_once() -> None:
+    built: List[str] = []
+
+    def build(sql: str) -> str:
+        built.append(sql)
+        return sql
+
+    cache = StatementCache(max_size=2)
+    assert cache.get("a", lambda: build("SELECT 1")) == "SELECT 1"
+    assert cache.get("a", lambda: build("SELECT 2")) == "SELECT 1"
+    assert cache.get(("b", 3), lambda: build("SELECT 3")) == "SELECT 3"
+    assert built == ["SELECT 1", "SELECT 3"]
+
+    # The least recently used shape is evicted once the cache is full
+    cache.get("a", lambda: build("unused"))
+    cache.get("c", lambda: build("SELECT 4"))
+    assert len(cache) == 2
+    assert cache.get(("b", 3), lambda: build("SELECT 5")) == "SELECT 5"
+    assert cache.get("c", lambda: build("unused")) == "SELECT 4"
@@ -0,0 +1,104 @@
+from typing import Any, Dict, List
+
+import numpy as np
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import (
+    CachedEmbeddingFunction,
+    EmbeddingCacheInfo,
+    config_to_embedding_function,
+    register_embedding_function,
+)
+
+
+@register_embedding_function
+class CountingEmbeddingFunction(EmbeddingFunction[Documents]):
+    def __init__(self, dim: int = 3) -> None:
+        self.dim = dim
+        self.calls: List[Documents] = []
+
+    def __call__(self, input: Documents) -> Embeddings:
+        self.calls.append(list(input))
+        return [
+            np.array([len(text) + i for i in range(self.dim)], dtype=np.float32)
+            for text in input
+        ]
+
+    @staticmethod
+    def name() -> str:
+        return "counting"
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "CountingEmbeddingFunction":
+        return CountingEmbeddingFunction(dim=config["dim"])
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"dim": self.dim}
+
+
+def test_only_misses_are_embedded() -> None:
+    inner = CountingEmbeddingFunction()
+    ef = CachedEmbeddingFunction(inner)
+
+    first = ef(["a", "bb", "a"])
+    assert inner.calls == [["a", "bb"]]
+    assert [e.tolist() for e in first] == [[1, 2, 3], [2, 3, 4], [1, 2, 3]]
+
+    second = ef(["bb", "ccc"])
+    assert inner.calls == [["a", "bb"], ["ccc"]]
+    assert [e.tolist() for e in second] == [[2, 3, 4], [3, 4, 5]]
+    assert ef.cache_info() == EmbeddingCacheInfo(
+        hits=1, disk_hits=0, misses=3, entries=3
+    )
+
+    ef.cache_clear()
+    ef(["a"])
+    assert ef.cache_info() == EmbeddingCacheInfo(
+        hits=0, disk_hits=0, misses=1, entries=1
+    )
+
+
+def test_lru_eviction() -> None:
+    inner = CountingEmbeddingFunction()
+    ef = CachedEmbeddingFunction(inner, max_entries=2)
+    ef(["a", "bb"])
+    ef(["a"])
+    ef(["ccc"])
+    # "bb" was the least recently used
+    ef(["a", "bb"])
+    assert inner.calls == [["a", "bb"], ["ccc"], ["bb"]]
+
+
+def test_config_is_part_of_the_key(tmp_path: Any) -> None:
+    ef = CachedEmbeddingFunction(CountingEmbeddingFunction(dim=2), str(tmp_path))
+    other = CachedEmbeddingFunction(CountingEmbeddingFunction(dim=3), str(tmp_path))
+    ef(["a"])
+    assert [e.tolist() for e in other(["a"])] == [[1, 2, 3]]
+    assert other.cache_info().misses == 1
+
+
+def test_disk_cache_survives_restarts(tmp_path: Any) -> None:
+    ef = CachedEmbeddingFunction(CountingEmbeddingFunction(), str(tmp_path))
+    ef(["a", "bb"])
+
+    inner = CountingEmbeddingFunction()
+    restarted = CachedEmbeddingFunction(inner, str(tmp_path))
+    embeddings = restarted(["bb", "ccc"])
+    assert inner.calls == [["ccc"]]
+    assert [e.tolist() for e in embeddings] == [[2, 3, 4], [3, 4, 5]]
+    assert restarted.cache_info() == EmbeddingCacheInfo(
+        hits=0, disk_hits=1, misses=1, entries=2
+    )
+
+
+def test_config_roundtrip(tmp_path: Any) -> None:
+    ef = CachedEmbeddingFunction(
+        CountingEmbeddingFunction(dim=4), str(tmp_path), max_entries=5
+    )
+    config = ef.get_config()
+    CachedEmbeddingFunction.validate_config(config)
+
+    rebuilt = config_to_embedding_function({"name": "cached", "config": config})
+    assert isinstance(rebuilt, CachedEmbeddingFunction)
+    assert rebuilt.get_config() == config
+    assert not rebuilt.is_legacy()
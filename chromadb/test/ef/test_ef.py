@@ -45,6 +45,7 @@ def test_get_builtins_holds() -> None:
         "Text2VecEmbeddingFunction",
         "ChromaLangchainEmbeddingFunction",
         "TogetherAIEmbeddingFunction",
+        "CachedEmbeddingFunction",
         "DefaultEmbeddingFunction",
     }
 
@@ -95,6 +95,30 @@ class TestONNXMiniLM_L6_V2:
         assert len(embeddings) == 1
         assert len(embeddings[0]) == 384
 
+    @pytest.mark.parametrize("pipeline", [False, True])
+    def test_batching_does_not_change_embeddings(self, pipeline: bool) -> None:
+        """Test that batch size, length bucketing and pipelining keep embeddings."""
+        ef = ONNXMiniLM_L6_V2()
+        docs = [
+            " ".join(["word"] * (i % 50)) + f" document {i}" for i in range(100)
+        ] + [""]
+
+        expected = [ef([doc])[0] for doc in docs[:5]]
+
+        batched = ONNXMiniLM_L6_V2(
+            batch_size=7, intra_op_num_threads=1, pipeline=pipeline
+        )
+        embeddings = batched(docs)
+        assert len(embeddings) == len(docs)
+        for embedding, single in zip(embeddings, expected):
+            np.testing.assert_allclose(embedding, single, atol=1e-5)
+
+        config = batched.get_config()
+        assert config["batch_size"] == 7
+        assert config["intra_op_num_threads"] == 1
+        assert config["pipeline"] == pipeline
+        ef.validate_config(config)
+
     def test_max_tokens(self) -> None:
         """Test the max_tokens method."""
         ef = ONNXMiniLM_L6_V2()
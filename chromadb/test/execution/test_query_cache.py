@@ -0,0 +1,76 @@
+from typing import Generator
+
+import numpy as np
+import pytest
+
+from chromadb.api.client import Client
+from chromadb.config import Settings, System
+from chromadb.execution.executor.cache import QueryResultCache
+from chromadb.execution.executor.local import LocalExecutor
+
+
+@pytest.fixture
+def system() -> Generator[System, None, None]:
+    settings = Settings(
+        chroma_api_impl="chromadb.api.segment.SegmentAPI",
+        is_persistent=False,
+        allow_reset=True,
+        chroma_query_cache_size=16,
+    )
+    system = System(settings)
+    system.start()
+    yield system
+    system.stop()
+
+
+def test_writes_invalidate_cached_results(system: System) -> None:
+    executor = system.instance(LocalExecutor)
+    client = Client.from_system(system)
+    collection = client.create_collection("test")
+    near = np.array([[0.1, 0.1]], dtype=np.float32)
+    collection.add(
+        ids=["1", "2"],
+        embeddings=np.array([[0.0, 0.0], [1.0, 1.0]], dtype=np.float32),
+        metadatas=[{"even": False}, {"even": True}],
+    )
+
+    first = collection.query(query_embeddings=near, n_results=1)
+    assert first["ids"] == [["1"]]
+    # Results handed out are copies, so changing them doesn't change the cache
+    first["ids"][0].append("changed")
+    assert collection.query(query_embeddings=near, n_results=1)["ids"] == [["1"]]
+    info = executor.cache_info()
+    assert info is not None and (info.hits, info.misses) == (1, 1)
+
+    # A different plan misses
+    collection.query(query_embeddings=near, n_results=1, where={"even": True})
+    assert collection.get(where={"even": True})["ids"] == ["2"]
+    assert collection.get(where={"even": True})["ids"] == ["2"]
+    info = executor.cache_info()
+    assert info is not None and (info.hits, info.misses) == (2, 3)
+
+    collection.add(ids=["3"], embeddings=near, metadatas=[{"even": True}])
+    assert collection.query(query_embeddings=near, n_results=1)["ids"] == [["3"]]
+    assert collection.get(where={"even": True})["ids"] == ["2", "3"]
+    info = executor.cache_info()
+    assert info is not None and (info.hits, info.misses) == (2, 5)
+    assert info.hit_rate == pytest.approx(2 / 7)
+
+
+def test_cache_bounds() -> None:
+    now = 0.0
+    cache: QueryResultCache[str] = QueryResultCache(
+        capacity=2, ttl_seconds=10, clock=lambda: now
+    )
+    cache.set(b"a", "a")
+    cache.set(b"b", "b")
+    assert cache.get(b"a") == "a"
+    cache.set(b"c", "c")
+    # "b" was the least recently used
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == "a"
+
+    now = 11.0
+    assert cache.get(b"a") is None
+    assert cache.get(b"c") is None
+    assert cache.cache_info().entries == 0
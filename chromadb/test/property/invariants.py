@@ -14,7 +14,8 @@ from chromadb.db.impl.sqlite import SqliteDB
 from time import sleep
 import psutil
 
-from chromadb.segment import SegmentType
+from chromadb.segment import SegmentManager, SegmentType
+from chromadb.segment.impl.manager.local import LocalSegmentManager
 from chromadb.test.property.strategies import NormalizedRecordSet, RecordSet
 from typing import Callable, Optional, Tuple, Union, List, TypeVar, cast, Any, Dict
 from typing_extensions import Literal
@@ -417,6 +418,14 @@ def _total_embedding_queue_log_size(sqlite: SqliteDB) -> int:
         return cast(int, result.fetchone()[0])
 
 
+def _wait_for_persist(system: System) -> None:
+    """Vector segments persist in the background, and their log is purged after"""
+    if system.settings.chroma_api_impl == "chromadb.api.segment.SegmentAPI":
+        manager = system.instance(SegmentManager)
+        if isinstance(manager, LocalSegmentManager):
+            manager.wait_for_persist()
+
+
 def log_size_below_max(
     system: System, collections: List[Collection], has_collection_mutated: bool
 ) -> None:
@@ -428,6 +437,7 @@ def log_size_below_max(
         and system.settings.chroma_api_impl == "chromadb.api.rust.RustBindingsAPI"
     ):
         return
+    _wait_for_persist(system)
 
     if has_collection_mutated:
         # Must always keep one entry to avoid reusing seq_ids
@@ -491,6 +501,7 @@ def log_size_for_collections_match_expected(
     if system.settings.chroma_api_impl == "chromadb.api.rust.RustBindingsAPI":
         # The rust impl does not use batch size
         return
+    _wait_for_persist(system)
 
     sqlite = system.instance(SqliteDB)
 
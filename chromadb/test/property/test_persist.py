@@ -13,6 +13,7 @@ from chromadb.api import ClientAPI, ServerAPI
 from chromadb.config import Settings, System
 from chromadb.segment import VectorReader
 from chromadb.segment.impl.manager.local import LocalSegmentManager
+from chromadb.types import RequestVersionContext
 import chromadb.test.property.strategies as strategies
 import chromadb.test.property.invariants as invariants
 from chromadb.test.property.strategies import hashing_embedding_function
@@ -230,6 +231,85 @@ def test_sync_threshold(settings: Settings) -> None:
     last_modified_at = get_index_last_modified_at()
 
 
+@pytest.mark.skipif(
+    "CHROMA_RUST_BINDINGS_TEST_ONLY" in os.environ,
+    reason="Lazy loading only applies to the Python segment implementation",
+)
+def test_lazy_load() -> None:
+    persist_directory = tempfile.mkdtemp()
+
+    def lazy_system() -> System:
+        return System(
+            Settings(
+                chroma_api_impl="chromadb.api.segment.SegmentAPI",
+                chroma_sysdb_impl="chromadb.db.impl.sqlite.SqliteDB",
+                chroma_producer_impl="chromadb.db.impl.sqlite.SqliteDB",
+                chroma_consumer_impl="chromadb.db.impl.sqlite.SqliteDB",
+                chroma_segment_manager_impl="chromadb.segment.impl.manager.local.LocalSegmentManager",
+                allow_reset=True,
+                is_persistent=True,
+                persist_directory=persist_directory,
+                chroma_segment_lazy_load=True,
+                chroma_segment_prefetch_count=0,
+            )
+        )
+
+    system = lazy_system()
+    system.start()
+    client = ClientCreator.from_system(system)
+    collection = client.create_collection(
+        name="test", metadata={"hnsw:batch_size": 3, "hnsw:sync_threshold": 3}
+    )
+    embeddings = [[float(i), float(i)] for i in range(6)]
+    collection.add(ids=[str(i) for i in range(6)], embeddings=embeddings)  # type: ignore[arg-type]
+    system.stop()
+
+    system = lazy_system()
+    system.start()
+    client = ClientCreator.from_system(system)
+    collection = client.get_collection("test")
+    segment = system.instance(LocalSegmentManager).get_segment(
+        collection.id, VectorReader
+    )
+
+    # Counts are answered from the header while the persisted state is current
+    assert segment.count(collection._model.version) == 6  # type: ignore[arg-type]
+    assert not segment.is_loaded  # type: ignore[attr-defined]
+    # So are id-existence checks, from the id map
+    version = RequestVersionContext(collection_version=0, log_position=0)
+    assert segment.has_ids(version, ["0", "5", "6"]) == [True, True, False]
+    assert not segment.is_loaded  # type: ignore[attr-defined]
+
+    # The first query loads the index
+    result = collection.query(
+        query_embeddings=np.array([[5.0, 5.0]], dtype=np.float32), n_results=2
+    )
+    assert segment.is_loaded  # type: ignore[attr-defined]
+    assert result["ids"] == [["5", "4"]]
+
+    # This record stays in the log only, below the sync threshold
+    collection.add(ids=["6"], embeddings=np.array([[6.0, 6.0]], dtype=np.float32))
+    system.stop()
+
+    system = lazy_system()
+    system.start()
+    client = ClientCreator.from_system(system)
+    collection = client.get_collection("test")
+    segment = system.instance(LocalSegmentManager).get_segment(
+        collection.id, VectorReader
+    )
+
+    # The header is stale, so checking ids loads the segment and replays the log
+    assert segment.has_ids(version, ["5", "6"]) == [True, True]
+    assert segment.is_loaded  # type: ignore[attr-defined]
+    assert segment.count(collection._model.version) == 7  # type: ignore[arg-type]
+    result = collection.query(
+        query_embeddings=np.array([[6.0, 6.0]], dtype=np.float32), n_results=2
+    )
+    assert result["ids"] == [["6", "5"]]
+    system.stop()
+
+
 def load_and_check(
     settings: Settings,
     collection_name: str,
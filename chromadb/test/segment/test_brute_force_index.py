@@ -0,0 +1,114 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pytest
+
+from chromadb.segment.impl.vector.brute_force_index import BruteForceIndex
+from chromadb.types import (
+    LogRecord,
+    Operation,
+    OperationRecord,
+    RequestVersionContext,
+    VectorQuery,
+)
+from chromadb.utils import distance_functions
+
+
+def _record(id: str, embedding: Optional[List[float]], offset: int) -> LogRecord:
+    return LogRecord(
+        log_offset=offset,
+        record=OperationRecord(
+            id=id,
+            embedding=np.array(embedding, dtype=np.float32)
+            if embedding is not None
+            else None,
+            encoding=None,
+            metadata=None,
+            operation=Operation.UPSERT,
+        ),
+    )
+
+
+def _query(
+    vectors: np.ndarray, k: int, allowed_ids: Optional[Sequence[str]] = None
+) -> VectorQuery:
+    return VectorQuery(
+        vectors=list(vectors),
+        k=k,
+        allowed_ids=allowed_ids,
+        include_embeddings=True,
+        options=None,
+        request_version_context=RequestVersionContext(
+            collection_version=0, log_position=0
+        ),
+    )
+
+
+@pytest.mark.parametrize("space", ["l2", "ip", "cosine"])
+def test_query_matches_reference_distances(space: str) -> None:
+    rng = np.random.default_rng(42)
+    dim = 8
+    vectors = rng.random((20, dim), dtype=np.float32)
+    index = BruteForceIndex(size=32, dimensionality=dim, space=space)
+    index.upsert([_record(str(i), v.tolist(), i) for i, v in enumerate(vectors)])
+    index.delete([_record("3", None, 100)])
+
+    queries = rng.random((4, dim), dtype=np.float32)
+    results = index.query(_query(queries, k=5))
+
+    distance_fn = getattr(distance_functions, space)
+    for query, result in zip(queries, results):
+        expected = sorted(
+            (distance_fn(vectors[i], query), str(i)) for i in range(20) if i != 3
+        )[:5]
+        assert [r["id"] for r in result] == [id for _, id in expected]
+        assert np.allclose(
+            [r["distance"] for r in result], [d for d, _ in expected], atol=1e-5
+        )
+        for r in result:
+            assert r["embedding"] is not None
+            assert np.allclose(r["embedding"], vectors[int(r["id"])])
+
+
+def test_query_respects_allowed_ids_and_k() -> None:
+    index = BruteForceIndex(size=10, dimensionality=2)
+    index.upsert([_record(str(i), [float(i), 0.0], i) for i in range(5)])
+
+    results = index.query(_query(np.array([[0.0, 0.0]]), k=10, allowed_ids=["4", "2"]))
+    assert [r["id"] for r in results[0]] == ["2", "4"]
+
+    results = index.query(_query(np.array([[0.0, 0.0]]), k=2))
+    assert [r["id"] for r in results[0]] == ["0", "1"]
+
+    results = index.query(_query(np.array([[0.0, 0.0]]), k=2, allowed_ids=["x"]))
+    assert results == [[]]
+
+
+def test_batched_upsert_and_delete_reuse_slots() -> None:
+    index = BruteForceIndex(size=3, dimensionality=2)
+    assert index.vectors.dtype == np.float32
+
+    # Duplicate ids within a batch resolve to the last write
+    index.upsert(
+        [_record("a", [1.0, 0.0], 1), _record("b", [2.0, 0.0], 2)]
+        + [_record("a", [3.0, 0.0], 3)]
+    )
+    assert len(index) == 2
+    assert np.allclose(index.get_vectors(["a"])[0]["embedding"], [3.0, 0.0])
+
+    index.delete([_record("a", None, 4), _record("missing", None, 5)])
+    assert not index.has_id("a")
+    assert index.live.sum() == 1
+
+    # The freed slot is reused, so the index can hold a full batch again
+    index.upsert([_record("c", [0.0, 1.0], 6), _record("d", [0.0, 2.0], 7)])
+    assert sorted(index.id_to_index) == ["b", "c", "d"]
+    results = index.query(_query(np.array([[0.0, 0.0]]), k=3))
+    assert [r["id"] for r in results[0]] == ["c", "b", "d"]
+
+    with pytest.raises(Exception):
+        index.upsert([_record("e", [1.0, 1.0], 8)])
+
+    index.clear()
+    assert len(index) == 0
+    assert index.query(_query(np.array([[0.0, 0.0]]), k=3)) == [[]]
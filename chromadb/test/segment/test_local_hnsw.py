@@ -0,0 +1,711 @@
+import os
+import tempfile
+import threading
+import uuid
+from typing import Any, Generator, cast
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from chromadb.api.client import Client
+from chromadb.config import Settings, System
+from chromadb.db.impl.sqlite import SqliteDB
+from chromadb.segment import VectorReader
+from chromadb.segment.impl.manager.local import LocalSegmentManager
+from chromadb.segment.impl.vector.local_hnsw import LocalHnswSegment
+from chromadb.segment.impl.vector.local_persistent_hnsw import (
+    HnswCompactionInfo,
+    PersistentData,
+    PersistentLocalHnswSegment,
+)
+from chromadb.segment.impl.vector import persistent_id_map
+from chromadb.test.conftest import sqlite_fixture, sqlite_persistent_fixture
+from chromadb.types import RequestVersionContext
+
+
+@pytest.fixture
+def system() -> Generator[System, None, None]:
+    yield from sqlite_fixture()
+
+
+@pytest.fixture
+def persistent_system() -> Generator[System, None, None]:
+    yield from sqlite_persistent_fixture()
+
+
+@pytest.mark.parametrize("space", ["l2", "ip", "cosine"])
+@pytest.mark.parametrize("brute_force_threshold", [0, 2048])
+def test_filtered_query_is_exact(
+    system: System,
+    space: str,
+    brute_force_threshold: int,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(
+        LocalHnswSegment, "FILTERED_BRUTE_FORCE_THRESHOLD", brute_force_threshold
+    )
+    client = Client.from_system(system)
+    collection = client.create_collection("test", metadata={"hnsw:space": space})
+
+    rng = np.random.default_rng(0)
+    n, dim = 500, 8
+    embeddings = rng.random((n, dim), dtype=np.float32)
+    collection.add(
+        ids=[str(i) for i in range(n)],
+        embeddings=embeddings,
+        metadatas=[{"even": i % 2 == 0} for i in range(n)],
+    )
+    collection.delete(ids=["0", "2"])
+
+    query = rng.random((3, dim), dtype=np.float32)
+    result = collection.query(
+        query_embeddings=query,
+        n_results=10,
+        where={"even": True},
+        include=["embeddings", "distances"],
+    )
+
+    allowed = np.arange(4, n, 2)
+    candidates = embeddings[allowed]
+    if space == "l2":
+        expected = ((candidates[None, :, :] - query[:, None, :]) ** 2).sum(axis=2)
+    elif space == "cosine":
+        normalized = query / np.linalg.norm(query, axis=1, keepdims=True)
+        expected = (
+            1
+            - normalized
+            @ (candidates / np.linalg.norm(candidates, axis=1, keepdims=True)).T
+        )
+    else:
+        expected = 1 - query @ candidates.T
+    assert result["distances"] is not None
+    assert result["embeddings"] is not None
+    for i in range(len(query)):
+        if brute_force_threshold == 0:
+            # The filtered graph search is approximate, but only returns allowed ids
+            assert len(result["ids"][i]) == 10
+            assert all(int(id) in allowed for id in result["ids"][i])
+            continue
+        top = np.argsort(expected[i])[:10]
+        assert result["ids"][i] == [str(label) for label in allowed[top]]
+        assert np.allclose(result["distances"][i], expected[i][top], atol=1e-5)
+        assert np.allclose(result["embeddings"][i], candidates[top])
+
+    # A filter that matches nothing returns no results
+    empty = collection.query(
+        query_embeddings=query, n_results=10, where={"even": "neither"}
+    )
+    assert empty["ids"] == [[], [], []]
+
+
+def test_filtered_l2_distances_are_recomputed(
+    system: System, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(LocalHnswSegment, "FILTERED_BRUTE_FORCE_THRESHOLD", 2048)
+    collection = Client.from_system(system).create_collection("test")
+    # Large components make the expanded l2 kernel lose precision to cancellation
+    embeddings = np.random.default_rng(0).random((100, 64), dtype=np.float32) * 1000
+    collection.add(
+        ids=[str(i) for i in range(100)],
+        embeddings=embeddings,
+        metadatas=[{"even": i % 2 == 0} for i in range(100)],
+    )
+    result = collection.query(
+        query_embeddings=embeddings[[4, 10]],
+        n_results=3,
+        where={"even": True},
+        include=["distances"],
+    )
+    assert [ids[0] for ids in result["ids"]] == ["4", "10"]
+    assert result["distances"] is not None
+    assert [distances[0] for distances in result["distances"]] == [0.0, 0.0]
+
+
+def test_get_vectors_from_both_indexes(persistent_system: System) -> None:
+    client = Client.from_system(persistent_system)
+    collection = client.create_collection("test", metadata={"hnsw:batch_size": 10})
+    rng = np.random.default_rng(0)
+    embeddings = rng.random((25, 4), dtype=np.float32)
+    # The first two batches are indexed into HNSW, the last five stay brute force
+    collection.add(ids=[str(i) for i in range(25)], embeddings=embeddings)
+    collection.delete(ids=["1"])
+    embeddings[2] = rng.random(4, dtype=np.float32)
+    collection.update(ids=["2"], embeddings=embeddings[2:3])
+
+    segment = persistent_system.instance(LocalSegmentManager).get_segment(
+        collection.id, VectorReader
+    )
+    version = RequestVersionContext(collection_version=0, log_position=0)
+    ids, vectors = segment.get_vector_matrix(
+        version, ["22", "missing", "0", "1", "2", "15"]
+    )
+    assert ids == ["22", "0", "2", "15"]
+    assert vectors.dtype == np.float32
+    assert np.array_equal(vectors, embeddings[[22, 0, 2, 15]])
+    ids, vectors = segment.get_vector_matrix(version, ["1", "missing"])
+    assert ids == [] and vectors.shape == (0, 4)
+
+    records = segment.get_vectors(version, ["1", "3", "24"])
+    assert [r["id"] for r in records] == ["3", "24"]
+    assert np.array_equal([r["embedding"] for r in records], embeddings[[3, 24]])
+
+    ids, vectors = segment.get_vector_matrix(version)
+    assert sorted(ids, key=int) == [str(i) for i in range(25) if i != 1]
+    assert np.array_equal(vectors, embeddings[[int(id) for id in ids]])
+
+    assert segment.get_vector_matrix(version, [])[0] == []
+
+
+class _CountingIndex:
+    """Forwards to an hnswlib index, counting get_items calls"""
+
+    def __init__(self, index: Any) -> None:
+        self.index = index
+        self.get_items_calls = 0
+
+    def get_items(self, labels: Any) -> Any:
+        self.get_items_calls += 1
+        return self.index.get_items(labels)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.index, name)
+
+
+def test_query_fetches_embeddings_in_one_call(system: System) -> None:
+    client = Client.from_system(system)
+    collection = client.create_collection("test")
+    rng = np.random.default_rng(0)
+    embeddings = rng.random((200, 8), dtype=np.float32)
+    collection.add(ids=[str(i) for i in range(200)], embeddings=embeddings)
+
+    segment = system.instance(LocalSegmentManager).get_segment(
+        collection.id, VectorReader
+    )
+    assert isinstance(segment, LocalHnswSegment)
+    index = _CountingIndex(segment._index)
+    segment._index = index
+
+    result = collection.query(
+        query_embeddings=rng.random((20, 8), dtype=np.float32),
+        n_results=10,
+        include=["embeddings", "distances"],
+    )
+    assert index.get_items_calls == 1
+    assert result["embeddings"] is not None
+    for ids, found in zip(result["ids"], result["embeddings"]):
+        assert np.array_equal(np.asarray(found), embeddings[[int(id) for id in ids]])
+
+    collection.query(query_embeddings=embeddings[:3], n_results=10)
+    assert index.get_items_calls == 1
+
+
+def test_query_merges_both_indexes(persistent_system: System) -> None:
+    client = Client.from_system(persistent_system)
+    collection = client.create_collection("test", metadata={"hnsw:batch_size": 10})
+    rng = np.random.default_rng(0)
+    embeddings = rng.random((25, 4), dtype=np.float32)
+    collection.add(
+        ids=[str(i) for i in range(25)],
+        embeddings=embeddings,
+        metadatas=[{"group": i % 10} for i in range(25)],
+    )
+    # Hide some of the HNSW results behind deletes and updates in the current batch
+    collection.delete(ids=["0", "7"])
+    embeddings[[3, 12]] = rng.random((2, 4), dtype=np.float32)
+    collection.update(ids=["3", "12"], embeddings=embeddings[[3, 12]])
+
+    live = np.array([i for i in range(25) if i not in (0, 7)])
+    query = np.concatenate([embeddings[[3, 12, 20]], rng.random((2, 4))]).astype(
+        np.float32
+    )
+    result = collection.query(
+        query_embeddings=query,
+        n_results=8,
+        include=["embeddings", "distances"],
+    )
+    assert result["distances"] is not None
+    assert result["embeddings"] is not None
+    expected = ((embeddings[live][None, :, :] - query[:, None, :]) ** 2).sum(axis=2)
+    for i in range(len(query)):
+        top = live[np.argsort(expected[i])[:8]]
+        assert result["ids"][i] == [str(label) for label in top]
+        assert np.allclose(result["distances"][i], np.sort(expected[i])[:8])
+        assert np.array_equal(result["embeddings"][i], embeddings[top])
+
+    # Filters that leave fewer than k results return only those
+    result = collection.query(
+        query_embeddings=query[:1], n_results=8, where={"group": 3}
+    )
+    assert sorted(result["ids"][0]) == ["13", "23", "3"]
+
+
+def _committed_max_seq_id(system: System, segment: PersistentLocalHnswSegment) -> int:
+    db = system.instance(SqliteDB)
+    with db.tx() as cur:
+        cur.execute(
+            "SELECT seq_id FROM max_seq_id WHERE segment_id = ?",
+            (db.uuid_to_db(segment._id),),
+        )
+        return cast(int, cur.fetchone()[0])
+
+
+def test_interrupted_persist_is_replayed_from_the_log(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        settings = Settings(
+            chroma_api_impl="chromadb.api.segment.SegmentAPI",
+            is_persistent=True,
+            persist_directory=persist_directory,
+        )
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).create_collection(
+            "test", metadata={"hnsw:batch_size": 10, "hnsw:sync_threshold": 10}
+        )
+        embeddings = np.random.default_rng(0).random((40, 4), dtype=np.float32)
+        collection.add(ids=[str(i) for i in range(20)], embeddings=embeddings[:20])
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        assert isinstance(segment, PersistentLocalHnswSegment)
+        segment.wait_for_persist()
+        persisted = _committed_max_seq_id(system, segment)
+        assert persisted == segment.max_seqid()
+        folder = os.path.join(persist_directory, str(segment._id))
+        paths = [
+            os.path.join(folder, f"id_map.0.{kind}") for kind in ["strings", "records"]
+        ]
+        committed_sizes = [os.path.getsize(path) for path in paths]
+
+        # The process dies halfway through appending the records to the id map: the
+        # strings and part of a record are left past the committed lengths, and
+        # nothing written after that reaches the disk
+        def torn_append(path: str, data: bytes) -> None:
+            with open(path, "ab") as f:
+                if path.endswith(".records"):
+                    f.write(data[: len(data) // 2 + 1])
+                    raise OSError("killed")
+                f.write(data)
+
+        def lost_write(path: str, data: bytes) -> None:
+            raise OSError("killed")
+
+        monkeypatch.setattr(persistent_id_map, "_append", torn_append)
+        monkeypatch.setattr(persistent_id_map, "_write_durably", lost_write)
+        collection.add(ids=[str(i) for i in range(20, 40)], embeddings=embeddings[20:])
+        segment.wait_for_persist()
+        assert _committed_max_seq_id(system, segment) == persisted
+        assert segment.max_seqid() > persisted
+        system.stop()
+        monkeypatch.undo()
+        for path, committed_size in zip(paths, committed_sizes):
+            assert os.path.getsize(path) > committed_size
+
+        # The torn tail is discarded, and the records since are replayed on the
+        # next load
+        system = System(settings)
+        system.start()
+        _assert_vectors(system, collection.id, embeddings)
+        system.stop()
+
+        # Once replayed, the writes are persisted again and survive a reopen
+        system = System(settings)
+        system.start()
+        _assert_vectors(system, collection.id, embeddings)
+        system.stop()
+
+
+def test_deletes_flushed_ahead_of_the_id_map_are_replayed() -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        settings = Settings(
+            chroma_api_impl="chromadb.api.segment.SegmentAPI",
+            is_persistent=True,
+            persist_directory=persist_directory,
+        )
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).create_collection(
+            "test", metadata={"hnsw:batch_size": 10, "hnsw:sync_threshold": 20}
+        )
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        assert isinstance(segment, PersistentLocalHnswSegment)
+
+        # The persist runs after the deletes are applied, so the index it flushes
+        # holds tombstones of labels that the id map it writes still maps
+        release = threading.Event()
+        persist = segment._persist
+
+        def delayed_persist(*args: Any) -> bool:
+            release.wait()
+            return persist(*args)
+
+        segment._persist = delayed_persist  # type: ignore[method-assign, assignment]
+        embeddings = np.random.default_rng(0).random((20, 4), dtype=np.float32)
+        collection.add(ids=[str(i) for i in range(20)], embeddings=embeddings)
+        collection.delete(ids=[str(i) for i in range(10)])
+        release.set()
+        segment.wait_for_persist()
+        system.stop()
+
+        # The deletes since the persisted max_seq_id are replayed on the next load,
+        # against labels that are deleted already
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).get_collection("test")
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        version = RequestVersionContext(collection_version=0, log_position=0)
+        ids, vectors = segment.get_vector_matrix(version)
+        assert sorted(ids, key=int) == [str(i) for i in range(10, 20)]
+        assert np.array_equal(vectors, embeddings[[int(id) for id in ids]])
+        result = collection.query(query_embeddings=embeddings[15:16], n_results=3)
+        assert result["ids"][0][0] == "15"
+        system.stop()
+
+
+def _assert_vectors(
+    system: System, collection_id: uuid.UUID, embeddings: npt.NDArray[np.float32]
+) -> None:
+    segment = system.instance(LocalSegmentManager).get_segment(
+        collection_id, VectorReader
+    )
+    version = RequestVersionContext(collection_version=0, log_position=0)
+    ids, vectors = segment.get_vector_matrix(version)
+    assert sorted(ids, key=int) == [str(i) for i in range(len(embeddings))]
+    assert np.array_equal(vectors, embeddings[[int(id) for id in ids]])
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_legacy_metadata_matches_the_id_map(compact: bool) -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        settings = Settings(
+            chroma_api_impl="chromadb.api.segment.SegmentAPI",
+            is_persistent=True,
+            persist_directory=persist_directory,
+            chroma_hnsw_legacy_metadata=True,
+        )
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).create_collection(
+            "test", metadata={"hnsw:batch_size": 10, "hnsw:sync_threshold": 10}
+        )
+        embeddings = np.random.default_rng(0).random((30, 4), dtype=np.float32)
+        collection.add(ids=[str(i) for i in range(30)], embeddings=embeddings)
+        collection.delete(ids=[str(i) for i in range(10)])
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        assert isinstance(segment, PersistentLocalHnswSegment)
+        if compact:
+            assert segment.compact().result()
+        segment.wait_for_persist()
+        # The id map is as recent as the committed max_seq_id, so the pickle isn't
+        # migrated again
+        assert not segment._legacy_metadata_needs_migration(
+            _committed_max_seq_id(system, segment)
+        )
+        system.stop()
+
+        # Readers of the legacy pickle, such as the Rust local segment, see the same
+        # mappings as the id map
+        folder = os.path.join(persist_directory, str(segment._id))
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).get_collection("test")
+        assert collection.count() == 20
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        assert isinstance(segment, PersistentLocalHnswSegment)
+        data = PersistentData.load_from_file(
+            os.path.join(folder, PersistentLocalHnswSegment.LEGACY_METADATA_FILE)
+        )
+        assert sorted(data.id_to_label) == [str(i) for i in range(10, 30)]
+        assert data.id_to_label == segment._id_to_label
+        assert data.label_to_id == segment._label_to_id
+        assert data.id_to_seq_id == segment._id_to_seq_id
+        assert data.total_elements_added == segment._total_elements_added
+        assert data.dimensionality == 4
+        system.stop()
+
+
+def test_legacy_metadata_is_migrated_again_once_an_older_version_wrote_it() -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        settings = Settings(
+            chroma_api_impl="chromadb.api.segment.SegmentAPI",
+            is_persistent=True,
+            persist_directory=persist_directory,
+            chroma_hnsw_legacy_metadata=True,
+        )
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).create_collection(
+            "test", metadata={"hnsw:batch_size": 10, "hnsw:sync_threshold": 10}
+        )
+        embeddings = np.random.default_rng(0).random((20, 4), dtype=np.float32)
+        collection.add(ids=[str(i) for i in range(10)], embeddings=embeddings[:10])
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        assert isinstance(segment, PersistentLocalHnswSegment)
+        segment.wait_for_persist()
+        system.stop()
+
+        # Without the legacy writer the pickle goes stale. It is newer than the id
+        # map after a copy or restore, but isn't migrated again.
+        settings = Settings(**{**settings.dict(), "chroma_hnsw_legacy_metadata": False})
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).get_collection("test")
+        collection.add(ids=[str(i) for i in range(10, 20)], embeddings=embeddings[10:])
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        assert isinstance(segment, PersistentLocalHnswSegment)
+        segment.wait_for_persist()
+        system.stop()
+        pickle_file = segment._get_legacy_metadata_file()
+        future = os.path.getmtime(segment._get_metadata_file()) + 60
+        os.utime(pickle_file, (future, future))
+
+        system = System(settings)
+        system.start()
+        _assert_vectors(system, collection.id, embeddings)
+
+        # An older version only writes the pickle, and commits a max_seq_id past
+        # the id map's
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        assert isinstance(segment, PersistentLocalHnswSegment)
+        data = PersistentData.load_from_file(pickle_file)
+        for id in [str(i) for i in range(10, 20)]:
+            data.id_to_label[id] = segment._id_to_label[id]
+            data.label_to_id[segment._id_to_label[id]] = id
+            data.id_to_seq_id[id] = segment._id_to_seq_id[id]
+        for id in [str(i) for i in range(5)]:
+            del data.label_to_id[data.id_to_label.pop(id)]
+            del data.id_to_seq_id[id]
+        data.total_elements_added = segment._total_elements_added
+        data.store_to_file(pickle_file)
+        db = system.instance(SqliteDB)
+        with db.tx() as cur:
+            cur.execute(
+                "UPDATE max_seq_id SET seq_id = seq_id + 1 WHERE segment_id = ?",
+                (db.uuid_to_db(segment._id),),
+            )
+        system.stop()
+
+        system = System(settings)
+        system.start()
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        version = RequestVersionContext(collection_version=0, log_position=0)
+        ids, vectors = segment.get_vector_matrix(version)
+        assert sorted(ids, key=int) == [str(i) for i in range(5, 20)]
+        assert np.array_equal(vectors, embeddings[[int(id) for id in ids]])
+        system.stop()
+
+
+def _compaction_settings(persist_directory: str, threshold: float = 0) -> Settings:
+    return Settings(
+        chroma_api_impl="chromadb.api.segment.SegmentAPI",
+        is_persistent=True,
+        persist_directory=persist_directory,
+        chroma_hnsw_compaction_threshold=threshold,
+        chroma_hnsw_compaction_min_tombstones=10,
+    )
+
+
+def test_compaction_drops_deleted_elements(monkeypatch: pytest.MonkeyPatch) -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        settings = _compaction_settings(persist_directory)
+        system = System(settings)
+        system.start()
+        manager = system.instance(LocalSegmentManager)
+        collection = Client.from_system(system).create_collection(
+            "test", metadata={"hnsw:batch_size": 10, "hnsw:sync_threshold": 10}
+        )
+        rng = np.random.default_rng(0)
+        embeddings = rng.random((220, 4), dtype=np.float32)
+        collection.add(ids=[str(i) for i in range(200)], embeddings=embeddings[:200])
+        collection.delete(ids=[str(i) for i in range(50, 200)])
+        assert manager.compaction_info(collection.id) == HnswCompactionInfo(
+            elements=200, tombstones=150
+        )
+        assert not manager.compact_collection(collection.id, threshold=0.8)
+
+        # Writes applied while the compacted index is built are caught up on
+        expected = {str(i): embeddings[i] for i in range(50)}
+        original = PersistentLocalHnswSegment._swap_compacted_index
+
+        def write_then_swap(self: PersistentLocalHnswSegment, *args: Any) -> None:
+            collection.upsert(ids=["0"], embeddings=embeddings[[200]])
+            collection.delete(ids=["1"])
+            collection.add(
+                ids=[str(i) for i in range(201, 209)], embeddings=embeddings[201:209]
+            )
+            original(self, *args)
+
+        monkeypatch.setattr(
+            PersistentLocalHnswSegment, "_swap_compacted_index", write_then_swap
+        )
+        expected["0"] = embeddings[200]
+        del expected["1"]
+        expected.update({str(i): embeddings[i] for i in range(201, 209)})
+
+        assert manager.compact_collection(collection.id, threshold=0.5)
+        monkeypatch.undo()
+        assert manager.compaction_info(collection.id) == HnswCompactionInfo(
+            elements=58, tombstones=1
+        )
+        segment = manager.get_segment(collection.id, VectorReader)
+        assert isinstance(segment, PersistentLocalHnswSegment)
+        folder = os.path.join(persist_directory, str(segment._id))
+        assert not os.path.exists(folder + ".compact")
+        assert not os.path.exists(folder + ".old")
+
+        def check() -> None:
+            assert collection.count() == len(expected)
+            ids = sorted(expected)
+            result = collection.get(ids=ids, include=["embeddings"])
+            assert sorted(result["ids"]) == ids
+            assert result["embeddings"] is not None
+            for id, embedding in zip(result["ids"], result["embeddings"]):
+                assert np.array_equal(embedding, expected[id])
+            nearest = collection.query(query_embeddings=embeddings[[200]], n_results=1)
+            assert nearest["ids"] == [["0"]]
+
+        check()
+        # The compacted index keeps taking writes, and survives a restart
+        collection.add(ids=["209"], embeddings=embeddings[[209]])
+        expected["209"] = embeddings[209]
+        check()
+        system.stop()
+
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).get_collection("test")
+        check()
+        system.stop()
+
+
+def test_compaction_is_automatic_past_the_threshold() -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        system = System(_compaction_settings(persist_directory, threshold=0.5))
+        system.start()
+        collection = Client.from_system(system).create_collection(
+            "test", metadata={"hnsw:batch_size": 10, "hnsw:sync_threshold": 10}
+        )
+        embeddings = np.random.default_rng(0).random((40, 4), dtype=np.float32)
+        collection.add(ids=[str(i) for i in range(40)], embeddings=embeddings)
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        assert isinstance(segment, PersistentLocalHnswSegment)
+
+        collection.delete(ids=[str(i) for i in range(10)])
+        segment.wait_for_persist()
+        assert segment.compaction_info() == HnswCompactionInfo(40, 10)
+
+        collection.delete(ids=[str(i) for i in range(10, 20)])
+        segment.wait_for_persist()
+        assert segment.compaction_info() == HnswCompactionInfo(20, 0)
+        result = collection.get(include=["embeddings"])
+        assert sorted(result["ids"]) == sorted(str(i) for i in range(20, 40))
+        system.stop()
+
+
+def test_closing_the_index_cancels_its_compaction(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        system = System(_compaction_settings(persist_directory))
+        system.start()
+        collection = Client.from_system(system).create_collection(
+            "test", metadata={"hnsw:batch_size": 10, "hnsw:sync_threshold": 10}
+        )
+        embeddings = np.random.default_rng(0).random((40, 4), dtype=np.float32)
+        collection.add(ids=[str(i) for i in range(40)], embeddings=embeddings)
+        collection.delete(ids=[str(i) for i in range(10)])
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        assert isinstance(segment, PersistentLocalHnswSegment)
+        segment.wait_for_persist()
+
+        # The compaction reads the live vectors, then is held up until the index
+        # is closed
+        started = threading.Event()
+        original = PersistentLocalHnswSegment._get_items
+
+        def held_up(self: PersistentLocalHnswSegment, labels: Any) -> Any:
+            started.set()
+            self._compaction_cancelled.wait(timeout=10)
+            return original(self, labels)
+
+        monkeypatch.setattr(PersistentLocalHnswSegment, "_get_items", held_up)
+        compaction = segment.compact()
+        assert started.wait(timeout=10)
+        segment.close_persistent_index()
+        assert compaction.done() and not compaction.result()
+        monkeypatch.undo()
+
+        folder = os.path.join(persist_directory, str(segment._id))
+        assert not os.path.exists(folder + ".compact")
+        segment.open_persistent_index()
+        assert segment.compaction_info() == HnswCompactionInfo(40, 10)
+        # A cancelled compaction can be run again
+        assert segment.compact().result()
+        assert segment.compaction_info() == HnswCompactionInfo(30, 0)
+        version = RequestVersionContext(collection_version=0, log_position=0)
+        ids, vectors = segment.get_vector_matrix(version)
+        assert sorted(ids, key=int) == [str(i) for i in range(10, 40)]
+        assert np.array_equal(vectors, embeddings[[int(id) for id in ids]])
+        system.stop()
+
+
+@pytest.mark.parametrize("swapped", [True, False])
+def test_interrupted_compaction_is_recovered(swapped: bool) -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        settings = _compaction_settings(persist_directory)
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).create_collection(
+            "test", metadata={"hnsw:batch_size": 10, "hnsw:sync_threshold": 10}
+        )
+        embeddings = np.random.default_rng(0).random((20, 4), dtype=np.float32)
+        collection.add(ids=[str(i) for i in range(20)], embeddings=embeddings)
+        segment = system.instance(LocalSegmentManager).get_segment(
+            collection.id, VectorReader
+        )
+        assert isinstance(segment, PersistentLocalHnswSegment)
+        folder = os.path.join(persist_directory, str(segment._id))
+        system.stop()
+
+        # A crash while swapping leaves the old directory aside, with or without
+        # the compacted one moved into place, and maybe a partial compacted index
+        os.rename(folder, folder + ".old")
+        if swapped:
+            os.makedirs(folder)
+            for name in os.listdir(folder + ".old"):
+                os.link(os.path.join(folder + ".old", name), os.path.join(folder, name))
+        os.makedirs(folder + ".compact")
+
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).get_collection("test")
+        assert collection.count() == 20
+        result = collection.get(ids=["3"], include=["embeddings"])
+        assert result["embeddings"] is not None
+        assert np.array_equal(result["embeddings"], embeddings[[3]])
+        assert os.path.isdir(folder)
+        assert not os.path.exists(folder + ".old")
+        assert not os.path.exists(folder + ".compact")
+        system.stop()
@@ -0,0 +1,182 @@
+import os
+import tempfile
+from typing import Any, Dict
+
+import pytest
+
+from chromadb.segment.impl.vector import persistent_id_map
+from chromadb.segment.impl.vector.persistent_id_map import (
+    RECORD_DTYPE,
+    IdMapWrite,
+    PersistentIdMap,
+)
+
+
+def _flush(id_map: PersistentIdMap, id_to_label: Dict[str, int]) -> None:
+    id_map.flush(
+        dimensionality=3,
+        total_elements_added=max(id_to_label.values(), default=0),
+        id_to_label=id_to_label,
+        id_to_seq_id={id: label * 10 for id, label in id_to_label.items()},
+    )
+
+
+def test_flush_appends_and_load_replays() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        id_map = PersistentIdMap(directory)
+        assert not id_map.exists()
+
+        id_map.record_set(1, "a", 10)
+        id_map.record_set(2, "b", 20)
+        id_map.record_set(3, "ü", 30)
+        _flush(id_map, {"a": 1, "b": 2, "ü": 3})
+
+        id_map.record_delete(2)
+        id_map.record_set(1, "a", 11)
+        id_map.record_set(4, "d", 40)
+        _flush(id_map, {"a": 1, "ü": 3, "d": 4})
+
+        # Updating an existing label does not append its id to the string table again
+        strings_path = os.path.join(directory, "id_map.0.strings")
+        assert os.path.getsize(strings_path) == len("abüd".encode("utf-8"))
+
+        state = PersistentIdMap(directory).load()
+        assert state.dimensionality == 3
+        assert state.total_elements_added == 4
+        assert state.id_to_label == {"a": 1, "ü": 3, "d": 4}
+        assert state.label_to_id == {1: "a", 3: "ü", 4: "d"}
+        assert state.id_to_seq_id == {"a": 11, "ü": 30, "d": 40}
+
+
+def test_uncommitted_tail_is_discarded() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        id_map = PersistentIdMap(directory)
+        id_map.record_set(1, "a", 10)
+        _flush(id_map, {"a": 1})
+
+        # Simulate a crash between appending records and committing the header
+        records_path = os.path.join(directory, "id_map.0.records")
+        with open(records_path, "ab") as f:
+            f.write(b"\x01" * (RECORD_DTYPE.itemsize + 5))
+
+        reopened = PersistentIdMap(directory)
+        assert reopened.load().id_to_label == {"a": 1}
+        assert os.path.getsize(records_path) == RECORD_DTYPE.itemsize
+
+        reopened.record_set(2, "b", 20)
+        _flush(reopened, {"a": 1, "b": 2})
+        assert PersistentIdMap(directory).load().id_to_label == {"a": 1, "b": 2}
+
+
+def test_read_ids_is_read_once_per_write(monkeypatch: pytest.MonkeyPatch) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        id_map = PersistentIdMap(directory)
+        id_map.record_set(1, "a", 10)
+        id_map.record_set(2, "b", 20)
+        _flush(id_map, {"a": 1, "b": 2})
+
+        reads = 0
+        read_live = id_map._read_live
+
+        def counting_read_live(*args: Any) -> Any:
+            nonlocal reads
+            reads += 1
+            return read_live(*args)
+
+        monkeypatch.setattr(id_map, "_read_live", counting_read_live)
+        assert id_map.read_ids() == {"a", "b"}
+        assert id_map.read_ids() == {"a", "b"}
+        assert reads == 1
+
+        id_map.record_delete(1)
+        _flush(id_map, {"b": 2})
+        assert id_map.read_ids() == {"b"}
+        assert reads == 2
+
+
+def test_log_is_compacted_into_a_new_generation(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(persistent_id_map, "COMPACTION_MIN_RECORDS", 4)
+    with tempfile.TemporaryDirectory() as directory:
+        id_map = PersistentIdMap(directory)
+        for label in range(1, 9):
+            id_map.record_set(label, str(label), label)
+        _flush(id_map, {str(label): label for label in range(1, 9)})
+        for label in range(1, 8):
+            id_map.record_delete(label)
+        live = {"8": 8}
+        _flush(id_map, live)
+
+        assert not os.path.exists(os.path.join(directory, "id_map.0.records"))
+        assert (
+            os.path.getsize(os.path.join(directory, "id_map.1.records"))
+            == RECORD_DTYPE.itemsize
+        )
+        assert PersistentIdMap(directory).load().id_to_label == live
+
+
+def _prepare(id_map: PersistentIdMap, id_to_label: Dict[str, int]) -> IdMapWrite:
+    return id_map.prepare_flush(
+        dimensionality=3,
+        total_elements_added=max(id_to_label.values(), default=0),
+        id_to_label=id_to_label,
+        id_to_seq_id={id: label * 10 for id, label in id_to_label.items()},
+    )
+
+
+def test_prepared_writes_commit_in_order() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        id_map = PersistentIdMap(directory)
+        id_map.record_set(1, "a", 10)
+        first = _prepare(id_map, {"a": 1})
+        id_map.record_set(2, "b", 20)
+        id_map.record_delete(1)
+        second = _prepare(id_map, {"b": 2})
+
+        # Nothing is committed until a prepared write is written
+        assert not PersistentIdMap(directory).exists()
+        id_map.write(first)
+        assert PersistentIdMap(directory).load().id_to_label == {"a": 1}
+        id_map.write(second)
+        assert PersistentIdMap(directory).load().id_to_label == {"b": 2}
+
+
+def test_failed_write_is_recovered_by_a_snapshot(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        id_map = PersistentIdMap(directory)
+        id_map.record_set(1, "a", 10)
+        _flush(id_map, {"a": 1})
+
+        id_map.record_set(2, "b", 20)
+        failing = _prepare(id_map, {"a": 1, "b": 2})
+        id_map.record_set(3, "c", 30)
+        queued = _prepare(id_map, {"a": 1, "b": 2, "c": 3})
+
+        def fail(path: str, data: bytes) -> None:
+            raise OSError("disk full")
+
+        with monkeypatch.context() as m:
+            m.setattr(persistent_id_map, "_append", fail)
+            with pytest.raises(OSError):
+                id_map.write(failing)
+        # The queued append would build on the failed one
+        with pytest.raises(RuntimeError):
+            id_map.write(queued)
+        assert PersistentIdMap(directory).load().id_to_label == {"a": 1}
+
+        id_map.record_set(4, "d", 40)
+        live = {"a": 1, "b": 2, "c": 3, "d": 4}
+        snapshot = _prepare(id_map, live)
+        assert snapshot.is_snapshot
+        id_map.write(snapshot)
+        assert PersistentIdMap(directory).load().id_to_label == live
+        assert not os.path.exists(os.path.join(directory, "id_map.0.records"))
+
+        # Appends resume on top of the snapshot
+        id_map.record_delete(2)
+        del live["b"]
+        id_map.write(_prepare(id_map, live))
+        assert PersistentIdMap(directory).load().id_to_label == live
@@ -0,0 +1,145 @@
+import tempfile
+import uuid
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from chromadb.api.client import Client
+from chromadb.config import Settings, System
+from chromadb.segment import VectorReader
+from chromadb.segment.impl.manager.cache.cache import SegmentLRUCache
+from chromadb.segment.impl.manager.local import LocalSegmentManager
+from chromadb.segment.impl.vector.local_persistent_hnsw import (
+    PersistentLocalHnswSegment,
+)
+from chromadb.types import Segment, SegmentScope
+
+
+def _segment() -> Segment:
+    return Segment(
+        id=uuid.uuid4(),
+        type="test",
+        scope=SegmentScope.VECTOR,
+        collection=uuid.uuid4(),
+        metadata=None,
+        file_paths={},
+    )
+
+
+def test_lru_eviction_by_size() -> None:
+    sizes: Dict[uuid.UUID, int] = {}
+    measured: List[uuid.UUID] = []
+    evicted: List[uuid.UUID] = []
+
+    def size_func(segment: Segment) -> int:
+        measured.append(segment["collection"])
+        return sizes[segment["collection"]]
+
+    cache = SegmentLRUCache(
+        capacity=10, size_func=size_func, callback=lambda k, _: evicted.append(k)
+    )
+    segments = [_segment() for _ in range(4)]
+    keys = [s["collection"] for s in segments]
+    for key, size in zip(keys, [3, 3, 3, 4]):
+        sizes[key] = size
+
+    for key, segment in zip(keys[:3], segments[:3]):
+        cache.set(key, segment)
+    assert cache.get(keys[0]) is segments[0]
+    # Only the inserted segment is measured
+    assert measured == keys[:3]
+
+    cache.set(keys[3], segments[3])
+    assert evicted == [keys[1]]
+    assert cache.get(keys[1]) is None
+    assert cache.total_size == 10
+
+    # A segment that grew is remeasured, and makes room on the next insert
+    sizes[keys[0]] = 6
+    cache.update_size(keys[0])
+    assert cache.total_size == 13
+    cache.set(keys[1], segments[1])
+    assert evicted == [keys[1], keys[2], keys[0]]
+    assert cache.total_size == 7
+
+    assert cache.pop(keys[3]) is segments[3]
+    assert cache.total_size == 3
+
+
+def _persistent_system(persist_directory: str, memory_limit: int) -> System:
+    settings = Settings(
+        chroma_api_impl="chromadb.api.segment.SegmentAPI",
+        is_persistent=True,
+        persist_directory=persist_directory,
+        allow_reset=True,
+        chroma_segment_cache_policy="LRU",
+        chroma_memory_limit_bytes=memory_limit,
+    )
+    system = System(settings)
+    system.start()
+    return system
+
+
+def test_vector_segments_are_sized_by_their_index() -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        system = _persistent_system(persist_directory, 1024 * 1024)
+        manager = system.instance(LocalSegmentManager)
+        cache = manager.segment_cache[SegmentScope.VECTOR]
+        assert isinstance(cache, SegmentLRUCache)
+
+        client = Client.from_system(system)
+        sizes: List[Tuple[uuid.UUID, int]] = []
+        for i in range(3):
+            collection = client.create_collection(
+                f"test{i}", metadata={"hnsw:sync_threshold": 10, "hnsw:batch_size": 10}
+            )
+            collection.add(
+                ids=[str(j) for j in range(20)],
+                embeddings=np.random.random((20, 64)).astype(np.float32),
+            )
+            segment = manager.get_segment(collection.id, VectorReader)
+            assert isinstance(segment, PersistentLocalHnswSegment)
+            segment.wait_for_persist()
+            sizes.append((collection.id, cache.sizes[collection.id]))
+
+        # Indexes are allocated for a capacity of 1000 elements, and grow to it
+        # when they are first persisted
+        for _, size in sizes:
+            assert size > 1000 * 64 * 4
+        assert cache.total_size > 1024 * 1024
+
+        # The next segment makes room by evicting the least recently used
+        client.create_collection("test3").add(
+            ids=["0"], embeddings=np.zeros((1, 64), dtype=np.float32)
+        )
+        assert cache.get(sizes[0][0]) is None
+        for collection_id, _ in sizes[1:]:
+            assert cache.get(collection_id) is not None
+        assert cache.total_size <= 1024 * 1024
+        system.stop()
+
+
+def test_segments_are_sized_once_loaded() -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        system = _persistent_system(persist_directory, 1024 * 1024 * 1024)
+        collection = Client.from_system(system).create_collection(
+            "test", metadata={"hnsw:sync_threshold": 10, "hnsw:batch_size": 10}
+        )
+        collection.add(
+            ids=[str(i) for i in range(20)],
+            embeddings=np.random.random((20, 64)).astype(np.float32),
+        )
+        system.instance(LocalSegmentManager).wait_for_persist()
+        system.stop()
+
+        # After a restart, the segment is first sized from its files, which are
+        # smaller than the index allocated for its capacity
+        system = _persistent_system(persist_directory, 1024 * 1024 * 1024)
+        manager = system.instance(LocalSegmentManager)
+        cache = manager.segment_cache[SegmentScope.VECTOR]
+        assert isinstance(cache, SegmentLRUCache)
+        segment = manager.get_segment(collection.id, VectorReader)
+        assert isinstance(segment, PersistentLocalHnswSegment)
+        assert cache.sizes[collection.id] == segment.memory_footprint()
+        assert cache.total_size == segment.memory_footprint()
+        system.stop()
@@ -0,0 +1,86 @@
+import tempfile
+import threading
+import time
+from typing import Any, List
+
+import numpy as np
+
+from chromadb.api.client import Client
+from chromadb.config import Settings, System
+from chromadb.segment import SegmentManager, VectorReader
+from chromadb.segment.impl.manager.local import LocalSegmentManager
+from chromadb.types import Segment, SegmentScope
+
+
+def _system(persist_directory: str) -> System:
+    system = System(
+        Settings(
+            chroma_api_impl="chromadb.api.segment.SegmentAPI",
+            is_persistent=True,
+            persist_directory=persist_directory,
+            allow_reset=True,
+        )
+    )
+    system.start()
+    return system
+
+
+def test_slow_load_only_blocks_its_own_segment(monkeypatch: Any) -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        system = _system(persist_directory)
+        client = Client.from_system(system)
+        slow = client.create_collection("slow")
+        fast = client.create_collection("fast")
+        embeddings = np.array([[1.0, 2.0]], dtype=np.float32)
+        slow.add(ids=["1"], embeddings=embeddings)
+        fast.add(ids=["1"], embeddings=embeddings)
+        system.stop()
+
+        # Segments are loaded again on first use after a restart
+        system = _system(persist_directory)
+        manager = system.instance(SegmentManager)
+        assert isinstance(manager, LocalSegmentManager)
+
+        release = threading.Event()
+        slow_loads: List[Segment] = []
+        load_instance = manager._load_instance
+
+        def blocking_load_instance(segment: Segment) -> Any:
+            if (
+                segment["collection"] == slow.id
+                and segment["scope"] == SegmentScope.VECTOR
+            ):
+                slow_loads.append(segment)
+                release.wait()
+            return load_instance(segment)
+
+        monkeypatch.setattr(manager, "_load_instance", blocking_load_instance)
+
+        instances: List[VectorReader] = []
+
+        def get_slow() -> None:
+            instances.append(manager.get_segment(slow.id, VectorReader))
+
+        threads = [threading.Thread(target=get_slow) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        while len(slow_loads) == 0:
+            time.sleep(0.01)
+
+        # Other collections load while the slow one is still loading
+        manager.get_segment(fast.id, VectorReader)
+        assert len(instances) == 0
+        # Give the second request time to queue behind the first
+        time.sleep(0.2)
+
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert len(slow_loads) == 1
+        assert instances[0] is instances[1]
+
+        info = manager.load_info()
+        assert info.loads >= 2
+        assert info.waits == 1
+        assert info.wait_seconds > 0
+        system.stop()
@@ -0,0 +1,178 @@
+from typing import Dict, Generator, List, Optional, Tuple, cast
+
+import pytest
+
+from chromadb.api.client import Client
+from chromadb.config import System
+from chromadb.segment import MetadataReader
+from chromadb.segment.impl.manager.local import LocalSegmentManager
+from chromadb.segment.impl.metadata.sqlite import SqliteMetadataSegment
+from chromadb.test.conftest import sqlite_fixture
+from chromadb.types import (
+    LogRecord,
+    Operation,
+    RequestVersionContext,
+    UpdateMetadata,
+    Where,
+)
+
+
+@pytest.fixture
+def system() -> Generator[System, None, None]:
+    yield from sqlite_fixture()
+
+
+def _segment(system: System) -> SqliteMetadataSegment:
+    client = Client.from_system(system)
+    collection = client.create_collection("test")
+    segment = system.instance(LocalSegmentManager).get_segment(
+        collection.id, MetadataReader
+    )
+    assert isinstance(segment, SqliteMetadataSegment)
+    return segment
+
+
+def _records(
+    operations: List[Tuple[Operation, str, Optional[UpdateMetadata]]]
+) -> List[LogRecord]:
+    return [
+        LogRecord(
+            log_offset=offset,
+            record={
+                "id": id,
+                "embedding": None,
+                "encoding": None,
+                "metadata": metadata,
+                "operation": operation,
+            },
+        )
+        for offset, (operation, id, metadata) in enumerate(operations, start=1)
+    ]
+
+
+def _metadata(
+    segment: SqliteMetadataSegment, **kwargs: object
+) -> Dict[str, Optional[UpdateMetadata]]:
+    version = RequestVersionContext(collection_version=0, log_position=0)
+    return {
+        r["id"]: r["metadata"]
+        for r in segment.get_metadata(version, **kwargs)  # type: ignore[arg-type]
+    }
+
+
+def test_batched_write_matches_per_record_semantics(system: System) -> None:
+    segment = _segment(system)
+    segment._write_metadata(
+        _records(
+            [
+                (Operation.ADD, "a", {"k": 1, "chroma:document": "apple"}),
+                # Duplicate adds are ignored, within a batch and across batches
+                (Operation.ADD, "a", {"k": 2}),
+                (Operation.ADD, "b", {"k": 3, "s": "x"}),
+                # Later records for the same ID apply on top of earlier ones
+                (Operation.UPSERT, "b", {"s": None, "f": 1.5}),
+                (Operation.UPSERT, "c", {"flag": True}),
+                (Operation.UPSERT, "c", {"flag": False, "chroma:document": "cherry"}),
+                (Operation.UPDATE, "missing", {"k": 4}),
+                (Operation.DELETE, "a", None),
+                (Operation.DELETE, "a", None),
+                (Operation.ADD, "d", None),
+            ]
+        )
+    )
+
+    assert _metadata(segment) == {
+        "b": {"k": 3, "f": 1.5},
+        "c": {"flag": False, "chroma:document": "cherry"},
+        "d": None,
+    }
+    assert segment.max_seqid() == 10
+
+    segment._write_metadata(
+        _records(
+            [
+                (Operation.ADD, "a", {"chroma:document": "avocado"}),
+                (Operation.ADD, "b", {"k": 5}),
+                (Operation.UPDATE, "c", {"chroma:document": "citrus"}),
+                (Operation.UPDATE, "d", {"k": 6}),
+            ]
+        )
+    )
+
+    assert _metadata(segment) == {
+        "a": {"chroma:document": "avocado"},
+        "b": {"k": 3, "f": 1.5},
+        "c": {"flag": False, "chroma:document": "citrus"},
+        "d": {"k": 6},
+    }
+    # Full text search rows are replaced and removed with their records
+    assert _metadata(segment, where_document={"$contains": "ap"}) == {}
+    assert list(_metadata(segment, where_document={"$contains": "ci"})) == ["c"]
+    assert list(_metadata(segment, where_document={"$contains": "av"})) == ["a"]
+
+
+def test_iter_metadata_pages_in_id_order(system: System) -> None:
+    segment = _segment(system)
+    segment._write_metadata(
+        _records(
+            [(Operation.ADD, f"id{i}", {"i": i, "even": i % 2 == 0}) for i in range(25)]
+            + [(Operation.DELETE, "id3", None), (Operation.DELETE, "id4", None)]
+        )
+    )
+    version = RequestVersionContext(collection_version=0, log_position=0)
+
+    pages = list(segment.iter_metadata(version, batch_size=5))
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert [r["id"] for page in pages for r in page] == list(_metadata(segment))
+
+    pages = list(segment.iter_metadata(version, where={"even": True}, batch_size=4))
+    assert [len(page) for page in pages] == [4, 4, 4]
+    assert [r["metadata"]["i"] for page in pages for r in page] == [  # type: ignore[index]
+        0,
+        2,
+        6,
+        8,
+        10,
+        12,
+        14,
+        16,
+        18,
+        20,
+        22,
+        24,
+    ]
+
+    assert list(segment.iter_metadata(version, ids=["id3", "nope"])) == []
+    with pytest.raises(ValueError):
+        next(segment.iter_metadata(version, batch_size=0))
+
+
+def test_get_metadata_page_starts_after_internal_id(system: System) -> None:
+    segment = _segment(system)
+    segment._write_metadata(
+        _records([(Operation.ADD, f"id{i}", {"i": i}) for i in range(10)])
+    )
+    version = RequestVersionContext(collection_version=0, log_position=0)
+
+    # Without filters, and with filters, which are compiled differently
+    for where in [None, cast(Where, {"i": {"$gte": 0}})]:
+        records, last = segment.get_metadata_page(version, where=where, limit=4)
+        assert [r["id"] for r in records] == ["id0", "id1", "id2", "id3"]
+        records, last = segment.get_metadata_page(
+            version, where=where, limit=4, offset=1, after=last
+        )
+        assert [r["id"] for r in records] == ["id5", "id6", "id7", "id8"]
+        records, last = segment.get_metadata_page(
+            version, where=where, limit=4, after=last
+        )
+        assert [r["id"] for r in records] == ["id9"]
+        records, last = segment.get_metadata_page(
+            version, where=where, limit=4, after=last
+        )
+        assert records == [] and last is None
+
+    # Deleting the last record of a page does not move the next one
+    _, last = segment.get_metadata_page(version, limit=4)
+    segment._write_metadata(_records([(Operation.DELETE, "id3", None)]))
+    records, _ = segment.get_metadata_page(version, limit=2, after=last)
+    assert [r["id"] for r in records] == ["id4", "id5"]
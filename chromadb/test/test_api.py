@@ -7,6 +7,7 @@ from chromadb.errors import ChromaError
 from chromadb.api.fastapi import FastAPI
 from chromadb.api.types import QueryResult, EmbeddingFunction, Document
 from chromadb.config import Settings
+from chromadb.execution.executor.local import LocalExecutor
 from chromadb.errors import NotFoundError
 import chromadb.server.fastapi
 import pytest
@@ -556,6 +557,198 @@ def test_error_includes_trace_id(http_client):
     assert error.value.trace_id is not None
 
 
+def test_binary_embeddings(http_client):
+    http_client.reset()
+    collection = http_client.create_collection("testspace")
+    embeddings = np.random.random((20, 8)).astype(np.float32)
+    ids = [str(i) for i in range(20)]
+    collection.add(ids=ids, embeddings=embeddings)
+    collection.update(ids=ids[:5], embeddings=embeddings[5:10])
+    collection.upsert(ids=ids[5:10], embeddings=embeddings[:5])
+
+    expected = np.concatenate([embeddings[5:10], embeddings[:5], embeddings[10:]])
+    result = collection.get(ids=ids, include=["embeddings"])
+    assert result["ids"] == ids
+    assert np.array_equal(result["embeddings"], expected)
+
+    result = collection.query(
+        query_embeddings=embeddings[:2], n_results=3, include=["embeddings"]
+    )
+    assert result["ids"][0][0] == "5"
+    assert result["ids"][1][0] == "6"
+    assert np.array_equal(result["embeddings"][0][0], embeddings[0])
+    assert [len(r) for r in result["embeddings"]] == [3, 3]
+
+
+def test_iter_get(client):
+    if (
+        client.get_settings().chroma_api_impl
+        == "chromadb.api.async_fastapi.AsyncFastAPI"
+    ):
+        pytest.skip("iter_get is only on the synchronous client")
+    client.reset()
+    collection = client.create_collection("testspace")
+    embeddings = np.random.random((25, 4)).astype(np.float32)
+    ids = [str(i) for i in range(25)]
+    collection.add(
+        ids=ids,
+        embeddings=embeddings,
+        metadatas=[{"even": i % 2 == 0} for i in range(25)],
+        documents=[f"document {i}" for i in range(25)],
+    )
+    collection.delete(ids=["3", "4"])
+
+    expected = collection.get(include=["embeddings", "metadatas", "documents"])
+    pages = list(
+        collection.iter_get(
+            include=["embeddings", "metadatas", "documents"], batch_size=7
+        )
+    )
+    assert [len(page["ids"]) for page in pages] == [7, 7, 7, 2]
+    assert [id for page in pages for id in page["ids"]] == expected["ids"]
+    assert [d for page in pages for d in page["documents"]] == expected["documents"]
+    assert [m for page in pages for m in page["metadatas"]] == expected["metadatas"]
+    assert np.array_equal(
+        np.concatenate([page["embeddings"] for page in pages]),
+        expected["embeddings"],
+    )
+
+    pages = list(collection.iter_get(where={"even": True}, batch_size=5))
+    assert [id for page in pages for id in page["ids"]] == [
+        str(i) for i in range(0, 25, 2) if i != 4
+    ]
+    assert all(page["embeddings"] is None for page in pages)
+
+    assert list(collection.iter_get(ids=["3"])) == []
+
+
+def test_get_cursor(client):
+    client.reset()
+    collection = client.create_collection("testspace")
+    collection.add(
+        ids=[str(i) for i in range(10)],
+        embeddings=[[float(i), 0.0] for i in range(10)],
+        metadatas=[{"even": i % 2 == 0} for i in range(10)],
+    )
+
+    page = collection.get(limit=4)
+    assert page["ids"] == ["0", "1", "2", "3"]
+    assert page["next_cursor"] is not None
+
+    # The cursor is a position rather than an offset, so it is not thrown off by
+    # deletes before it
+    collection.delete(ids=["0", "3"])
+    page = collection.get(limit=4, cursor=page["next_cursor"])
+    assert page["ids"] == ["4", "5", "6", "7"]
+    page = collection.get(limit=4, cursor=page["next_cursor"])
+    assert page["ids"] == ["8", "9"]
+    assert page["next_cursor"] is None
+
+    ids = []
+    cursor = None
+    while True:
+        page = collection.get(where={"even": True}, limit=2, cursor=cursor)
+        ids.extend(page["ids"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == ["2", "4", "6", "8"]
+
+    assert collection.get()["next_cursor"] is None
+
+    with pytest.raises(Exception, match="Invalid cursor"):
+        collection.get(limit=2, cursor="not a cursor")
+
+
+def test_get_cursor_unsupported(local_persist_api, monkeypatch):
+    # Executors that page by offset only, such as the distributed one, reject
+    # cursors as an invalid argument
+    monkeypatch.setattr(LocalExecutor, "supports_get_cursor", False)
+    local_persist_api.reset()
+    collection = local_persist_api.create_collection("testspace")
+    collection.add(ids=["0", "1"], embeddings=[[0.0, 0.0], [1.0, 0.0]])
+    page = collection.get(limit=1)
+    assert page["next_cursor"] is not None
+
+    with pytest.raises(InvalidArgumentError, match="cursors are not supported"):
+        collection.get(limit=1, cursor=page["next_cursor"])
+
+
+def test_bulk_add(client):
+    client.reset()
+    collection = client.create_collection("testspace")
+
+    progress = []
+    collection.bulk_add(
+        ids=[str(i) for i in range(95)],
+        embeddings=[[float(i), 0.0] for i in range(95)],
+        metadatas=[{"i": i} for i in range(95)],
+        batch_size=10,
+        max_workers=3,
+        on_progress=lambda written, total: progress.append((written, total)),
+    )
+    assert collection.count() == 95
+    assert [written for written, _ in progress] == sorted(
+        written for written, _ in progress
+    )
+    assert progress[-1] == (95, 95)
+    assert len(progress) == 10
+    result = collection.get(ids=["42"], include=["metadatas"])
+    assert result["metadatas"] == [{"i": 42}]
+
+    collection.bulk_upsert(
+        ids=[str(i) for i in range(90, 110)],
+        embeddings=[[float(i), 1.0] for i in range(90, 110)],
+        batch_size=7,
+    )
+    assert collection.count() == 110
+
+    # Invalid records fail before any batch is written
+    with pytest.raises(Exception, match="Expected IDs to be unique"):
+        collection.bulk_add(
+            ids=["a", "b", "a"], embeddings=[[0.0, 0.0]] * 3, batch_size=1
+        )
+    assert collection.count() == 110
+
+
+def test_bulk_add_retries_transient_errors(client, monkeypatch):
+    if (
+        client.get_settings().chroma_api_impl
+        == "chromadb.api.async_fastapi.AsyncFastAPI"
+    ):
+        pytest.skip("The async client is wrapped as a sync one in tests")
+    client.reset()
+    collection = client.create_collection("testspace")
+
+    add = collection._client._add
+    calls = []
+
+    def flaky_add(**kwargs):
+        calls.append(kwargs["ids"])
+        if len(calls) == 1:
+            raise httpx.ConnectError("connection reset")
+        return add(**kwargs)
+
+    monkeypatch.setattr(collection._client, "_add", flaky_add)
+    collection.bulk_add(
+        ids=[str(i) for i in range(20)],
+        embeddings=[[float(i), 0.0] for i in range(20)],
+        batch_size=10,
+        max_workers=1,
+    )
+    assert collection.count() == 20
+    assert len(calls) == 3
+
+    def failing_add(**kwargs):
+        raise httpx.ConnectError("connection reset")
+
+    monkeypatch.setattr(collection._client, "_add", failing_add)
+    with pytest.raises(httpx.ConnectError):
+        collection.bulk_add(
+            ids=["a"], embeddings=[[0.0, 0.0]], max_retries=0, max_workers=1
+        )
+
+
 def test_list_collections(client):
     client.reset()
     client.create_collection("testspace")
@@ -1,6 +1,7 @@
 import multiprocessing
 import multiprocessing.context
 import sys
+import tempfile
 import time
 from multiprocessing.synchronize import Event
 
@@ -14,6 +15,7 @@ from chromadb.db.base import get_sql
 from chromadb.db.impl.sqlite import SqliteDB
 from pypika import Table
 import numpy as np
+import pytest
 
 from chromadb.test.property import invariants
 
@@ -155,3 +157,47 @@ def test_vacuum_errors_if_locked(sqlite_persistent: System, capfd) -> None:
     finally:
         shutdown_event.set()
         process.join()
+
+
+def test_compact(capfd: pytest.CaptureFixture[str]) -> None:
+    with tempfile.TemporaryDirectory() as persist_directory:
+        settings = Settings(
+            chroma_api_impl="chromadb.api.segment.SegmentAPI",
+            is_persistent=True,
+            persist_directory=persist_directory,
+        )
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).create_collection(
+            "collection1", metadata={"hnsw:batch_size": 10, "hnsw:sync_threshold": 10}
+        )
+        collection.add(
+            ids=[str(i) for i in range(100)],
+            embeddings=np.random.rand(100, 2).astype(np.float32),
+        )
+        collection.delete(ids=[str(i) for i in range(60)])
+        system.stop()
+
+        sys.argv = [
+            "chroma",
+            "compact",
+            "--path",
+            persist_directory,
+            "--threshold",
+            "0.7",
+        ]
+        cli.app()
+        assert "Skipped collection1" in capfd.readouterr().out
+
+        sys.argv = ["chroma", "compact", "--path", persist_directory]
+        cli.app()
+        assert (
+            "Compacted collection1: removed 60 of 100 elements"
+            in capfd.readouterr().out
+        )
+
+        system = System(settings)
+        system.start()
+        collection = Client.from_system(system).get_collection("collection1")
+        assert collection.count() == 40
+        system.stop()
@@ -0,0 +1,48 @@
+import numpy as np
+
+from chromadb.utils.binary_embeddings import (
+    decode_embeddings_body,
+    encode_embeddings_body,
+)
+
+
+def test_round_trip() -> None:
+    embeddings = [np.array([1.5, 2, 3], dtype=np.float32), np.array([4, 5, 6])]
+    content = encode_embeddings_body(
+        {"ids": ["a", "b"], "embeddings": embeddings, "documents": None},
+        "embeddings",
+    )
+    assert content is not None
+
+    body = decode_embeddings_body(content)
+    assert body["ids"] == ["a", "b"]
+    assert body["documents"] is None
+    assert [e.dtype for e in body["embeddings"]] == [np.float32, np.float32]
+    assert [e.tolist() for e in body["embeddings"]] == [[1.5, 2, 3], [4, 5, 6]]
+    # Results are handed to callers, who may modify them in place
+    assert all(e.flags.writeable for e in body["embeddings"])
+
+
+def test_grouped_round_trip() -> None:
+    embeddings = [[[1.0, 2.0], [3.0, 4.0]], [], [[5.0, 6.0]]]
+    content = encode_embeddings_body(
+        {"ids": [["a", "b"], [], ["c"]], "embeddings": embeddings},
+        "embeddings",
+        grouped=True,
+    )
+    assert content is not None
+
+    body = decode_embeddings_body(content)
+    assert body["ids"] == [["a", "b"], [], ["c"]]
+    assert [group.tolist() for group in body["embeddings"]] == embeddings
+    assert all(group.flags.writeable for group in body["embeddings"])
+
+
+def test_unencodable_embeddings() -> None:
+    # Embeddings that are not one float32 matrix are left to be sent as JSON
+    assert encode_embeddings_body({"embeddings": None}, "embeddings") is None
+    assert (
+        encode_embeddings_body({"embeddings": [[1.0], [1.0, 2.0]]}, "embeddings")
+        is None
+    )
+    assert encode_embeddings_body({"embeddings": [["a"]]}, "embeddings") is None
@@ -14,6 +14,8 @@ from pytest import MonkeyPatch
 # Skip these embedding functions in tests
 SKIP_EMBEDDING_FUNCTIONS = [
     "chroma_langchain",
+    # Wraps another embedding function, see chromadb/test/ef/test_cached_ef.py
+    "cached",
 ]
 
 
@@ -0,0 +1,89 @@
+import threading
+import time
+from typing import List
+
+import pytest
+
+from chromadb.utils.read_write_lock import ReadRWLock, ReadWriteLock, WriteRWLock
+
+
+def test_waiting_writer_blocks_new_readers() -> None:
+    lock = ReadWriteLock()
+    events: List[str] = []
+
+    lock.acquire_read()
+
+    def write() -> None:
+        with WriteRWLock(lock):
+            events.append("write")
+
+    def read() -> None:
+        with ReadRWLock(lock):
+            events.append("read")
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    while lock._waiting_writers == 0:
+        time.sleep(0.01)
+    reader = threading.Thread(target=read)
+    reader.start()
+    time.sleep(0.1)
+    # Neither goes ahead of the reader holding the lock
+    assert events == []
+
+    lock.release_read()
+    writer.join()
+    reader.join()
+    assert events == ["write", "read"]
+
+
+def test_reentrant_reads_do_not_wait_behind_writers() -> None:
+    lock = ReadWriteLock()
+    lock.acquire_read()
+    writer = threading.Thread(target=lambda: WriteRWLock(lock).__enter__())
+    writer.start()
+    while lock._waiting_writers == 0:
+        time.sleep(0.01)
+
+    # The thread holding the read lock takes it again, and the writer still waits
+    with ReadRWLock(lock, timeout=1):
+        pass
+    lock.release_read()
+    writer.join()
+
+    # The writer got the lock once the last read was released
+    assert not lock.acquire_read(timeout=0.01)
+    assert lock._writer == writer.ident
+
+
+def test_timeouts() -> None:
+    lock = ReadWriteLock()
+    lock.acquire_read()
+
+    def write() -> None:
+        with pytest.raises(TimeoutError):
+            with WriteRWLock(lock, timeout=0.05):
+                pass
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    writer.join()
+    # Readers are not held back by a writer that gave up
+    reader = threading.Thread(target=lambda: ReadRWLock(lock, timeout=1).__enter__())
+    reader.start()
+    reader.join()
+    assert lock._readers == 2
+
+
+def test_writer_may_read_and_write_again() -> None:
+    lock = ReadWriteLock()
+    with WriteRWLock(lock):
+        with ReadRWLock(lock, timeout=1):
+            with WriteRWLock(lock, timeout=1):
+                pass
+    assert lock.acquire_write(timeout=0)
+
+    stats = lock.stats()
+    assert stats.writes == 2
+    assert stats.reads == 1
+    assert stats.write_hold_seconds > 0
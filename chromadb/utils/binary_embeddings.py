@@ -0,0 +1,100 @@
+"""A binary HTTP body format that carries embeddings as raw float32 buffers.
+
+A body is a little-endian uint32 length, a JSON document of that length, and then the
+values of one embeddings field of the document as little-endian float32s. The field is
+left out of the JSON, which instead describes it under the "$embeddings" key:
+
+    {"field": "embeddings", "count": 2, "dim": 3, "lengths": null}
+
+Embeddings are either a list of embeddings, or, when "lengths" is set, a list of lists
+of embeddings (as in query results), where "lengths" holds the size of each list.
+"""
+import struct
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import numpy.typing as npt
+import orjson
+
+BINARY_EMBEDDINGS_CONTENT_TYPE = "application/x-chroma-embeddings"
+
+_LENGTH = struct.Struct("<I")
+_DTYPE = np.dtype("<f4")
+_LAYOUT_KEY = "$embeddings"
+
+
+def _matrix(embeddings: Sequence[Any]) -> Optional[npt.NDArray[np.float32]]:
+    if len(embeddings) == 0:
+        return np.empty((0, 0), dtype=_DTYPE)
+    try:
+        matrix = np.asarray(embeddings, dtype=_DTYPE)
+    except (ValueError, TypeError):
+        return None
+    if matrix.ndim != 2:
+        return None
+    return matrix
+
+
+def encode_embeddings_body(
+    body: Dict[str, Any], field: str, grouped: bool = False
+) -> Optional[bytes]:
+    """Encode a JSON body with its embeddings field as a binary buffer. If grouped,
+    the field is a list of lists of embeddings. Returns None if the embeddings can't
+    be represented as one float32 matrix, e.g. when their dimensions differ."""
+    embeddings = body.get(field)
+    if embeddings is None:
+        return None
+
+    lengths: Optional[List[int]] = None
+    if grouped:
+        lengths = [len(group) for group in embeddings]
+        embeddings = [embedding for group in embeddings for embedding in group]
+    matrix = _matrix(embeddings)
+    if matrix is None:
+        return None
+
+    header = {k: v for k, v in body.items() if k != field}
+    header[_LAYOUT_KEY] = {
+        "field": field,
+        "count": matrix.shape[0],
+        "dim": matrix.shape[1],
+        "lengths": lengths,
+    }
+    encoded_header = orjson.dumps(
+        header, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    )
+    return b"".join(
+        [_LENGTH.pack(len(encoded_header)), encoded_header, matrix.tobytes()]
+    )
+
+
+def decode_embeddings_body(content: bytes) -> Dict[str, Any]:
+    """Decode a body encoded by encode_embeddings_body. Embeddings are copied out of
+    the body, so that they are writable: a list of 1-D arrays, or a list of 2-D
+    arrays if grouped."""
+    (header_length,) = _LENGTH.unpack_from(content)
+    body: Dict[str, Any] = orjson.loads(
+        memoryview(content)[_LENGTH.size : _LENGTH.size + header_length]
+    )
+    layout = body.pop(_LAYOUT_KEY)
+
+    matrix = (
+        np.frombuffer(
+            content,
+            dtype=_DTYPE,
+            count=layout["count"] * layout["dim"],
+            offset=_LENGTH.size + header_length,
+        )
+        .reshape(layout["count"], layout["dim"])
+        .copy()
+    )
+
+    lengths = layout["lengths"]
+    if lengths is None:
+        body[layout["field"]] = list(matrix)
+    else:
+        offsets = np.cumsum([0] + lengths)
+        body[layout["field"]] = [
+            matrix[start:end] for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+    return body
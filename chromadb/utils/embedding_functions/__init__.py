@@ -61,6 +61,10 @@ from chromadb.utils.embedding_functions.cloudflare_workers_ai_embedding_function
 from chromadb.utils.embedding_functions.together_ai_embedding_function import (
     TogetherAIEmbeddingFunction,
 )
+from chromadb.utils.embedding_functions.cached_embedding_function import (
+    CachedEmbeddingFunction,
+    EmbeddingCacheInfo,
+)
 
 try:
     from chromadb.is_thin_client import is_thin_client
@@ -90,6 +94,7 @@ _all_classes: Set[str] = {
     "BasetenEmbeddingFunction",
     "CloudflareWorkersAIEmbeddingFunction",
     "TogetherAIEmbeddingFunction",
+    "CachedEmbeddingFunction",
     "DefaultEmbeddingFunction",
 }
 
@@ -151,6 +156,7 @@ known_embedding_functions: Dict[str, Type[EmbeddingFunction]] = {  # type: ignor
     "default": DefaultEmbeddingFunction,
     "cloudflare_workers_ai": CloudflareWorkersAIEmbeddingFunction,
     "together_ai": TogetherAIEmbeddingFunction,
+    "cached": CachedEmbeddingFunction,
 }
 
 
@@ -235,6 +241,8 @@ __all__ = [
     "AmazonBedrockEmbeddingFunction",
     "ChromaLangchainEmbeddingFunction",
     "TogetherAIEmbeddingFunction",
+    "CachedEmbeddingFunction",
+    "EmbeddingCacheInfo",
     "register_embedding_function",
     "config_to_embedding_function",
     "known_embedding_functions",
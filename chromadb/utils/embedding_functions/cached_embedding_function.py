@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, cast
+
+import numpy as np
+import numpy.typing as npt
+
+from chromadb.api.types import D, Embeddable, EmbeddingFunction, Embeddings, Space
+from chromadb.utils.embedding_functions.schemas import validate_config_schema
+
+DEFAULT_MAX_ENTRIES = 10_000
+
+_DB_FILE = "embeddings.sqlite3"
+
+
+class EmbeddingCacheInfo(NamedTuple):
+    """Counters of a CachedEmbeddingFunction, in the style of functools.lru_cache"""
+
+    # Inputs found in memory
+    hits: int
+    # Inputs found on disk, after missing in memory
+    disk_hits: int
+    # Inputs sent to the wrapped embedding function
+    misses: int
+    # Embeddings held in memory
+    entries: int
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[D]):
+    """
+    This class wraps an embedding function with a cache of the embeddings it computed,
+    keyed by the name and config of the embedding function and a sha256 of the input.
+    Only inputs that aren't cached are sent to the wrapped embedding function.
+
+    Embeddings are kept in an in-memory LRU and, if a cache directory is given, in a
+    SQLite database in it, so that they survive restarts and can be shared between
+    processes.
+    """
+
+    def __init__(
+        self,
+        embedding_function: EmbeddingFunction[D],
+        cache_dir: Optional[str] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ) -> None:
+        """
+        Initialize the Cached Embedding Function.
+
+        Args:
+            embedding_function (EmbeddingFunction): The embedding function to cache.
+            cache_dir (str, optional): A directory to also store the embeddings in.
+                Defaults to None, which only caches them in memory.
+            max_entries (int): The number of embeddings to keep in memory. Defaults
+                to 10000.
+        """
+        if max_entries < 0:
+            raise ValueError(
+                f"Expected max_entries to be non-negative, got {max_entries}"
+            )
+
+        self.embedding_function = embedding_function
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+        self._namespace = self._namespace_of(embedding_function)
+        self._entries: "OrderedDict[bytes, npt.NDArray[np.float32]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._db = sqlite3.connect(
+                os.path.join(cache_dir, _DB_FILE),
+                check_same_thread=False,
+                isolation_level=None,
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key BLOB PRIMARY KEY, embedding BLOB NOT NULL) WITHOUT ROWID"
+            )
+
+    def __call__(self, input: D) -> Embeddings:
+        """
+        Get the embeddings for a list of texts or images, from the cache if possible.
+
+        Args:
+            input (Embeddable): A list of texts or images to get embeddings for.
+
+        Returns:
+            Embeddings: The embeddings for the input, in the same order.
+
+        Example:
+            >>> cached_ef = CachedEmbeddingFunction(DefaultEmbeddingFunction())
+            >>> embeddings = cached_ef(["Hello, world!", "How are you?"])
+        """
+        keys = [self._key(item) for item in input]
+        found: Dict[bytes, npt.NDArray[np.float32]] = {}
+
+        with self._lock:
+            for key in keys:
+                embedding = self._entries.get(key)
+                if embedding is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = embedding
+                    self._hits += 1
+
+            on_disk = self._load([key for key in keys if key not in found])
+            self._disk_hits += len(on_disk)
+            for key, embedding in on_disk.items():
+                self._remember(key, embedding)
+            found.update(on_disk)
+
+        # Embed each missing input once, even if it is repeated in the batch
+        missing: Dict[bytes, int] = {}
+        for i, key in enumerate(keys):
+            if key not in found and key not in missing:
+                missing[key] = i
+        if missing:
+            computed = self.embedding_function(
+                cast(D, [input[i] for i in missing.values()])
+            )
+            new = {
+                key: np.asarray(embedding, dtype=np.float32)
+                for key, embedding in zip(missing, computed)
+            }
+            with self._lock:
+                self._misses += len(missing)
+                for key, embedding in new.items():
+                    self._remember(key, embedding)
+                self._store(new)
+            found.update(new)
+
+        return [found[key] for key in keys]
+
+    def cache_info(self) -> EmbeddingCacheInfo:
+        """Return the hit and miss counts of the cache, and how many embeddings it
+        holds in memory."""
+        with self._lock:
+            return EmbeddingCacheInfo(
+                hits=self._hits,
+                disk_hits=self._disk_hits,
+                misses=self._misses,
+                entries=len(self._entries),
+            )
+
+    def cache_clear(self) -> None:
+        """Drop the cached embeddings, in memory and on disk, and reset the counts."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._disk_hits = self._misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+
+    def _key(self, item: Any) -> bytes:
+        hasher = hashlib.sha256(self._namespace)
+        if isinstance(item, str):
+            hasher.update(b"document\0")
+            hasher.update(item.encode("utf-8"))
+        else:
+            image = np.ascontiguousarray(item)
+            hasher.update(f"image\0{image.dtype.str}\0{image.shape}\0".encode())
+            hasher.update(image.tobytes())
+        return hasher.digest()
+
+    @staticmethod
+    def _namespace_of(embedding_function: EmbeddingFunction[Any]) -> bytes:
+        # Embeddings of different models, or of one model configured differently,
+        # must not be mixed up
+        if embedding_function.is_legacy():
+            identity: Dict[str, Any] = {
+                "class": type(embedding_function).__qualname__,
+            }
+        else:
+            identity = {
+                "name": embedding_function.name(),
+                "config": embedding_function.get_config(),
+            }
+        return json.dumps(identity, sort_keys=True, default=str).encode()
+
+    def _remember(self, key: bytes, embedding: npt.NDArray[np.float32]) -> None:
+        if self.max_entries == 0:
+            return
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, keys: Sequence[bytes]) -> Dict[bytes, npt.NDArray[np.float32]]:
+        if self._db is None or not keys:
+            return {}
+        loaded = {}
+        # Stay under SQLite's default limit of 999 parameters
+        for start in range(0, len(keys), 900):
+            chunk = keys[start : start + 900]
+            rows = self._db.execute(
+                "SELECT key, embedding FROM embeddings WHERE key IN "
+                f"({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            for key, embedding in rows:
+                loaded[key] = np.frombuffer(embedding, dtype=np.float32)
+        return loaded
+
+    def _store(self, embeddings: Dict[bytes, npt.NDArray[np.float32]]) -> None:
+        if self._db is None:
+            return
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                [
+                    (key, embedding.astype("<f4", copy=False).tobytes())
+                    for key, embedding in embeddings.items()
+                ],
+            )
+
+    @staticmethod
+    def name() -> str:
+        return "cached"
+
+    def default_space(self) -> Space:
+        return self.embedding_function.default_space()
+
+    def supported_spaces(self) -> List[Space]:
+        return self.embedding_function.supported_spaces()
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "EmbeddingFunction[Embeddable]":
+        from chromadb.utils.embedding_functions import config_to_embedding_function
+
+        embedding_function = config.get("embedding_function")
+        if embedding_function is None:
+            assert False, "This code should not be reached"
+
+        return CachedEmbeddingFunction(
+            embedding_function=config_to_embedding_function(embedding_function),
+            cache_dir=config.get("cache_dir"),
+            max_entries=config.get("max_entries", DEFAULT_MAX_ENTRIES),
+        )
+
+    def get_config(self) -> Dict[str, Any]:
+        inner_config = self.embedding_function.get_config()
+        if inner_config is NotImplemented:
+            return NotImplemented
+        return {
+            "embedding_function": {
+                "name": self.embedding_function.name(),
+                "config": inner_config,
+            },
+            "cache_dir": self.cache_dir,
+            "max_entries": self.max_entries,
+        }
+
+    def validate_config_update(
+        self, old_config: Dict[str, Any], new_config: Dict[str, Any]
+    ) -> None:
+        if "embedding_function" in new_config:
+            old = old_config.get("embedding_function", {})
+            new = new_config["embedding_function"]
+            if new.get("name") != old.get("name"):
+                raise ValueError(
+                    "The cached embedding function cannot be changed after the embedding function has been initialized."
+                )
+            self.embedding_function.validate_config_update(
+                old.get("config", {}), new.get("config", {})
+            )
+
+    @staticmethod
+    def validate_config(config: Dict[str, Any]) -> None:
+        """
+        Validate the configuration using the JSON schema.
+
+        Args:
+            config: Configuration to validate
+
+        Raises:
+            ValidationError: If the configuration does not match the schema
+        """
+        validate_config_schema(config, "cached")
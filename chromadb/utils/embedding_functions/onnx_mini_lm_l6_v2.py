@@ -4,9 +4,10 @@ import logging
 import os
 import tarfile
 import sys
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import cached_property
 from pathlib import Path
-from typing import List, Dict, Any, Optional, cast
+from typing import List, Dict, Any, Iterator, Optional, Tuple, cast
 
 import numpy as np
 import numpy.typing as npt
@@ -44,13 +45,29 @@ class ONNXMiniLM_L6_V2(EmbeddingFunction[Documents]):
     )
     _MODEL_SHA256 = "913d7300ceae3b2dbc2c50d1de4baacab4be7b9380491c27fab7418616a16ec3"
 
-    def __init__(self, preferred_providers: Optional[List[str]] = None) -> None:
+    # Documents are tokenized this many batches at a time, and sorted by length
+    # within each window so that every batch is padded only to its longest document
+    BUCKET_BATCHES = 8
+
+    def __init__(
+        self,
+        preferred_providers: Optional[List[str]] = None,
+        batch_size: int = 32,
+        intra_op_num_threads: Optional[int] = None,
+        pipeline: bool = False,
+    ) -> None:
         """
         Initialize the ONNXMiniLM_L6_V2 embedding function.
 
         Args:
             preferred_providers (List[str], optional): The preferred ONNX runtime providers.
                 Defaults to None.
+            batch_size (int, optional): The number of documents per inference run.
+                Defaults to 32.
+            intra_op_num_threads (int, optional): The number of threads onnxruntime
+                uses within an operator. Defaults to None, which lets onnxruntime decide.
+            pipeline (bool, optional): Whether to tokenize the next documents on a
+                background thread while the model runs. Defaults to False.
         """
         # convert the list to set for unique values
         if preferred_providers and not all(
@@ -62,8 +79,15 @@ class ONNXMiniLM_L6_V2(EmbeddingFunction[Documents]):
             set(preferred_providers)
         ):
             raise ValueError("Preferred providers must be unique")
+        if batch_size < 1:
+            raise ValueError("Batch size must be a positive integer")
+        if intra_op_num_threads is not None and intra_op_num_threads < 0:
+            raise ValueError("Intra op num threads must be a non-negative integer")
 
         self._preferred_providers = preferred_providers
+        self._batch_size = batch_size
+        self._intra_op_num_threads = intra_op_num_threads
+        self._pipeline = pipeline
 
         try:
             # Equivalent to import onnxruntime
@@ -140,8 +164,90 @@ class ONNXMiniLM_L6_V2(EmbeddingFunction[Documents]):
         norm[norm == 0] = 1e-12
         return cast(npt.NDArray[np.float32], v / norm[:, np.newaxis])
 
+    def _tokenize(self, documents: List[str]) -> List[Any]:
+        """
+        Tokenize documents without padding.
+
+        Args:
+            documents: The documents to tokenize.
+
+        Returns:
+            The encodings of the documents.
+        """
+        encoded = cast(List[Any], self.tokenizer.encode_batch(documents))
+
+        # Check if any document exceeds the max tokens
+        for doc_tokens in encoded:
+            if len(doc_tokens.ids) > self.max_tokens():
+                raise ValueError(
+                    f"Document length {len(doc_tokens.ids)} is greater than the max tokens {self.max_tokens()}"
+                )
+        return encoded
+
+    def _batches(
+        self, encoded: List[Any], batch_size: int
+    ) -> Iterator[Tuple[npt.NDArray[np.intp], Dict[str, npt.NDArray[np.int64]]]]:
+        """
+        Group encodings of similar length into model inputs.
+
+        Args:
+            encoded: The encodings to group.
+            batch_size: The number of encodings per batch.
+
+        Yields:
+            The positions of each batch within the encodings, and its model input
+            padded to the longest encoding in the batch.
+        """
+        lengths = np.fromiter(
+            (len(e.ids) for e in encoded), dtype=np.int64, count=len(encoded)
+        )
+        order = np.argsort(lengths, kind="stable")
+        for i in range(0, len(order), batch_size):
+            positions = order[i : i + batch_size]
+            batch_lengths = lengths[positions]
+            input_ids = np.zeros(
+                (len(positions), int(batch_lengths.max())), dtype=np.int64
+            )
+            for row, position in zip(input_ids, positions):
+                ids = encoded[position].ids
+                row[: len(ids)] = ids
+            attention_mask = (
+                np.arange(input_ids.shape[1]) < batch_lengths[:, np.newaxis]
+            ).astype(np.int64)
+            yield positions, {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids),
+            }
+
+    def _embed(
+        self, onnx_input: Dict[str, npt.NDArray[np.int64]]
+    ) -> npt.NDArray[np.float32]:
+        """
+        Run the model on a batch and pool its output into normalized embeddings.
+
+        Args:
+            onnx_input: The padded input ids, attention mask and token type ids.
+
+        Returns:
+            The embeddings for the batch.
+        """
+        model_output = self.model.run(None, onnx_input)
+        last_hidden_state = model_output[0]
+
+        # Perform mean pooling with attention weighting
+        attention_mask = onnx_input["attention_mask"]
+        input_mask_expanded = np.broadcast_to(
+            np.expand_dims(attention_mask, -1), last_hidden_state.shape
+        )
+        embeddings = np.sum(last_hidden_state * input_mask_expanded, 1) / np.clip(
+            input_mask_expanded.sum(1), a_min=1e-9, a_max=None
+        )
+
+        return self._normalize(embeddings).astype(np.float32)
+
     def _forward(
-        self, documents: List[str], batch_size: int = 32
+        self, documents: List[str], batch_size: Optional[int] = None
     ) -> npt.NDArray[np.float32]:
         """
         Generate embeddings for a list of documents.
@@ -149,49 +255,45 @@ class ONNXMiniLM_L6_V2(EmbeddingFunction[Documents]):
         Args:
             documents: The documents to generate embeddings for.
             batch_size: The batch size to use when generating embeddings.
+                Defaults to the batch size of the embedding function.
 
         Returns:
             The embeddings for the documents.
         """
-        all_embeddings = []
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i : i + batch_size]
-
-            # Encode each document separately
-            encoded = [self.tokenizer.encode(d) for d in batch]
-
-            # Check if any document exceeds the max tokens
-            for doc_tokens in encoded:
-                if len(doc_tokens.ids) > self.max_tokens():
-                    raise ValueError(
-                        f"Document length {len(doc_tokens.ids)} is greater than the max tokens {self.max_tokens()}"
-                    )
-
-            input_ids = np.array([e.ids for e in encoded])
-            attention_mask = np.array([e.attention_mask for e in encoded])
+        if batch_size is None:
+            batch_size = self._batch_size
+        window = batch_size * self.BUCKET_BATCHES
+        windows = [documents[i : i + window] for i in range(0, len(documents), window)]
 
-            onnx_input = {
-                "input_ids": np.array(input_ids, dtype=np.int64),
-                "attention_mask": np.array(attention_mask, dtype=np.int64),
-                "token_type_ids": np.array(
-                    [np.zeros(len(e), dtype=np.int64) for e in input_ids],
-                    dtype=np.int64,
-                ),
-            }
-
-            model_output = self.model.run(None, onnx_input)
-            last_hidden_state = model_output[0]
-
-            # Perform mean pooling with attention weighting
-            input_mask_expanded = np.broadcast_to(
-                np.expand_dims(attention_mask, -1), last_hidden_state.shape
-            )
-            embeddings = np.sum(last_hidden_state * input_mask_expanded, 1) / np.clip(
-                input_mask_expanded.sum(1), a_min=1e-9, a_max=None
-            )
-
-            embeddings = self._normalize(embeddings).astype(np.float32)
-            all_embeddings.append(embeddings)
+        all_embeddings: List[npt.NDArray[np.float32]] = []
+        executor = ThreadPoolExecutor(max_workers=1) if self._pipeline else None
+        try:
+            pending: Optional[Future[List[Any]]] = None
+            for i, docs in enumerate(windows):
+                if pending is not None:
+                    encoded = pending.result()
+                else:
+                    encoded = self._tokenize(docs)
+                if executor is not None and i + 1 < len(windows):
+                    # Tokenize the next window while the model runs on this one
+                    pending = executor.submit(self._tokenize, windows[i + 1])
+
+                positions, batch_embeddings = zip(
+                    *(
+                        (batch_positions, self._embed(onnx_input))
+                        for batch_positions, onnx_input in self._batches(
+                            encoded, batch_size
+                        )
+                    )
+                )
+                # Restore the original order of the documents
+                sorted_embeddings = np.concatenate(batch_embeddings)
+                embeddings = np.empty_like(sorted_embeddings)
+                embeddings[np.concatenate(positions)] = sorted_embeddings
+                all_embeddings.append(embeddings)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
 
         return np.concatenate(all_embeddings)
 
@@ -211,7 +313,8 @@ class ONNXMiniLM_L6_V2(EmbeddingFunction[Documents]):
         # max_seq_length = 256, for some reason sentence-transformers uses 256 even though the HF config has a max length of 128
         # https://github.com/UKPLab/sentence-transformers/blob/3e1929fddef16df94f8bc6e3b10598a98f46e62d/docs/_static/html/models_en_sentence_embeddings.html#LL480
         tokenizer.enable_truncation(max_length=256)
-        tokenizer.enable_padding(pad_id=0, pad_token="[PAD]", length=256)
+        # Padding is applied per batch, to the longest document in it
+        tokenizer.no_padding()
         return tokenizer
 
     @cached_property
@@ -240,6 +343,8 @@ class ONNXMiniLM_L6_V2(EmbeddingFunction[Documents]):
         so = self.ort.SessionOptions()
         so.log_severity_level = 3
         so.graph_optimization_level = self.ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self._intra_op_num_threads is not None:
+            so.intra_op_num_threads = self._intra_op_num_threads
 
         return self.ort.InferenceSession(
             os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "model.onnx"),
@@ -332,15 +437,25 @@ class ONNXMiniLM_L6_V2(EmbeddingFunction[Documents]):
     def build_from_config(config: Dict[str, Any]) -> "EmbeddingFunction[Documents]":
         preferred_providers = config.get("preferred_providers")
 
-        return ONNXMiniLM_L6_V2(preferred_providers=preferred_providers)
+        return ONNXMiniLM_L6_V2(
+            preferred_providers=preferred_providers,
+            batch_size=config.get("batch_size", 32),
+            intra_op_num_threads=config.get("intra_op_num_threads"),
+            pipeline=config.get("pipeline", False),
+        )
 
     def get_config(self) -> Dict[str, Any]:
-        return {"preferred_providers": self._preferred_providers}
+        return {
+            "preferred_providers": self._preferred_providers,
+            "batch_size": self._batch_size,
+            "intra_op_num_threads": self._intra_op_num_threads,
+            "pipeline": self._pipeline,
+        }
 
     def validate_config_update(
         self, old_config: Dict[str, Any], new_config: Dict[str, Any]
     ) -> None:
-        # Preferred providers can be changed, so no validation needed
+        # Preferred providers and inference settings can be changed, so no validation needed
         pass
 
     @staticmethod
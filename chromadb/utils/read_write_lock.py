@@ -1,53 +1,148 @@
 import threading
+import time
 from types import TracebackType
-from typing import Optional, Type
+from typing import NamedTuple, Optional, Type
+
+
+class LockStats(NamedTuple):
+    """Contention counters of a ReadWriteLock. Wait times are how long acquiring
+    blocked, hold times how long the outermost acquisition was held."""
+
+    reads: int
+    read_wait_seconds: float
+    read_hold_seconds: float
+    writes: int
+    write_wait_seconds: float
+    write_hold_seconds: float
 
 
 class ReadWriteLock:
     """A lock object that allows many simultaneous "read locks", but
-    only one "write lock." """
+    only one "write lock."
+
+    Writers are preferred: once a writer waits, new readers wait behind it, so a
+    steady stream of reads can't starve writes. Both locks are reentrant, and the
+    thread holding the write lock may also take the read lock."""
 
     def __init__(self) -> None:
-        self._read_ready = threading.Condition(threading.RLock())
+        self._cond = threading.Condition(threading.Lock())
         self._readers = 0
+        self._waiting_writers = 0
+        self._writer: Optional[int] = None
+        self._write_depth = 0
+        self._write_acquired_at = 0.0
+        # The read lock depth of each thread and when it was first acquired
+        self._local = threading.local()
+        self._stats = LockStats(0, 0.0, 0.0, 0, 0.0, 0.0)
 
-    def acquire_read(self) -> None:
-        """Acquire a read lock. Blocks only if a thread has
-        acquired the write lock."""
-        self._read_ready.acquire()
-        try:
+    def acquire_read(self, timeout: Optional[float] = None) -> bool:
+        """Acquire a read lock. Blocks while a thread holds or waits for the write
+        lock, for at most timeout seconds if given. Returns whether it was
+        acquired."""
+        depth = getattr(self._local, "read_depth", 0)
+        me = threading.get_ident()
+        start = time.perf_counter()
+        with self._cond:
+            # Reentrant reads, and reads by the writer, must not wait behind writers
+            if depth == 0 and self._writer != me:
+                if not self._cond.wait_for(
+                    lambda: self._writer is None and self._waiting_writers == 0,
+                    timeout,
+                ):
+                    return False
             self._readers += 1
-        finally:
-            self._read_ready.release()
+            acquired_at = time.perf_counter()
+            if depth == 0:
+                stats = self._stats
+                self._stats = stats._replace(
+                    reads=stats.reads + 1,
+                    read_wait_seconds=stats.read_wait_seconds + acquired_at - start,
+                )
+        if depth == 0:
+            self._local.read_acquired_at = acquired_at
+        self._local.read_depth = depth + 1
+        return True
 
     def release_read(self) -> None:
         """Release a read lock."""
-        self._read_ready.acquire()
-        try:
+        depth = self._local.read_depth - 1
+        self._local.read_depth = depth
+        with self._cond:
             self._readers -= 1
+            if depth == 0:
+                stats = self._stats
+                self._stats = stats._replace(
+                    read_hold_seconds=stats.read_hold_seconds
+                    + time.perf_counter()
+                    - self._local.read_acquired_at
+                )
             if not self._readers:
-                self._read_ready.notify_all()
-        finally:
-            self._read_ready.release()
+                self._cond.notify_all()
 
-    def acquire_write(self) -> None:
-        """Acquire a write lock. Blocks until there are no
-        acquired read or write locks."""
-        self._read_ready.acquire()
-        while self._readers > 0:
-            self._read_ready.wait()
+    def acquire_write(self, timeout: Optional[float] = None) -> bool:
+        """Acquire a write lock. Blocks until there are no acquired read or write
+        locks, for at most timeout seconds if given. Returns whether it was
+        acquired."""
+        me = threading.get_ident()
+        start = time.perf_counter()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return True
+            self._waiting_writers += 1
+            try:
+                acquired = self._cond.wait_for(
+                    lambda: self._writer is None and self._readers == 0, timeout
+                )
+            finally:
+                self._waiting_writers -= 1
+            if not acquired:
+                # Readers that queued behind this writer may go ahead
+                self._cond.notify_all()
+                return False
+            self._writer = me
+            self._write_depth = 1
+            self._write_acquired_at = time.perf_counter()
+            stats = self._stats
+            self._stats = stats._replace(
+                writes=stats.writes + 1,
+                write_wait_seconds=stats.write_wait_seconds
+                + self._write_acquired_at
+                - start,
+            )
+            return True
 
     def release_write(self) -> None:
         """Release a write lock."""
-        self._read_ready.release()
+        with self._cond:
+            self._write_depth -= 1
+            if self._write_depth > 0:
+                return
+            self._writer = None
+            stats = self._stats
+            self._stats = stats._replace(
+                write_hold_seconds=stats.write_hold_seconds
+                + time.perf_counter()
+                - self._write_acquired_at
+            )
+            self._cond.notify_all()
+
+    def stats(self) -> LockStats:
+        """The contention counters of the lock since it was created"""
+        with self._cond:
+            return self._stats
 
 
 class ReadRWLock:
-    def __init__(self, rwLock: ReadWriteLock):
+    def __init__(self, rwLock: ReadWriteLock, timeout: Optional[float] = None):
         self.rwLock = rwLock
+        self.timeout = timeout
 
     def __enter__(self) -> None:
-        self.rwLock.acquire_read()
+        if not self.rwLock.acquire_read(self.timeout):
+            raise TimeoutError(
+                f"Timed out after {self.timeout}s waiting for a read lock"
+            )
 
     def __exit__(
         self,
@@ -59,11 +154,15 @@ class ReadRWLock:
 
 
 class WriteRWLock:
-    def __init__(self, rwLock: ReadWriteLock):
+    def __init__(self, rwLock: ReadWriteLock, timeout: Optional[float] = None):
         self.rwLock = rwLock
+        self.timeout = timeout
 
     def __enter__(self) -> None:
-        self.rwLock.acquire_write()
+        if not self.rwLock.acquire_write(self.timeout):
+            raise TimeoutError(
+                f"Timed out after {self.timeout}s waiting for a write lock"
+            )
 
     def __exit__(
         self,